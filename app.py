@@ -1,19 +1,24 @@
 from pathlib import Path
-from tempfile import NamedTemporaryFile
+from tempfile import TemporaryDirectory
+import atexit
 import os
 import hashlib
+import threading
 from datetime import datetime, date
 
 from flask import Flask, jsonify, render_template, request
 
 from finance_app.category_tree import CATEGORY_INDEX
+from finance_app.adapters.parallel_csv import PARALLEL_MIN_BYTES
 from finance_app.domain import Operation, OperationType
-from finance_app.services import analytics_service, import_service
-from finance_app.services.categorization import CategorizationPipeline
+from finance_app.services import analytics_service, bulk_import, import_jobs, recategorization
+from finance_app.services.categorization import CategorizationPipeline, categorize_vault, reclassify_unknown
+from finance_app.services.decision_cache import MAX_ENTRIES, DecisionCache
 from finance_app.domain import Vault
 from finance_app.services.ml_model import SimpleMLModel
-from finance_app.services import storage
+from finance_app.services import columnar_snapshot, segment_storage, sqlite_storage, storage
 from finance_app.services.llm_categorizer import LLMCategorizer
+from finance_app.services.state_writer import StateWriter
 
 
 BASE_DIR = Path(__file__).parent
@@ -31,21 +36,54 @@ llm_categorizer = LLMCategorizer(
     model=os.getenv("LLM_MODEL") or os.getenv("OPENAI_MODEL") or "allenai/olmo-3.1-32b-think:free",
     api_url=os.getenv("LLM_API_URL") or os.getenv("OPENAI_BASE_URL") or "https://api.openai.com/v1/chat/completions",
 )
-pipeline = CategorizationPipeline(ml_model=ml_model, llm_categorizer=llm_categorizer)
+# решения ML/LLM по сигнатуре мерчанта переживают рестарт; устаревшие по версии сбрасываются
+decision_cache = DecisionCache(max_entries=int(os.getenv("DECISION_CACHE_SIZE") or MAX_ENTRIES))
+pipeline = CategorizationPipeline(ml_model=ml_model, llm_categorizer=llm_categorizer, decision_cache=decision_cache)
 vault.categories = CATEGORY_INDEX
 uploaded_files: list = []
 PASSWORD_HASH: str = storage.load_password_hash()
 
+# json — снапшот целиком на каждую мутацию, journal — дописываем события в журнал,
+# sqlite — таблица операций с индексами (JSON-состояние переносится при первом запуске),
+# columnar — бинарный колоночный снапшот, segments — по сегменту на файл выписки
+# (если колоночного состояния ещё нет, стартуем с JSON)
+STORAGE_BACKEND = (os.getenv("STORAGE_BACKEND") or "json").lower()
+
+# процессов для разбора одного большого CSV (1 — без пула)
+IMPORT_PARSE_WORKERS = int(os.getenv("IMPORT_PARSE_WORKERS") or 1)
+
+# процессов для параллельного разбора файлов в пакетном импорте
+BULK_IMPORT_WORKERS = int(os.getenv("BULK_IMPORT_WORKERS") or os.cpu_count() or 1)
+
+# процессов для перекатегоризации всего vault (1 — в потоке запроса); пул включается
+# явно, когда на этой машине он быстрее (benchmarks/bench_parallel_categorize.py)
+RECATEGORIZE_WORKERS = int(os.getenv("RECATEGORIZE_WORKERS") or 1)
+
 # путь для сохранения модели
 MODEL_PATH = BASE_DIR / "models" / "expense_clf.pkl"
 
-# при старте пробуем поднять сохранённое состояние
-loaded_files, has_state = storage.load_state(vault)
-if has_state:
-    uploaded_files = loaded_files
 
-# при старте пытаемся загрузить модель
-ml_model.load(MODEL_PATH)
+def load_saved_state() -> None:
+    """Поднять сохранённое состояние выбранного STORAGE_BACKEND."""
+    global uploaded_files
+    if STORAGE_BACKEND == "sqlite":
+        sqlite_storage.migrate_from_json()
+        loaded_files, has_state = sqlite_storage.load_state(vault)
+    elif STORAGE_BACKEND == "columnar":
+        loaded_files, has_state = columnar_snapshot.load_state(vault)
+        if not has_state:
+            loaded_files, has_state = storage.load_state(vault)
+    elif STORAGE_BACKEND == "segments":
+        loaded_files, has_state = segment_storage.load_state(vault)
+        if not has_state:
+            loaded_files, has_state = storage.load_state(vault)
+            if has_state:
+                # сразу раскладываем JSON-состояние по сегментам, дальше пишем только дельты
+                segment_storage.save_state(vault, loaded_files)
+    else:
+        loaded_files, has_state = storage.load_state(vault)
+    if has_state:
+        uploaded_files = loaded_files
 
 
 def serialize_operation(op: Operation) -> dict:
@@ -67,6 +105,162 @@ def serialize_operation(op: Operation) -> dict:
     }
 
 
+def persist_all() -> None:
+    if STORAGE_BACKEND == "sqlite":
+        sqlite_storage.save_state(vault, uploaded_files)
+    elif STORAGE_BACKEND == "columnar":
+        columnar_snapshot.save_state(vault, uploaded_files)
+    elif STORAGE_BACKEND == "segments":
+        segment_storage.save_state(vault, uploaded_files)
+    else:
+        storage.save_state(vault, uploaded_files)
+
+
+# мутации vault и запись состояния не должны пересекаться
+state_lock = threading.RLock()
+
+
+def _write_state() -> None:
+    with state_lock:
+        persist_all()
+
+
+# полная запись идёт в фоне: пачка мутаций подряд превращается в одну запись (поток стартует в start())
+state_writer: StateWriter
+
+
+def persist_added(operations: list, uploaded_file: dict) -> None:
+    if STORAGE_BACKEND == "journal":
+        storage.journal_add_operations(vault, operations, uploaded_file)
+        storage.maybe_compact_journal(vault, uploaded_files)
+    elif STORAGE_BACKEND == "sqlite":
+        sqlite_storage.add_operations(vault, operations, uploaded_files)
+    elif STORAGE_BACKEND == "segments":
+        segment_storage.add_segment(vault, uploaded_file["id"], operations, uploaded_files)
+    else:
+        state_writer.schedule()
+
+
+def _import_committed(job: import_jobs.ImportJob) -> bool:
+    # задание упало после сохранения, но до удаления своего каталога
+    return any(f["id"] == job.file_id for f in uploaded_files)
+
+
+def _publish_import_chunk(operations: list, job: import_jobs.ImportJob) -> None:
+    """Операции чанка сразу видны в аналитике; на диск они попадут в _commit_import."""
+    if _import_committed(job):
+        return
+    for op in operations:
+        vault.add_operation(op)
+
+
+def _commit_import(operations: list, job: import_jobs.ImportJob) -> None:
+    """Зарегистрировать файл завершённого задания импорта и сохранить состояние."""
+    if _import_committed(job):
+        return
+    file_meta = {"id": job.file_id, "name": job.name, "bank": job.bank, "count": len(operations)}
+    uploaded_files.append(file_meta)
+    if STORAGE_BACKEND in {"journal", "sqlite", "segments"}:
+        persist_added(operations, file_meta)
+    else:
+        # json/columnar: задание закрываем только после записи на диск, не в фоне
+        persist_all()
+    decision_cache.save()
+
+
+def _rollback_import(job: import_jobs.ImportJob) -> None:
+    """Задание упало: опубликованные чанки не должны остаться в vault без записи о файле."""
+    if _import_committed(job) or not vault.index.by_source_file(job.file_id):
+        return
+    vault.remove_file_operations(job.file_id)
+    # фоновая запись могла успеть сохранить часть чанков
+    persist_deleted(job.file_id)
+
+
+def _run_import_job(job: import_jobs.ImportJob) -> None:
+    workers = IMPORT_PARSE_WORKERS if (job.bytes_total or 0) >= PARALLEL_MIN_BYTES else 1
+    import_jobs.run_job(
+        job,
+        vault,
+        pipeline,
+        _publish_import_chunk,
+        _commit_import,
+        workers=workers,
+        lock=state_lock,
+        rollback=_rollback_import,
+    )
+
+
+import_runner: import_jobs.ImportJobRunner
+
+
+def _resume_import_jobs() -> None:
+    for job in import_jobs.resumable_jobs():
+        with state_lock:
+            # фоновая запись могла сохранить часть чанков прерванного задания:
+            # убираем их, задание заново опубликует операции из своего чекпоинта
+            if not _import_committed(job) and vault.index.by_source_file(job.file_id):
+                vault.remove_file_operations(job.file_id)
+                persist_deleted(job.file_id)
+        import_runner.submit(job)
+
+
+def persist_deleted(file_id: str) -> None:
+    if STORAGE_BACKEND == "journal":
+        storage.journal_delete_file(file_id)
+        storage.maybe_compact_journal(vault, uploaded_files)
+    elif STORAGE_BACKEND == "sqlite":
+        sqlite_storage.delete_file(file_id, uploaded_files)
+    elif STORAGE_BACKEND == "segments":
+        segment_storage.delete_segment(vault, file_id, uploaded_files)
+    else:
+        state_writer.schedule()
+
+
+def persist_recategorized(operations: list) -> None:
+    if STORAGE_BACKEND == "journal":
+        storage.journal_recategorize(operations)
+        storage.maybe_compact_journal(vault, uploaded_files)
+    elif STORAGE_BACKEND == "sqlite":
+        sqlite_storage.update_categories(operations)
+    else:
+        state_writer.schedule()
+
+
+def _apply_categorization_changes() -> None:
+    """Правила или маппинг поменялись с прошлого запуска — перекатегоризуем только затронутые операции."""
+    previous = recategorization.load_config()
+    current = recategorization.CategorizationConfig.current()
+    if previous is not None and previous.version != current.version:
+        with state_lock:
+            changed = recategorization.apply_config_change(vault, pipeline, previous, current)
+            if changed:
+                persist_recategorized(changed)
+    if previous is None or previous.version != current.version:
+        recategorization.save_config(current)
+
+
+def start() -> None:
+    """
+    Старт сервера: состояние, модель, фоновые потоки, прерванные задания импорта.
+    Не на уровне модуля: процессы пулов (forkserver/spawn) загружают app.py как
+    __mp_main__, и повторять в них старт сервера нельзя.
+    """
+    global state_writer, import_runner
+    decision_cache.load()
+    atexit.register(decision_cache.save)
+    load_saved_state()
+    # колоночное зеркало операций: агрегаты по всему vault без Decimal-арифметики
+    if (os.getenv("VAULT_COLUMN_STORE") or "").lower() in {"1", "true", "yes"}:
+        vault.enable_store()
+    ml_model.load(MODEL_PATH)
+    state_writer = StateWriter(_write_state, delay=float(os.getenv("STATE_WRITE_DELAY") or 1.0))
+    atexit.register(state_writer.close)
+    import_runner = import_jobs.ImportJobRunner(_run_import_job)
+    _resume_import_jobs()
+    _apply_categorization_changes()
+
+
 def parse_date(val: str) -> date | None:
     try:
         return datetime.strptime(val, "%Y-%m-%d").date()
@@ -124,34 +318,95 @@ def api_auth_login():
 
 @app.route("/api/import", methods=["POST"])
 def api_import():
-    uploaded = request.files.get("file")
-    bank = (request.form.get("bank") or "").lower()
-    if not uploaded or bank not in {"alfa", "tinkoff"}:
+    """
+    Выписка приходит либо сырым телом запроса (?bank=...&name=...), либо
+    multipart-формой (file, bank). Ответ 202 с id задания возвращается сразу
+    после загрузки, прогресс — GET /api/import/jobs/<id>.
+    """
+    if request.mimetype == "multipart/form-data":
+        uploaded = request.files.get("file")
+        bank = (request.form.get("bank") or "").lower()
+        stream = uploaded.stream if uploaded else None
+        filename = uploaded.filename if uploaded else None
+    else:
+        bank = (request.args.get("bank") or "").lower()
+        has_body = bool(request.content_length) or request.headers.get("Transfer-Encoding") == "chunked"
+        stream = request.stream if has_body else None
+        filename = request.args.get("name") or "statement.csv"
+    if stream is None or bank not in {"alfa", "tinkoff"}:
         return jsonify({"error": "Укажите файл и банк (alfa / tinkoff)."}), 400
 
-    with NamedTemporaryFile(delete=False, suffix=".csv") as tmp:
-        uploaded.save(tmp.name)
-        tmp_path = tmp.name
+    # выписка сохраняется в каталог задания, разбор и категоризация идут в фоне
+    job = import_jobs.create_job(bank, filename, storage.new_file_id())
+    import_jobs.receive_upload(job, stream)
+    import_runner.submit(job)
+    return jsonify({"job_id": job.id, "job": job.progress()}), 202
 
-    file_id = storage.new_file_id()
-    try:
-        if bank == "alfa":
-            count = import_service.import_alfa_file_into_vault(vault, pipeline, tmp_path, file_id)
-        else:
-            count = import_service.import_tinkoff_file_into_vault(vault, pipeline, tmp_path, file_id)
-    finally:
-        os.remove(tmp_path)
 
-    uploaded_files.append({"id": file_id, "name": uploaded.filename, "bank": bank, "count": count})
-    storage.save_state(vault, uploaded_files)
-    return jsonify({"imported": count, "totals": analytics_service.compute_totals(vault)})
+@app.route("/api/import/jobs/<job_id>")
+def api_import_job(job_id: str):
+    """Фаза задания импорта, обработанные строки, скорость и оценка оставшегося времени."""
+    job = import_runner.get(job_id)
+    if job is None:
+        return jsonify({"error": "not found"}), 404
+    progress = job.progress()
+    if job.status == import_jobs.DONE:
+        progress["totals"] = analytics_service.compute_totals(vault)
+    return jsonify(progress)
+
+
+@app.route("/api/import/bulk", methods=["POST"])
+def api_import_bulk():
+    """Несколько CSV или ZIP за один запрос; банк определяется по заголовку файла."""
+    uploads = [f for f in request.files.getlist("files") if f and f.filename]
+    if not uploads:
+        return jsonify({"error": "Приложите CSV-файлы или ZIP-архив."}), 400
+
+    with TemporaryDirectory() as work_dir:
+        saved = []
+        for number, uploaded in enumerate(uploads):
+            path = os.path.join(work_dir, f"upload-{number}")
+            uploaded.save(path)
+            saved.append((uploaded.filename, path))
+        try:
+            files = bulk_import.expand_uploads(saved, work_dir)
+        except bulk_import.ArchiveTooLarge as exc:
+            return jsonify({"error": str(exc)}), 400
+
+        def commit(results: list) -> None:
+            for result in results:
+                if result.get("count"):
+                    file_meta = {key: result[key] for key in ("id", "name", "bank", "count")}
+                    uploaded_files.append(file_meta)
+                    persist_added(vault.index.by_source_file(file_meta["id"]), file_meta)
+
+        # state_lock только на дедупликацию и публикацию: разбор и LLM идут без него
+        results = bulk_import.import_statements(
+            vault, pipeline, files, storage.new_file_id, workers=BULK_IMPORT_WORKERS, lock=state_lock, commit=commit
+        )
+        decision_cache.save()
+
+    return jsonify(
+        {
+            "files": results,
+            "imported": sum(r.get("count", 0) for r in results),
+            "skipped": sum(r.get("skipped", 0) for r in results),
+            "totals": analytics_service.compute_totals(vault),
+        }
+    )
 
 
 @app.route("/api/reset", methods=["POST"])
 def api_reset():
-    vault.reset()
-    uploaded_files.clear()
-    storage.save_state(vault, uploaded_files)
+    with state_lock:
+        vault.reset()
+        uploaded_files.clear()
+        if STORAGE_BACKEND == "sqlite":
+            # /api/operations читает базу, а не vault: сброс должен попасть в неё до ответа
+            persist_all()
+    if STORAGE_BACKEND != "sqlite":
+        # снапшот после сброса пустой, заодно он обнуляет журнал
+        state_writer.schedule()
     return jsonify({"status": "ok"})
 
 
@@ -161,50 +416,53 @@ def api_analytics():
     end = parse_date(request.args.get("end_date") or "")
     exclude_transfers = (request.args.get("exclude_transfers") or "true").lower() == "true"
 
-    ops_filtered = analytics_service.filter_operations(vault, start, end, exclude_transfers=exclude_transfers)
-    transfer_ops = analytics_service.filter_operations(vault, start, end, transfers_only=True)
-    all_ops = vault.operations
-    all_dates = [op.date for op in all_ops]
-    period_all = None
-    if all_dates:
-        period_all = {"start": min(all_dates).isoformat(), "end": max(all_dates).isoformat()}
-
-    unknown_ops = analytics_service.unknown_operations(vault, ops_filtered)
-    data = {
-        "totals": analytics_service.compute_totals(vault, ops_filtered),
-        "by_sys": analytics_service.breakdown_by_sys(vault, ops_filtered),
-        "by_base": analytics_service.breakdown_by_base(vault, limit=None, operations=ops_filtered),  # backward compatible
-        "by_base_expense": analytics_service.breakdown_by_base(
-            vault, limit=None, op_type=OperationType.EXPENSE, operations=ops_filtered
-        ),
-        "by_base_income": analytics_service.breakdown_by_base(
-            vault, limit=None, op_type=OperationType.INCOME, operations=ops_filtered
-        ),
-        "by_sys_hierarchy": analytics_service.base_by_sys_hierarchy(vault, operations=ops_filtered),
-        "travel": analytics_service.travel_breakdown(vault, ops_filtered),
-        "service": analytics_service.service_operations(vault, transfer_ops),
-        "transfers": analytics_service.breakdown_by_base(vault, operations=transfer_ops),
-        "trend": analytics_service.monthly_trend(vault, ops_filtered),
-        "trend_weekly": analytics_service.weekly_trend(vault, ops_filtered),
-        "trend_daily": analytics_service.daily_trend(vault, operations=ops_filtered),
-        "ops_count": len(ops_filtered),
-        "ops_count_total": len(vault.operations),
-        "unknown": len(unknown_ops),
-        "period_all": period_all,
-        "unknown_samples": [
-            {
-                "date": op.date.isoformat(),
-                "bank": op.bank,
-                "description": op.description,
-                "amount": float(op.amount),
-            }
-            for op in unknown_ops[:10]
-        ],
-        "unmapped": pipeline.unmapped_summary(),
-        "ml_status": ml_model.status(),
-        "llm_status": llm_categorizer.status(),
-        "quick_answers": analytics_service.quick_answers(vault, ops_filtered, start, end),
-    }
+    # задания импорта публикуют чанки из своего потока: vault и его индекс читаем под тем же lock
+    with state_lock:
+        ops_filtered = analytics_service.filter_operations(vault, start, end, exclude_transfers=exclude_transfers)
+        transfer_ops = analytics_service.filter_operations(vault, start, end, transfers_only=True)
+        all_ops = vault.operations
+        all_dates = [op.date for op in all_ops]
+        period_all = None
+        if all_dates:
+            period_all = {"start": min(all_dates).isoformat(), "end": max(all_dates).isoformat()}
+
+        unknown_ops = analytics_service.unknown_operations(vault, ops_filtered)
+        data = {
+            "totals": analytics_service.compute_totals(vault, ops_filtered),
+            "by_sys": analytics_service.breakdown_by_sys(vault, ops_filtered),
+            "by_base": analytics_service.breakdown_by_base(vault, limit=None, operations=ops_filtered),  # backward compatible
+            "by_base_expense": analytics_service.breakdown_by_base(
+                vault, limit=None, op_type=OperationType.EXPENSE, operations=ops_filtered
+            ),
+            "by_base_income": analytics_service.breakdown_by_base(
+                vault, limit=None, op_type=OperationType.INCOME, operations=ops_filtered
+            ),
+            "by_sys_hierarchy": analytics_service.base_by_sys_hierarchy(vault, operations=ops_filtered),
+            "travel": analytics_service.travel_breakdown(vault, ops_filtered),
+            "service": analytics_service.service_operations(vault, transfer_ops),
+            "transfers": analytics_service.breakdown_by_base(vault, operations=transfer_ops),
+            "trend": analytics_service.monthly_trend(vault, ops_filtered),
+            "trend_weekly": analytics_service.weekly_trend(vault, ops_filtered),
+            "trend_daily": analytics_service.daily_trend(vault, operations=ops_filtered),
+            "ops_count": len(ops_filtered),
+            "ops_count_total": len(vault.operations),
+            "unknown": len(unknown_ops),
+            "period_all": period_all,
+            "unknown_samples": [
+                {
+                    "date": op.date.isoformat(),
+                    "bank": op.bank,
+                    "description": op.description,
+                    "amount": float(op.amount),
+                }
+                for op in unknown_ops[:10]
+            ],
+            "unmapped": pipeline.unmapped_summary(),
+            "ml_status": ml_model.status(),
+            "llm_status": llm_categorizer.status(),
+            "pipeline_status": pipeline.status(),
+            "quick_answers": analytics_service.quick_answers(vault, ops_filtered, start, end),
+        }
     return jsonify(data)
 
 
@@ -219,7 +477,8 @@ def api_merchant_breakdown():
         op_type = OperationType.INCOME
     if not base_id:
         return jsonify({"error": "base_id is required"}), 400
-    items = analytics_service.merchant_breakdown(vault, base_id, op_type=op_type)
+    with state_lock:
+        items = analytics_service.merchant_breakdown(vault, base_id, op_type=op_type)
     return jsonify({"items": items})
 
 
@@ -234,27 +493,62 @@ def api_operations():
     start_dt = parse_date(start_raw) if start_raw else None
     end_dt = parse_date(end_raw) if end_raw else None
 
-    filtered = []
-    for op in vault.operations:
-        if start_dt and op.date < start_dt:
-            continue
-        if end_dt and op.date > end_dt:
-            continue
-        if type_raw == "income" and op.type != OperationType.INCOME:
-            continue
-        if type_raw == "expense" and op.type != OperationType.EXPENSE:
-            continue
-        if exclude_transfers and op.category_id in analytics_service.SERVICE_BASE_IDS:
-            continue
-        filtered.append(op)
-
-    ordered = sorted(filtered, key=lambda o: o.date, reverse=True)
-    return jsonify({"items": [serialize_operation(op) for op in ordered[:limit]]})
+    if STORAGE_BACKEND == "sqlite":
+        # выборка по индексу date прямо в базе, без прохода по vault
+        ordered = sqlite_storage.query_operations(
+            start_dt,
+            end_dt,
+            op_type={"income": OperationType.INCOME, "expense": OperationType.EXPENSE}.get(type_raw),
+            exclude_categories=analytics_service.SERVICE_BASE_IDS if exclude_transfers else (),
+            limit=limit,
+            newest_first=True,
+        )
+        return jsonify({"items": [serialize_operation(op) for op in ordered]})
+
+    with state_lock:
+        # индекс по дате отдаёт операции от новых к старым, останавливаемся на limit
+        ordered = []
+        for op in vault.index.newest_first(start_dt, end_dt):
+            if len(ordered) >= limit:
+                break
+            if type_raw == "income" and op.type != OperationType.INCOME:
+                continue
+            if type_raw == "expense" and op.type != OperationType.EXPENSE:
+                continue
+            if exclude_transfers and op.category_id in analytics_service.SERVICE_BASE_IDS:
+                continue
+            ordered.append(op)
+    return jsonify({"items": [serialize_operation(op) for op in ordered]})
+
+
+@app.route("/api/changes")
+def api_changes():
+    """
+    Дельта vault после версии since; reset=true — клиенту нужна полная перезагрузка.
+    counts=true — вместо операций только их число: клиенту, который перечитывает
+    аналитику с сервера, достаточно знать, что vault изменился.
+    """
+    since_raw = request.args.get("since")
+    since = int(since_raw) if since_raw and since_raw.isdigit() else None
+    counts_only = (request.args.get("counts") or "").lower() == "true"
+    with state_lock:
+        delta = vault.changes.since(since, request.args.get("epoch"))
+        for key in ("added", "recategorized", "removed"):
+            if key not in delta:
+                continue
+            if counts_only:
+                delta[key] = len(delta[key])
+            elif key != "removed":
+                delta[key] = [serialize_operation(op) for op in delta[key]]
+    return jsonify(delta)
 
 
 @app.route("/api/train-ml", methods=["POST"])
 def api_train_ml():
-    status = ml_model.fit(vault.operations)
+    with state_lock:
+        operations = list(vault.operations)
+    # обучение долгое: идёт по копии списка, без lock
+    status = ml_model.fit(operations)
     return jsonify(
         {
             "trained": status.trained,
@@ -265,30 +559,99 @@ def api_train_ml():
     )
 
 
+@app.route("/api/recategorize", methods=["POST"])
+def api_recategorize():
+    """После обновления правил, маппинга или модели: scope=all — весь vault, scope=unknown — только нераспознанные."""
+    scope = (request.get_json(silent=True) or {}).get("scope") or "unknown"
+    if scope not in {"all", "unknown"}:
+        return jsonify({"error": "scope must be all or unknown"}), 400
+    with state_lock:
+        if scope == "all":
+            categorize_vault(vault, pipeline, workers=RECATEGORIZE_WORKERS)
+            operations = vault.operations
+        else:
+            operations = reclassify_unknown(vault, pipeline, workers=RECATEGORIZE_WORKERS)
+        persist_recategorized(operations)
+        totals = analytics_service.compute_totals(vault)
+    decision_cache.save()
+    return jsonify({"recategorized": len(operations), "totals": totals})
+
+
+@app.route("/api/categorization/config")
+def api_categorization_config():
+    config = recategorization.CategorizationConfig.current()
+    return jsonify({"version": config.version, **config.to_dict()})
+
+
+@app.route("/api/categorization/diff", methods=["POST"])
+def api_categorization_diff():
+    """
+    Сколько операций сменят категорию между двумя версиями правил и маппинга.
+    from/to — {"rules": [...], "mapping": [...]}, недостающее берётся из действующей
+    версии; без from сравнивается версия, которой категоризован vault.
+    """
+    payload = request.get_json(silent=True) or {}
+    current = recategorization.CategorizationConfig.current()
+    try:
+        if "from" in payload:
+            old = recategorization.CategorizationConfig.from_dict(payload["from"], current)
+        else:
+            old = recategorization.load_config() or current
+        new = recategorization.CategorizationConfig.from_dict(payload.get("to") or {}, current)
+    except (KeyError, TypeError, ValueError) as exc:
+        return jsonify({"error": f"bad config: {exc}"}), 400
+    with state_lock:
+        diff = recategorization.diff_configs(vault, pipeline, old, new)
+    return jsonify(diff)
+
+
+@app.route("/api/merchant-dictionary/reload", methods=["POST"])
+def api_reload_merchant_dictionary():
+    # файл и так перечитывается по mtime; здесь — явная перезагрузка с ошибкой разбора в ответе
+    try:
+        dictionary = pipeline.merchant_dictionary.reload()
+    except (OSError, ValueError, TypeError) as exc:
+        return jsonify({"error": str(exc)}), 400
+    return jsonify({"merchants": dictionary.size, "version": dictionary.version})
+
+
+@app.route("/api/metrics/categorization")
+def api_categorization_metrics():
+    """Вызовы, доля попаданий и p50/p95/p99 задержки каждой стадии пайплайна с запуска или сброса."""
+    return jsonify(pipeline.metrics.status())
+
+
+@app.route("/api/metrics/categorization/reset", methods=["POST"])
+def api_reset_categorization_metrics():
+    pipeline.metrics.reset()
+    return jsonify(pipeline.metrics.status())
+
+
 @app.route("/api/agent-context")
 def api_agent_context():
     # Контекст для внешнего LLM-чата (не используется в категоризации)
-    unknown_ops = analytics_service.unknown_operations(vault)
-    return jsonify(
-        {
-            "totals": analytics_service.compute_totals(vault),
-            "by_sys": analytics_service.breakdown_by_sys(vault),
-            "by_base": analytics_service.breakdown_by_base(vault),
-            "trend": analytics_service.monthly_trend(vault),
-            "unknown_examples": [
-                {
-                    "date": op.date.isoformat(),
-                    "bank": op.bank,
-                    "description": op.description,
-                    "bank_category": op.bank_category,
-                    "amount": float(op.amount),
-                    "mcc": op.mcc,
-                    "source": op.categorization_source,
-                }
-                for op in unknown_ops[:20]
-            ],
-        }
-    )
+    with state_lock:
+        unknown_ops = analytics_service.unknown_operations(vault)
+        return jsonify(
+            {
+                "totals": analytics_service.compute_totals(vault),
+                "by_sys": analytics_service.breakdown_by_sys(vault),
+                "by_base": analytics_service.breakdown_by_base(vault),
+                "trend": analytics_service.monthly_trend(vault),
+                "unknown_examples": [
+                    {
+                        "date": op.date.isoformat(),
+                        "bank": op.bank,
+                        "description": op.description,
+                        "bank_category": op.bank_category,
+                        "amount": float(op.amount),
+                        "mcc": op.mcc,
+                        "source": op.categorization_source,
+                    }
+                    for op in unknown_ops[:20]
+                ],
+            }
+        )
 
 
 @app.route("/api/agent-answer", methods=["POST"])
@@ -298,14 +661,15 @@ def api_agent_answer():
     if not question:
         return jsonify({"error": "question is required"}), 400
 
-    analytics = {
-        "totals": analytics_service.compute_totals(vault),
-        "by_base_expense": analytics_service.breakdown_by_base(vault, limit=None, op_type=OperationType.EXPENSE),
-        "by_base_income": analytics_service.breakdown_by_base(vault, limit=None, op_type=OperationType.INCOME),
-        "trend_monthly": analytics_service.monthly_trend(vault),
-        "trend_weekly": analytics_service.weekly_trend(vault),
-        "trend_daily": analytics_service.daily_trend(vault),
-    }
+    with state_lock:
+        analytics = {
+            "totals": analytics_service.compute_totals(vault),
+            "by_base_expense": analytics_service.breakdown_by_base(vault, limit=None, op_type=OperationType.EXPENSE),
+            "by_base_income": analytics_service.breakdown_by_base(vault, limit=None, op_type=OperationType.INCOME),
+            "trend_monthly": analytics_service.monthly_trend(vault),
+            "trend_weekly": analytics_service.weekly_trend(vault),
+            "trend_daily": analytics_service.daily_trend(vault),
+        }
 
     answer = build_simple_answer(question, analytics)
     return jsonify({"answer": answer})
@@ -322,18 +686,37 @@ def api_delete_file(file_id: str):
     removed = [f for f in uploaded_files if f["id"] == file_id]
     if not removed:
         return jsonify({"error": "not found"}), 404
-    uploaded_files = [f for f in uploaded_files if f["id"] != file_id]
-    vault.operations = [op for op in vault.operations if op.source_file_id != file_id]
-    storage.save_state(vault, uploaded_files)
-    return jsonify({"status": "deleted", "totals": analytics_service.compute_totals(vault), "files": uploaded_files})
+    with state_lock:
+        uploaded_files = [f for f in uploaded_files if f["id"] != file_id]
+        vault.remove_file_operations(file_id)
+        persist_deleted(file_id)
+        totals = analytics_service.compute_totals(vault)
+    return jsonify({"status": "deleted", "totals": totals, "files": uploaded_files})
 
 
 @app.route("/api/save", methods=["POST"])
 def api_save():
-    storage.save_state(vault, uploaded_files)
+    # барьер: дожидаемся записи всего, что накопил фоновый писатель
+    state_writer.schedule()
+    state_writer.flush()
     return jsonify({"status": "saved"})
 
 
+@app.route("/api/save/status")
+def api_save_status():
+    """Состояние фоновой записи: есть ли незаписанные мутации и последняя ошибка записи."""
+    return jsonify({"backend": STORAGE_BACKEND, **state_writer.status()})
+
+
+@app.route("/api/export")
+def api_export():
+    # выгрузка в JSON доступна при любом STORAGE_BACKEND
+    with state_lock:
+        response = jsonify(storage.export_state(vault, uploaded_files))
+    response.headers["Content-Disposition"] = "attachment; filename=vault_state.json"
+    return response
+
+
 @app.route("/api/save-model", methods=["POST"])
 def api_save_model():
     if not ml_model.is_ready():
@@ -385,4 +768,8 @@ def build_simple_answer(question: str, analytics: dict) -> str:
 
 
 if __name__ == "__main__":
+    # в debug-режиме родительский процесс только перезапускает дочерний при
+    # изменении кода: стартует сервер в дочернем
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start()
     app.run(debug=True, port=5000)
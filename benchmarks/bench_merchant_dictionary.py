@@ -0,0 +1,157 @@
+"""
+Скорость ML-заглушки: прежний _ml_stub (два словаря-литерала на каждый вызов и
+проверка `in` по всем ключевым словам) против словаря мерчантов из
+finance_app/merchant_dictionary.py (массив MCC и бор по началам слов).
+Считает расхождения на сгенерированных текстах: прежняя заглушка находила
+слово и в середине другого слова, словарь — только с начала слова.
+Вторая часть — рост словаря до нескольких тысяч мерчантов.
+
+    python benchmarks/bench_merchant_dictionary.py --ops 100000
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from finance_app.merchant_dictionary import MERCHANT_DICTIONARY, MerchantDictionary
+from finance_app.utils import normalize_text
+
+
+TEXTS = [
+    "Оплата товаров и услуг PYATEROCHKA 1234 MOSCOW RUS",
+    "Yandex Go taxi ride",
+    "Coffee Bean Moscow",
+    "Аптека 36.6 Izhevsk",
+    "Покупка LENTA-142 SANKT-PETERBURG",
+    "Оплата SBOL KINOPOISK",
+    "Кинотеатр Октябрь",
+    "IP Malishev produkty",
+    "Burger King 0042",
+    "Aeroflot tickets",
+    "Магазин у дома 17",
+    "Hardware store 5",
+]
+MCCS = [None, None, None, "5411", "5814", "4121", "5999"]
+
+
+def legacy_ml_stub(text: str, mcc: Optional[str]) -> Optional[str]:
+    if mcc:
+        mcc_map = {
+            "5411": "base_shopping_groceries",
+            "5814": "base_food_fastfood",
+            "5812": "base_food_restaurants",
+            "4111": "base_transport_public",
+            "4121": "base_transport_taxi",
+            "4789": "base_travel_dutyfree",
+            "4511": "base_travel_flights",
+            "4112": "base_travel_trains",
+            "7011": "base_travel_hotels",
+            "5541": "base_transport_fuel",
+            "5542": "base_transport_fuel",
+            "5977": "base_health_fitness",
+        }
+        if mcc in mcc_map:
+            return mcc_map[mcc]
+
+    keyword_map = {
+        "ашан": "base_shopping_groceries",
+        "перекрест": "base_shopping_groceries",
+        "perekrest": "base_shopping_groceries",
+        "lenta": "base_shopping_groceries",
+        "pyateroch": "base_shopping_groceries",
+        "pyatero": "base_shopping_groceries",
+        "magnit": "base_shopping_groceries",
+        "da!": "base_shopping_groceries",
+        "chesnok": "base_shopping_groceries",
+        "malishev": "base_shopping_groceries",
+        "yandex market": "base_shopping_marketplace",
+        "market yandex": "base_shopping_marketplace",
+        "ozon": "base_shopping_marketplace",
+        "wildberries": "base_shopping_marketplace",
+        "wb ru": "base_shopping_marketplace",
+        "avito": "base_shopping_marketplace",
+        "vkusnoitochka": "base_food_fastfood",
+        "kfc": "base_food_fastfood",
+        "burger": "base_food_fastfood",
+        "coffee": "base_food_coffee",
+        "starbucks": "base_food_coffee",
+        "taxi": "base_transport_taxi",
+        "yandex go": "base_transport_taxi",
+        "yandex.taxi": "base_transport_taxi",
+        "uber": "base_transport_taxi",
+        "aero": "base_travel_flights",
+        "airlines": "base_travel_flights",
+        "rjd": "base_travel_trains",
+        "cinema": "base_entertainment_cinema",
+        "кин": "base_entertainment_cinema",
+        "apteka": "base_shopping_pharmacy",
+        "аптека": "base_shopping_pharmacy",
+    }
+    for key, base_id in keyword_map.items():
+        if key in text:
+            return base_id
+    return None
+
+
+def make_items(count: int, rng: random.Random, extra_words: int = 0) -> List[Tuple[str, Optional[str]]]:
+    items = []
+    for _ in range(count):
+        text = rng.choice(TEXTS)
+        if extra_words and rng.random() < 0.5:
+            text = f"{text} shop{rng.randrange(extra_words):05d}"
+        items.append((normalize_text(text), rng.choice(MCCS)))
+    return items
+
+
+def ns_per_op(lookup: Callable[[str, Optional[str]], Optional[str]], items) -> float:
+    started = time.perf_counter()
+    for text, mcc in items:
+        lookup(text, mcc)
+    return (time.perf_counter() - started) / len(items) * 1e9
+
+
+def linear_lookup(mcc_map: dict, keywords: List[Tuple[str, str]]) -> Callable[[str, Optional[str]], Optional[str]]:
+    """Прежний способ поиска (без пересборки литералов) на словаре любого размера."""
+
+    def lookup(text: str, mcc: Optional[str]) -> Optional[str]:
+        if mcc in mcc_map:
+            return mcc_map[mcc]
+        for key, base_id in keywords:
+            if key in text:
+                return base_id
+        return None
+
+    return lookup
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ops", type=int, default=100_000)
+    args = parser.parse_args()
+    dictionary = MERCHANT_DICTIONARY.current()
+    items = make_items(args.ops, random.Random(0))
+
+    mismatches = sorted({text for text, mcc in items if legacy_ml_stub(text, mcc) != dictionary.lookup(text, mcc)})
+    legacy = ns_per_op(legacy_ml_stub, items)
+    indexed = ns_per_op(dictionary.lookup, items)
+    print(f"ops: {args.ops}, texts with a different result: {mismatches or 'none'}")
+    print(f"legacy _ml_stub:    {legacy:,.0f} ns/op")
+    print(f"dictionary:         {indexed:,.0f} ns/op ({legacy / indexed:.2f}x)")
+
+    mcc_map = {"5411": "base_shopping_groceries", "4121": "base_transport_taxi"}
+    for extra in (0, 1000, 5000):
+        keywords = [(key, base_id) for key, base_id in [("coffee", "base_food_coffee"), ("taxi", "base_transport_taxi")]]
+        keywords += [(f"shop{n:05d}", "base_shopping_marketplace") for n in range(extra)]
+        items = make_items(args.ops, random.Random(1), extra_words=max(extra, 1))
+        linear = ns_per_op(linear_lookup(mcc_map, keywords), items)
+        trie = ns_per_op(MerchantDictionary(mcc_map, keywords).lookup, items)
+        print(f"{len(keywords):>5} merchants: linear {linear:,.0f} ns/op, dictionary {trie:,.0f} ns/op ({linear / trie:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
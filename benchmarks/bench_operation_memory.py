@@ -0,0 +1,98 @@
+"""
+Сколько байт занимает одна операция в памяти: прежний dataclass с __dict__
+против текущего Operation со __slots__ и интернированными строками.
+
+    python benchmarks/bench_operation_memory.py --count 200000
+"""
+
+import argparse
+import gc
+import sys
+import tracemalloc
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+from typing import Callable, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from finance_app.domain import Operation, OperationType
+
+
+@dataclass
+class LegacyOperation:
+    id: str
+    account_id: str
+    bank: str
+    date: date
+    amount: Decimal
+    currency: str
+    type: OperationType
+    description: str
+    merchant: Optional[str] = None
+    mcc: Optional[str] = None
+    bank_category: Optional[str] = None
+    category_id: Optional[str] = None
+    categorization_source: Optional[str] = None
+    source_file_id: Optional[str] = None
+
+
+MERCHANTS = ["Pyaterochka", "Yandex Go", "Coffee Bean", "Ozon", "Apteka 36.6", "KFC", "Lenta"]
+CATEGORIES = ["Супермаркеты", "Такси", "Кафе и рестораны", "Маркетплейсы", "Аптеки", "Фастфуд"]
+
+
+def _fresh(value: str) -> str:
+    # как после json.loads/csv: каждая строка — отдельный объект
+    return "".join(list(value))
+
+
+def make_operations(factory: Callable[..., object], count: int) -> List[object]:
+    ops = []
+    for i in range(count):
+        ops.append(
+            factory(
+                id=f"{i:08d}-0000-4000-8000-000000000000",
+                account_id=_fresh("alfa:40817810000000000001"),
+                bank=_fresh("alfa"),
+                date=date.fromordinal(738000 + i % 900),
+                amount=Decimal(f"-{i % 7000}.{i % 100:02d}"),
+                currency=_fresh("RUR"),
+                type=OperationType.EXPENSE,
+                description=f"Покупка {MERCHANTS[i % len(MERCHANTS)]} #{i % 500}",
+                merchant=_fresh(MERCHANTS[i % len(MERCHANTS)]),
+                mcc=_fresh(str(5411 + i % 9)),
+                bank_category=_fresh(CATEGORIES[i % len(CATEGORIES)]),
+                category_id=_fresh("base_shopping_groceries"),
+                categorization_source=_fresh("mapping"),
+                source_file_id=_fresh("7d3c5a5e-2f6f-4c2a-9d57-5c7b8f0a1e11"),
+            )
+        )
+    return ops
+
+
+def measure(factory: Callable[..., object], count: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    ops = make_operations(factory, count)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del ops
+    return current / count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=100_000)
+    args = parser.parse_args()
+
+    before = measure(LegacyOperation, args.count)
+    after = measure(Operation, args.count)
+    print(f"operations: {args.count}")
+    print(f"before (dataclass + __dict__): {before:,.0f} bytes/op")
+    print(f"after (__slots__ + intern):    {after:,.0f} bytes/op")
+    print(f"saved: {before - after:,.0f} bytes/op ({(1 - after / before) * 100:.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
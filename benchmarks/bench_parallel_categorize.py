@@ -0,0 +1,98 @@
+"""
+Скорость перекатегоризации всего vault: categorize_many в одном процессе
+против пула процессов (categorize_parallel в services/categorization.py) при
+разном числе процессов. Пайплайн — правила, маппинг и обученная SimpleMLModel,
+без кэша решений, чтобы каждая операция доходила до модели. Результаты пула
+сверяются с последовательным проходом.
+
+    python benchmarks/bench_parallel_categorize.py --ops 500000 --workers 1 2 4 8
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from finance_app.domain import Operation, OperationType
+from finance_app.services.categorization import CategorizationPipeline, categorize_parallel
+from finance_app.services.ml_model import SimpleMLModel
+from finance_app.utils import normalize_operation
+
+
+MERCHANTS = [
+    ("Pyaterochka", "base_shopping_groceries"),
+    ("Yandex Go", "base_transport_taxi"),
+    ("Coffee Bean", "base_food_coffee"),
+    ("Apteka 36.6", "base_shopping_pharmacy"),
+    ("KFC", "base_food_fastfood"),
+    ("Lenta", "base_shopping_groceries"),
+    ("Cinema Park", "base_entertainment_cinema"),
+]
+
+
+def make_operations(count: int, rng: random.Random) -> List[Operation]:
+    operations = []
+    for i in range(count):
+        merchant, category_id = rng.choice(MERCHANTS)
+        operations.append(
+            normalize_operation(
+                Operation(
+                    id=str(i),
+                    account_id="acc",
+                    bank="alfa",
+                    date=date(2024, 1 + i % 12, 1 + i % 28),
+                    amount=Decimal(-rng.randint(1, 5000)),
+                    currency="RUB",
+                    type=OperationType.EXPENSE,
+                    description=f"Покупка {merchant} {rng.randint(1, 999)}",
+                    merchant=f"{merchant} {rng.randint(1, 50)}",
+                    mcc=None,
+                    bank_category=None,
+                    category_id=category_id,
+                )
+            )
+        )
+    return operations
+
+
+def ops_per_second(run, operations: List[Operation]) -> float:
+    started = time.perf_counter()
+    run(operations)
+    return len(operations) / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ops", type=int, default=200_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    model = SimpleMLModel()
+    model.fit(make_operations(2000, random.Random(1)))
+    pipeline = CategorizationPipeline(ml_model=model)
+
+    operations = make_operations(args.ops, random.Random(0))
+    serial = ops_per_second(lambda ops: [pipeline.categorize_many(ops[i : i + 2000]) for i in range(0, len(ops), 2000)], operations)
+    expected = [(op.category_id, op.categorization_source) for op in operations]
+    print(f"ops: {args.ops}, cpu: {os.cpu_count()}")
+    print(f"serial:       {serial:,.0f} ops/s")
+
+    for workers in sorted(set(args.workers)):
+        if workers < 2:
+            continue
+        for op in operations:
+            op.category_id = op.categorization_source = None
+        parallel = ops_per_second(lambda ops: categorize_parallel(ops, pipeline, workers), operations)
+        assert [(op.category_id, op.categorization_source) for op in operations] == expected
+        print(f"{workers:>2} workers:   {parallel:,.0f} ops/s ({parallel / serial:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Скорость разбора большой выписки Альфа-Банка: один процесс против пула
+процессов по диапазонам байт (finance_app/adapters/parallel_csv.py).
+
+    python benchmarks/bench_parallel_parse.py --rows 500000 --workers 4
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from finance_app.adapters import alfa_adapter, parallel_csv
+
+
+HEADER = "operationDate,accountName,accountNumber,type,amount,currency,comment,merchant,mcc,category"
+MERCHANTS = ["Pyaterochka", "Yandex Go", "Coffee Bean", "Ozon", "Apteka 36.6", "KFC", "Lenta"]
+
+
+def write_statement(path: Path, rows: int) -> None:
+    with open(path, "w", encoding="utf-8-sig", newline="") as fp:
+        fp.write(HEADER + "\r\n")
+        for i in range(rows):
+            merchant = MERCHANTS[i % len(MERCHANTS)]
+            day = f"{i % 28 + 1:02d}.{i % 12 + 1:02d}.{2018 + i % 7}"
+            fp.write(f'{day},Main,40817810,expense,"{i % 9000},{i % 100:02d}",RUR,"Покупка {merchant}",{merchant},5411,Food\r\n')
+
+
+def rows_per_second(parse, rows: int) -> float:
+    started = time.perf_counter()
+    count = sum(1 for _ in parse())
+    elapsed = time.perf_counter() - started
+    assert count == rows, (count, rows)
+    return rows / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=300_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "alfa.csv"
+        write_statement(path, args.rows)
+        size_mb = path.stat().st_size / 1024 / 1024
+
+        sequential = rows_per_second(lambda: alfa_adapter.iter_alfa_rows(str(path)), args.rows)
+        parallel = rows_per_second(
+            lambda: parallel_csv.parse_file_parallel(str(path), alfa_adapter.parse_alfa_rows, "utf-8-sig", args.workers),
+            args.rows,
+        )
+
+    print(f"rows: {args.rows} ({size_mb:.1f} MB), workers: {args.workers}")
+    print(f"sequential: {sequential:,.0f} rows/s")
+    print(f"parallel:   {parallel:,.0f} rows/s ({parallel / sequential:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Микробенчмарк разбора дат и сумм в адаптерах: strptime + parse_decimal
+против parse_dmy_date / parse_dmy_hms_date / parse_amount из finance_app.utils.
+
+    python benchmarks/bench_row_parsers.py --rows 200000
+"""
+
+import argparse
+import random
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from finance_app import utils
+from finance_app.utils import parse_amount, parse_decimal, parse_dmy_date, parse_dmy_hms_date
+
+
+def alfa_columns(rows: int, rng: random.Random):
+    dates = [f"{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.{rng.randint(2019, 2025)}" for _ in range(rows)]
+    amounts = [f"{rng.randint(1, 20000)},{rng.randint(0, 99):02d}" for _ in range(rows)]
+    return dates, amounts
+
+
+def tinkoff_columns(rows: int, rng: random.Random):
+    dates = [
+        f"{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.{rng.randint(2019, 2025)} "
+        f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}"
+        for _ in range(rows)
+    ]
+    amounts = [f"-{rng.randint(1, 5000)}.{rng.randint(0, 99):02d}" for _ in range(rows)]
+    return dates, amounts
+
+
+def ns_per_row(parse_date: Callable, dates: List[str], amounts: List[str], parse_money: Callable) -> float:
+    # память быстрых парсеров общая на процесс: каждый прогон начинаем с пустой
+    utils._date_memo.clear()
+    utils._amount_memo.clear()
+    started = time.perf_counter()
+    for day, amount in zip(dates, amounts):
+        parse_date(day)
+        parse_money(amount)
+    return (time.perf_counter() - started) / len(dates) * 1e9
+
+
+def report(name: str, legacy: float, fast: float) -> None:
+    print(f"{name}: strptime+parse_decimal {legacy:,.0f} ns/row, fast {fast:,.0f} ns/row ({legacy / fast:.1f}x)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200_000)
+    args = parser.parse_args()
+    rng = random.Random(0)
+
+    dates, amounts = alfa_columns(args.rows, rng)
+    legacy = ns_per_row(lambda v: datetime.strptime(v, "%d.%m.%Y").date(), dates, amounts, parse_decimal)
+    fast = ns_per_row(parse_dmy_date, dates, amounts, parse_amount)
+    report("alfa", legacy, fast)
+
+    dates, amounts = tinkoff_columns(args.rows, rng)
+    legacy = ns_per_row(lambda v: datetime.strptime(v, "%d.%m.%Y %H:%M:%S").date(), dates, amounts, parse_decimal)
+    fast = ns_per_row(parse_dmy_hms_date, dates, amounts, parse_amount)
+    report("tinkoff", legacy, fast)
+
+
+if __name__ == "__main__":
+    main()
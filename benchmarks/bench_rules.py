@@ -0,0 +1,195 @@
+"""
+Скорость правил категоризации: прежний apply_rules (цепочка проверок `in`)
+против таблицы RULES, скомпилированной в один matcher (finance_app/rules.py).
+Заодно проверяет, что на всех сгенерированных операциях результаты совпадают.
+Вторая часть — рост таблицы: та же таблица плюс N синтетических правил по
+мерчантам, последовательная проверка против скомпилированной (без памяти текстов).
+
+    python benchmarks/bench_rules.py --ops 100000
+"""
+
+import argparse
+import random
+import sys
+import time
+from decimal import Decimal
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from finance_app.category_tree import SERVICE_BASE_IDS
+from finance_app.domain import Operation, OperationType
+from finance_app.rules import RULES, CompiledRules, Rule, RuleResult, apply_rules
+from finance_app.utils import Features, build_features
+
+
+# обычные покупки правилами не распознаются — в реальной выписке их большинство
+PURCHASES = [
+    "Оплата товаров и услуг PYATEROCHKA 1234 MOSCOW RUS",
+    "Yandex Go taxi ride",
+    "Coffee Bean Moscow",
+    "Аптека 36.6 Izhevsk",
+    "Покупка LENTA-142 SANKT-PETERBURG",
+    "Оплата SBOL KINOPOISK",
+]
+SERVICE_ROWS = [
+    "Перевод по номеру телефона Иванов Иван",
+    "Покупка OZON.RU интернет-магазин",
+    "Зачисление зарплаты за ноябрь",
+    "Перевод со счета 4081 на счет 4230",
+    "Снятие наличных в банкомате",
+    "Кэшбэк за покупки",
+    "Комиссия за обслуживание карты",
+    "Wildberries заказ 123456",
+    "Оплата услуг МТС и МГТС",
+    "Погашение кредита по договору",
+]
+MERCHANTS = [None, "Pyaterochka", "Yandex Market", "Озон Банк", "Avito", "Coffee Bean", "Парковки России", "KFC"]
+MCCS = [None, "5411", "5814", "6011", "4121"]
+CATEGORIES = [None, None, None, "base_transfer_out", "base_shopping_groceries"]
+
+
+def legacy_apply_rules(operation: Operation, features: Features) -> Optional[RuleResult]:
+    feature_text = features.text
+    merchant_text = features.merchant_norm
+
+    if operation.type == OperationType.EXPENSE and "озон банк" in merchant_text:
+        return "base_transfer_out", "rule: ozon bank transfer"
+
+    if operation.type == OperationType.EXPENSE and "парковки россии" in merchant_text:
+        return "base_transport_car_service", "rule: parking topup"
+
+    if operation.type == OperationType.EXPENSE and any(
+        key in merchant_text
+        for key in ("yandex 5399 market", "yandex market", "market yandex", "ozon", "avito", "wildberries", "wb ru", "wb.")
+    ):
+        return "base_shopping_marketplace", "rule: marketplace merchant"
+    mcc = features.mcc or ""
+
+    if "кэшбэк" in feature_text:
+        return "base_income_cashback", "rule: cashback"
+
+    if operation.type == OperationType.INCOME and any(
+        key in feature_text for key in ("зарплата", "salary", "премия")
+    ):
+        return "base_income_salary", "rule: salary keyword"
+
+    if "пополнение" in feature_text or "зачисление" in feature_text:
+        return "base_topup", "rule: topup keywords"
+
+    if "внесение наличных" in feature_text:
+        return "base_topup", "rule: cash deposit"
+
+    if "снятие" in feature_text or mcc in {"6010", "6011"}:
+        return "base_cashout", "rule: cash out"
+
+    if "перевод между своими" in feature_text or "внутренний перевод" in feature_text:
+        return "base_internal_transfer", "rule: internal transfer keyword"
+    if "перевод со счета" in feature_text and "на счет" in feature_text:
+        return "base_internal_transfer", "rule: internal transfer keyword"
+
+    if "перевод" in feature_text and operation.type == OperationType.EXPENSE:
+        return "base_transfer_out", "rule: outgoing transfer keyword"
+
+    if "перевод" in feature_text and operation.type == OperationType.INCOME:
+        return "base_transfer_in", "rule: incoming transfer keyword"
+
+    if "комиссия за обслуживание" in feature_text or "комиссия за перевыпуск" in feature_text:
+        return "base_home_services", "rule: bank service fee"
+
+    if "копилка для сдачи" in feature_text:
+        return "base_internal_transfer", "rule: savings jar transfer"
+
+    if any(key in feature_text for key in ("погашение од", "погашение кредита", "погашение по кредиту")):
+        return "base_transfer_out", "rule: debt repayment keyword"
+
+    if any(key in feature_text for key in ("артемович", "артем михайлович", "кирилл артемович", "васильев артем")):
+        if operation.type == OperationType.EXPENSE:
+            return "base_transfer_out", "rule: p2p named transfer"
+
+    if "мтс и мгтс" in feature_text:
+        return "base_home_internet", "rule: telecom keyword"
+
+    if operation.category_id in SERVICE_BASE_IDS:
+        return operation.category_id, "rule: already service"
+
+    return None
+
+
+def make_operations(count: int, rng: random.Random) -> List[Tuple[Operation, Features]]:
+    items = []
+    for i in range(count):
+        op = Operation(
+            id=str(i),
+            account_id="acc",
+            bank="alfa",
+            date=None,
+            amount=Decimal(rng.randint(1, 5000)),
+            currency="RUB",
+            type=rng.choice([OperationType.EXPENSE, OperationType.EXPENSE, OperationType.INCOME]),
+            description=rng.choice(PURCHASES if rng.random() < 0.75 else SERVICE_ROWS),
+            merchant=rng.choice(MERCHANTS),
+            mcc=rng.choice(MCCS),
+            bank_category=None,
+            category_id=rng.choice(CATEGORIES),
+        )
+        items.append((op, build_features(op)))
+    return items
+
+
+def ns_per_op(apply: Callable[[Operation, Features], Optional[RuleResult]], items) -> float:
+    started = time.perf_counter()
+    for op, features in items:
+        apply(op, features)
+    return (time.perf_counter() - started) / len(items) * 1e9
+
+
+def sequential_rules(rules: List[Rule]) -> Callable[[Operation, Features], Optional[RuleResult]]:
+    """Таблица, проверяемая по порядку, как прежний apply_rules."""
+
+    def apply(operation: Operation, features: Features) -> Optional[RuleResult]:
+        texts = {"text": features.text, "merchant": features.merchant_norm}
+        for rule in rules:
+            if rule.types and operation.type not in rule.types:
+                continue
+            text = texts[rule.field]
+            if not (any(k in text for k in rule.keywords) or (features.mcc or "") in rule.mccs):
+                continue
+            if all(k in text for k in rule.also):
+                return rule.category_id, rule.source
+        return None
+
+    return apply
+
+
+def synthetic_rules(count: int) -> List[Rule]:
+    return RULES + [Rule("base_shopping_other", f"rule: shop {n}", (f"shop{n:05d}",), "merchant") for n in range(count)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ops", type=int, default=100_000)
+    args = parser.parse_args()
+    items = make_operations(args.ops, random.Random(0))
+
+    mismatches = sum(1 for op, features in items if legacy_apply_rules(op, features) != apply_rules(op, features))
+    assert mismatches == 0, f"{mismatches} mismatches"
+
+    legacy = ns_per_op(legacy_apply_rules, items)
+    compiled = ns_per_op(apply_rules, items)
+    cold = ns_per_op(CompiledRules(RULES, memo_limit=0).match, items)
+    print(f"ops: {args.ops}, results identical")
+    print(f"legacy:             {legacy:,.0f} ns/op")
+    print(f"compiled:           {compiled:,.0f} ns/op ({legacy / compiled:.2f}x)")
+    print(f"compiled, no memo:  {cold:,.0f} ns/op ({legacy / cold:.2f}x)")
+
+    for extra in (0, 100, 1000):
+        rules = synthetic_rules(extra)
+        sequential = ns_per_op(sequential_rules(rules), items)
+        compiled = ns_per_op(CompiledRules(rules, memo_limit=0).match, items)
+        print(f"{len(rules)} rules: sequential {sequential:,.0f} ns/op, compiled {compiled:,.0f} ns/op ({sequential / compiled:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,58 +1,98 @@
 import csv
-from datetime import datetime
-from typing import List
-from uuid import uuid4
+import io
+import os
+from typing import Iterator, List, Optional
 
+from finance_app.adapters import parallel_csv
+from finance_app.adapters.rows import ParsedRow, StatementSource, build_operation, open_statement
 from finance_app.domain import Operation, OperationType, Vault
-from finance_app.utils import parse_decimal
+from finance_app.fingerprints import FingerprintFilter
+from finance_app.utils import parse_amount, parse_dmy_date
 
 
-def import_alfa_csv(vault: Vault, path: str, file_id: str) -> List[Operation]:
+# кодировка выписки: и для файлов, и для потока из запроса
+ENCODING = "utf-8-sig"
+
+
+def import_alfa_csv(
+  vault: Vault, source: StatementSource, file_id: str, fingerprints: Optional[FingerprintFilter] = None
+) -> List[Operation]:
   operations: List[Operation] = []
-  # utf-8-sig BOM, поэтому берём поле operationDate и \ufeffoperationDate
-  with open(path, newline="", encoding="utf-8-sig") as fp:
-    reader = csv.DictReader(fp)
-    for row in reader:
-      # пропускаем строки без даты
-      op_date_raw = row.get("operationDate") or row.get("\ufeffoperationDate")
-      if not op_date_raw:
-        continue
-
-      raw_amount = parse_decimal(row.get("amount"))
-      type_raw = (row.get("type") or "").lower()
-
-      op_type = OperationType.EXPENSE
-      if type_raw.startswith("попол") or "пополн" in type_raw:
-        op_type = OperationType.TRANSFER
-      elif type_raw.startswith("рїр?рїр?р>р?"):  # legacy encoding for "пополн"
-        op_type = OperationType.TRANSFER
-      elif "transfer" in type_raw:
-        op_type = OperationType.TRANSFER
-      elif type_raw.startswith("income"):
-        op_type = OperationType.INCOME
-
-      amount = raw_amount if op_type != OperationType.EXPENSE else -raw_amount
-      op_date = datetime.strptime(op_date_raw, "%d.%m.%Y").date()
-      account_id = vault.ensure_account(
-        bank="alfa",
-        name=row.get("accountName") or "Счёт",
-        number=row.get("accountNumber"),
-      )
-      description = row.get("comment") or row.get("merchant") or ""
-      operation = Operation(
-        id=str(uuid4()),
-        account_id=account_id,
-        bank="alfa",
-        date=op_date,
-        amount=amount,
-        currency=(row.get("currency") or "").upper() or "RUR",
-        type=op_type,
-        description=description,
-        merchant=row.get("merchant") or None,
-        mcc=(row.get("mcc") or "").strip() or None,
-        bank_category=row.get("category") or None,
-        source_file_id=file_id,
-      )
-      vault.add_operation(operation)
-      operations.append(operation)
+  for operation in iter_alfa_operations(vault, source, file_id, fingerprints):
+    vault.add_operation(operation)
+    operations.append(operation)
   return operations
+
+
+def iter_alfa_operations(
+  vault: Vault,
+  source: StatementSource,
+  file_id: str,
+  fingerprints: Optional[FingerprintFilter] = None,
+  workers: int = 1,
+) -> Iterator[Operation]:
+  """
+  Построчно отдаёт операции выписки, не добавляя их в vault (счета заводятся сразу).
+  С workers > 1 большой файл разбирается параллельно, порядок строк сохраняется.
+  """
+  # строки, уже импортированные из пересекающейся выписки, пропускаем
+  fingerprints = fingerprints or FingerprintFilter(vault)
+  for row in iter_alfa_rows(source, workers):
+    operation = build_operation(vault, "alfa", row, file_id)
+    if not fingerprints.admit(operation):
+      continue
+    yield operation
+
+
+def iter_alfa_rows(source: StatementSource, workers: int = 1) -> Iterator[ParsedRow]:
+  if workers > 1 and isinstance(source, str) and os.path.getsize(source) >= parallel_csv.PARALLEL_MIN_BYTES:
+    yield from parallel_csv.parse_file_parallel(source, parse_alfa_rows, ENCODING, workers)
+    return
+  # utf-8-sig BOM, поэтому берём поле operationDate и \ufeffoperationDate
+  with open_statement(source, ENCODING) as fp:
+    for raw in csv.DictReader(fp):
+      row = parse_alfa_row(raw)
+      if row is not None:
+        yield row
+
+
+def parse_alfa_rows(text: str) -> List[ParsedRow]:
+  """Разобрать кусок CSV с заголовком (для параллельного разбора)."""
+  rows = map(parse_alfa_row, csv.DictReader(io.StringIO(text, newline="")))
+  return [row for row in rows if row is not None]
+
+
+def parse_alfa_row(row: dict) -> Optional[ParsedRow]:
+  # пропускаем строки без даты
+  op_date_raw = row.get("operationDate") or row.get("\ufeffoperationDate")
+  if not op_date_raw:
+    return None
+
+  raw_amount = parse_amount(row.get("amount"))
+  type_raw = (row.get("type") or "").lower()
+
+  op_type = OperationType.EXPENSE
+  if type_raw.startswith("попол") or "пополн" in type_raw:
+    op_type = OperationType.TRANSFER
+  elif type_raw.startswith("рїр?рїр?р>р?"):  # legacy encoding for "пополн"
+    op_type = OperationType.TRANSFER
+  elif "transfer" in type_raw:
+    op_type = OperationType.TRANSFER
+  elif type_raw.startswith("income"):
+    op_type = OperationType.INCOME
+
+  amount = raw_amount if op_type != OperationType.EXPENSE else -raw_amount
+  op_date = parse_dmy_date(op_date_raw)
+  description = row.get("comment") or row.get("merchant") or ""
+  return ParsedRow(
+    date=op_date,
+    amount=amount,
+    type=op_type,
+    account_name=row.get("accountName") or "Счёт",
+    account_number=row.get("accountNumber"),
+    currency=(row.get("currency") or "").upper() or "RUR",
+    description=description,
+    merchant=row.get("merchant") or None,
+    mcc=(row.get("mcc") or "").strip() or None,
+    bank_category=row.get("category") or None,
+  )
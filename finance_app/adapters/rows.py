@@ -0,0 +1,73 @@
+"""
+Разобранная строка выписки — общее промежуточное представление адаптеров.
+
+Разбор строки (даты, суммы, тип) не трогает vault, поэтому его можно делать
+в другом процессе; счёт и id операции назначаются уже при сборке Operation.
+Источник выписки — путь к файлу или уже открытый текстовый поток.
+"""
+
+import io
+from contextlib import contextmanager
+from datetime import date
+from decimal import Decimal
+from typing import BinaryIO, Iterator, NamedTuple, Optional, TextIO, Union
+from uuid import uuid4
+
+from finance_app.domain import Operation, OperationType, Vault
+from finance_app.utils import normalize_operation
+
+
+class ParsedRow(NamedTuple):
+    date: date
+    amount: Decimal
+    type: OperationType
+    account_name: str
+    account_number: Optional[str]
+    currency: str
+    description: str
+    merchant: Optional[str]
+    mcc: Optional[str]
+    bank_category: Optional[str]
+
+
+StatementSource = Union[str, TextIO]
+
+
+@contextmanager
+def open_statement(source: StatementSource, encoding: str) -> Iterator[TextIO]:
+    """Открыть файл по пути; поток отдаётся как есть, закрывает его владелец."""
+    if isinstance(source, str):
+        with open(source, newline="", encoding=encoding) as fp:
+            yield fp
+    else:
+        yield source
+
+
+def decode_stream(binary: BinaryIO, encoding: str) -> TextIO:
+    """
+    Декодировать бинарный поток (например, тело запроса) по мере чтения;
+    utf-8-sig снимает BOM в начале.
+    """
+    if isinstance(binary, io.RawIOBase):
+        binary = io.BufferedReader(binary)
+    return io.TextIOWrapper(binary, encoding=encoding, newline="")
+
+
+def build_operation(vault: Vault, bank: str, row: ParsedRow, file_id: str) -> Operation:
+    account_id = vault.ensure_account(bank=bank, name=row.account_name, number=row.account_number)
+    operation = Operation(
+        id=str(uuid4()),
+        account_id=account_id,
+        bank=bank,
+        date=row.date,
+        amount=row.amount,
+        currency=row.currency,
+        type=row.type,
+        description=row.description,
+        merchant=row.merchant,
+        mcc=row.mcc,
+        bank_category=row.bank_category,
+        source_file_id=file_id,
+    )
+    # нормализованные тексты считаются один раз здесь и дальше хранятся с операцией
+    return normalize_operation(operation)
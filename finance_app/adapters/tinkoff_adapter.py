@@ -1,39 +1,83 @@
 import csv
-from datetime import datetime
-from typing import List
-from uuid import uuid4
+import io
+import os
+from typing import Iterator, List, Optional
 
+from finance_app.adapters import parallel_csv
+from finance_app.adapters.rows import ParsedRow, StatementSource, build_operation, open_statement
 from finance_app.domain import Operation, OperationType, Vault
-from finance_app.utils import parse_decimal
+from finance_app.fingerprints import FingerprintFilter
+from finance_app.utils import parse_amount, parse_dmy_hms_date
 
 
-def import_tinkoff_csv(vault: Vault, path: str, file_id: str) -> List[Operation]:
+# кодировка выписки: и для файлов, и для потока из запроса
+ENCODING = "utf-8"
+
+
+def import_tinkoff_csv(
+    vault: Vault, source: StatementSource, file_id: str, fingerprints: Optional[FingerprintFilter] = None
+) -> List[Operation]:
     operations: List[Operation] = []
-    with open(path, newline="", encoding="utf-8") as fp:
-        reader = csv.DictReader(fp, delimiter=";")
-        for row in reader:
-            if not row.get("Дата операции"):
-                continue
-            raw_amount = parse_decimal(row.get("Сумма операции"))
-            op_type = OperationType.EXPENSE if raw_amount < 0 else OperationType.INCOME
-            amount = raw_amount
-            op_date = datetime.strptime(row.get("Дата операции"), "%d.%m.%Y %H:%M:%S").date()
-            card = row.get("Номер карты") or "Tinkoff"
-            account_id = vault.ensure_account(bank="tinkoff", name="Tinkoff", number=card)
-            operation = Operation(
-                id=str(uuid4()),
-                account_id=account_id,
-                bank="tinkoff",
-                date=op_date,
-                amount=amount,
-                currency=(row.get("Валюта операции") or "").upper() or "RUB",
-                type=op_type,
-                description=row.get("Описание") or "",
-                merchant=row.get("Описание") or None,
-                mcc=(row.get("MCC") or "").strip() or None,
-                bank_category=row.get("Категория") or None,
-                source_file_id=file_id,
-            )
-            vault.add_operation(operation)
-            operations.append(operation)
+    for operation in iter_tinkoff_operations(vault, source, file_id, fingerprints):
+        vault.add_operation(operation)
+        operations.append(operation)
     return operations
+
+
+def iter_tinkoff_operations(
+    vault: Vault,
+    source: StatementSource,
+    file_id: str,
+    fingerprints: Optional[FingerprintFilter] = None,
+    workers: int = 1,
+) -> Iterator[Operation]:
+    """
+    Построчно отдаёт операции выписки, не добавляя их в vault (счета заводятся сразу).
+    С workers > 1 большой файл разбирается параллельно, порядок строк сохраняется.
+    """
+    # строки, уже импортированные из пересекающейся выписки, пропускаем
+    fingerprints = fingerprints or FingerprintFilter(vault)
+    for row in iter_tinkoff_rows(source, workers):
+        operation = build_operation(vault, "tinkoff", row, file_id)
+        if not fingerprints.admit(operation):
+            continue
+        yield operation
+
+
+def iter_tinkoff_rows(source: StatementSource, workers: int = 1) -> Iterator[ParsedRow]:
+    if workers > 1 and isinstance(source, str) and os.path.getsize(source) >= parallel_csv.PARALLEL_MIN_BYTES:
+        yield from parallel_csv.parse_file_parallel(source, parse_tinkoff_rows, ENCODING, workers)
+        return
+    with open_statement(source, ENCODING) as fp:
+        for raw in csv.DictReader(fp, delimiter=";"):
+            row = parse_tinkoff_row(raw)
+            if row is not None:
+                yield row
+
+
+def parse_tinkoff_rows(text: str) -> List[ParsedRow]:
+    """Разобрать кусок CSV с заголовком (для параллельного разбора)."""
+    rows = map(parse_tinkoff_row, csv.DictReader(io.StringIO(text, newline=""), delimiter=";"))
+    return [row for row in rows if row is not None]
+
+
+def parse_tinkoff_row(row: dict) -> Optional[ParsedRow]:
+    if not row.get("Дата операции"):
+        return None
+    raw_amount = parse_amount(row.get("Сумма операции"))
+    op_type = OperationType.EXPENSE if raw_amount < 0 else OperationType.INCOME
+    amount = raw_amount
+    op_date = parse_dmy_hms_date(row.get("Дата операции"))
+    card = row.get("Номер карты") or "Tinkoff"
+    return ParsedRow(
+        date=op_date,
+        amount=amount,
+        type=op_type,
+        account_name="Tinkoff",
+        account_number=card,
+        currency=(row.get("Валюта операции") or "").upper() or "RUB",
+        description=row.get("Описание") or "",
+        merchant=row.get("Описание") or None,
+        mcc=(row.get("MCC") or "").strip() or None,
+        bank_category=row.get("Категория") or None,
+    )
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import hashlib
 from typing import Dict, Optional, Tuple
 
 from finance_app.utils import normalize_text
@@ -163,11 +164,37 @@ def lookup_base_category(bank: str, bank_category: Optional[str]) -> Optional[st
     return BANK_CATEGORY_TO_BASE.get(fallback_key)
 
 
-def lookup_base_category_norm(bank: str, bank_category_norm: str) -> Optional[str]:
+def lookup_base_category_norm(
+    bank: str, bank_category_norm: str, mapping: Optional[Dict[Tuple[str, str], str]] = None
+) -> Optional[str]:
+    if mapping is None:
+        mapping = BANK_CATEGORY_TO_BASE
     bank_norm = normalize_text(bank)
     cat_norm = bank_category_norm
     exact_key = (bank_norm, cat_norm)
-    if exact_key in BANK_CATEGORY_TO_BASE:
-        return BANK_CATEGORY_TO_BASE[exact_key]
+    if exact_key in mapping:
+        return mapping[exact_key]
     fallback_key = ("*", cat_norm)
-    return BANK_CATEGORY_TO_BASE.get(fallback_key)
+    return mapping.get(fallback_key)
+
+
+_version_memo: Tuple[Optional[int], str] = (None, "")
+
+
+def mapping_version(mapping: Optional[Dict[Tuple[str, str], str]] = None) -> str:
+    """
+    Отпечаток маппинга, стабильный между запусками. Для BANK_CATEGORY_TO_BASE
+    (по умолчанию) sha1 пересчитывается только после изменения словаря.
+    """
+    global _version_memo
+    if mapping is not None and mapping is not BANK_CATEGORY_TO_BASE:
+        return _mapping_sha(mapping)
+    # hash() строк случаен от запуска к запуску, поэтому он лишь сторожит пересчёт sha1
+    current = hash(frozenset(BANK_CATEGORY_TO_BASE.items()))
+    if _version_memo[0] != current:
+        _version_memo = (current, _mapping_sha(BANK_CATEGORY_TO_BASE))
+    return _version_memo[1]
+
+
+def _mapping_sha(mapping: Dict[Tuple[str, str], str]) -> str:
+    return hashlib.sha1(repr(sorted(mapping.items())).encode("utf-8")).hexdigest()
@@ -1,8 +1,16 @@
+import sys
 from dataclasses import dataclass, field
 from datetime import date
 from decimal import Decimal
 from enum import Enum
-from typing import Dict, List, Optional
+from itertools import compress, repeat
+from operator import attrgetter, ne
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
+
+if TYPE_CHECKING:
+    from finance_app.operation_store import OperationStore
+    from finance_app.vault_changes import ChangeLog
+    from finance_app.vault_index import VaultIndex
 
 
 class OperationType(str, Enum):
@@ -11,7 +19,23 @@ class OperationType(str, Enum):
     TRANSFER = "TRANSFER"
 
 
-@dataclass
+# поля с небольшим числом различных значений: храним одну копию строки на значение
+_INTERNED_FIELDS = (
+    "account_id",
+    "bank",
+    "currency",
+    "merchant",
+    "mcc",
+    "bank_category",
+    "category_id",
+    "categorization_source",
+    "source_file_id",
+    "merchant_norm",
+    "bank_category_norm",
+)
+
+
+@dataclass(slots=True)
 class Operation:
     id: str
     account_id: str
@@ -27,6 +51,16 @@ class Operation:
     category_id: Optional[str] = None
     categorization_source: Optional[str] = None
     source_file_id: Optional[str] = None
+    # нормализованные тексты для категоризации (utils.normalize_operation); None — ещё не посчитаны
+    text_norm: Optional[str] = None
+    merchant_norm: Optional[str] = None
+    bank_category_norm: Optional[str] = None
+
+    def __post_init__(self) -> None:
+        for name in _INTERNED_FIELDS:
+            value = getattr(self, name)
+            if type(value) is str:
+                setattr(self, name, sys.intern(value))
 
 
 @dataclass
@@ -49,10 +83,45 @@ class Vault:
     operations: List[Operation] = field(default_factory=list)
     accounts: Dict[str, Account] = field(default_factory=dict)
     categories: Dict[str, Category] = field(default_factory=dict)
+    # необязательное колоночное зеркало operations для агрегатов без Decimal
+    store: Optional["OperationStore"] = field(default=None, repr=False, compare=False)
+    _index: "VaultIndex" = field(init=False, repr=False, compare=False)
+    changes: "ChangeLog" = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        from finance_app.vault_changes import ChangeLog
+        from finance_app.vault_index import VaultIndex
+
+        self._index = VaultIndex(self.operations)
+        self.changes = ChangeLog()
+
+    @property
+    def version(self) -> int:
+        return self.changes.version
+
+    @property
+    def index(self) -> "VaultIndex":
+        return self._index
+
+    def _sync_index(self) -> None:
+        # страховка от правок vault.operations в обход методов Vault: индекс
+        # пересобирается при следующей мутации, а не при чтении, чтобы чтение
+        # не сбрасывало версии клиентов
+        if len(self._index) != len(self.operations):
+            from finance_app.vault_index import VaultIndex
+
+            self._index = VaultIndex(self.operations)
+            self.changes.reset()
+
+    def enable_store(self) -> "OperationStore":
+        from finance_app.operation_store import OperationStore
+
+        self.store = OperationStore(self.operations)
+        return self.store
 
     def reset(self) -> None:
-        self.operations.clear()
         self.accounts.clear()
+        self.replace_operations([])
 
     def ensure_account(self, bank: str, name: str, number: Optional[str]) -> str:
         account_id = f"{bank}:{number or name}"
@@ -63,4 +132,44 @@ class Vault:
         return account_id
 
     def add_operation(self, operation: Operation) -> None:
+        self._sync_index()
+        self._index.add(operation)
         self.operations.append(operation)
+        if self.store is not None:
+            self.store.append(operation)
+        self.changes.added((operation,))
+
+    def replace_operations(self, operations: Iterable[Operation]) -> None:
+        from finance_app.vault_index import VaultIndex
+
+        self.operations[:] = operations
+        self._index = VaultIndex(self.operations)
+        if self.store is not None:
+            self.store.rebuild(self.operations)
+        self.changes.reset()
+
+    def remove_file_operations(self, file_id: str) -> int:
+        self._sync_index()
+        removed = self._index.by_source_file(file_id)
+        if not removed:
+            return 0
+        self._index.remove(removed)
+        # фильтр целиком на C-итераторах, без питоновского цикла по операциям
+        keep = map(ne, map(attrgetter("source_file_id"), self.operations), repeat(file_id))
+        self.operations[:] = compress(self.operations, keep)
+        if self.store is not None:
+            self.store.rebuild(self.operations)
+        self.changes.removed(removed)
+        return len(removed)
+
+    def recategorized(self, operations: Iterable[Operation]) -> None:
+        """Сообщить vault, что у этих операций поменялись category_id/categorization_source."""
+        self._sync_index()
+        index = self._index
+        changed = []
+        for op in operations:
+            if index.recategorized(op):
+                changed.append(op)
+            if self.store is not None:
+                self.store.update_category(op)
+        self.changes.recategorized(changed)
@@ -0,0 +1,60 @@
+"""
+Отпечатки операций для дедупликации пересекающихся выписок.
+
+Отпечаток — сам нормализованный кортеж (счёт, дата, сумма, описание, MCC), а
+не его хэш: при коллизии хэшей настоящая строка выписки молча пропускалась бы.
+id операций здесь не годится: адаптеры выдают каждой строке новый uuid4.
+Счётчики отпечатков живут в VaultIndex и пересобираются из сохранённых
+операций, поэтому удаление файла выписки сразу «забывает» его строки.
+"""
+
+from collections import Counter
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Optional, Tuple
+
+from finance_app.domain import Operation
+from finance_app.utils import normalize_text
+
+
+Fingerprint = Tuple[str, date, Decimal, str, str]
+
+
+def operation_fingerprint(op: Operation) -> Fingerprint:
+    # Decimal("100") и Decimal("100.00") равны, поэтому и ключи словаря совпадают
+    return (op.account_id, op.date, op.amount, normalize_text(op.description), op.mcc or "")
+
+
+class FingerprintFilter:
+    """
+    Фильтр строк одного импорта. Одинаковые строки внутри файла законны
+    (два одинаковых кофе за день), поэтому считаем вхождения: k-я копия
+    отпечатка пропускается, только если в vault уже есть не меньше k таких
+    операций из прежних импортов.
+
+    pending — отпечатки, уже принятые из других файлов той же пачки, но ещё
+    не добавленные в vault; принятые этим фильтром копятся в admitted.
+    """
+
+    def __init__(self, vault, pending: Optional[Counter] = None) -> None:
+        self._vault = vault
+        self._pending = pending if pending is not None else Counter()
+        self._seen: Counter = Counter()
+        # сколько таких операций было в vault (и в пачке) до этого импорта
+        self._known: Dict[Fingerprint, int] = {}
+        self.admitted: Counter = Counter()
+        self.skipped = 0
+
+    def admit(self, op: Operation) -> bool:
+        fingerprint = operation_fingerprint(op)
+        known = self._known.get(fingerprint)
+        if known is None:
+            known = self._known[fingerprint] = (
+                self._vault.index.fingerprint_count(fingerprint) + self._pending[fingerprint]
+            )
+        self._seen[fingerprint] += 1
+        if self._seen[fingerprint] <= known:
+            self.skipped += 1
+            return False
+        self.admitted[fingerprint] += 1
+        return True
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Словарь мерчантов и MCC для ML-заглушки — данные в data/merchant_dictionary.json.
+
+MCC раскладываются в массив на все 10 000 кодов, ключевые слова мерчантов — в
+одно регулярное выражение-бор, которое прикладывается только к началам слов
+текста. Поиск не зависит от размера словаря: в каждом начале слова бор
+спускается не глубже самого длинного ключа. Ключ совпадает с началом слова
+текста ("кин" находит "кинотеатр"); из нескольких совпавших ключей побеждает
+тот, что раньше в файле. Файл перечитывается, когда меняется его mtime.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from finance_app.category_tree import CATEGORY_INDEX
+from finance_app.utils import normalize_text, trie_pattern
+
+DICTIONARY_PATH = Path(__file__).parent / "data" / "merchant_dictionary.json"
+
+MCC_CODES = 10_000
+
+
+class MerchantDictionary:
+    def __init__(self, mcc: Dict[str, str], merchants: List[Tuple[str, str]], version: str = "") -> None:
+        self.version = version
+        self._mcc: List[Optional[str]] = [None] * MCC_CODES
+        for code, category_id in mcc.items():
+            if not (len(code) == 4 and code.isdigit()):
+                raise ValueError(f"bad MCC {code!r}")
+            self._mcc[int(code)] = _checked(category_id)
+        # ключ -> место в файле; повтор ключа ниже по файлу ничего не меняет
+        priority: Dict[str, int] = {}
+        self._categories: List[str] = []
+        for keyword, category_id in merchants:
+            key = normalize_text(keyword)
+            if not key:
+                raise ValueError(f"empty merchant keyword {keyword!r}")
+            if key not in priority:
+                priority[key] = len(self._categories)
+                self._categories.append(_checked(category_id))
+        self.size = len(self._categories)
+        # бор находит в позиции самый длинный ключ; ключи-префиксы совпали там же,
+        # поэтому для каждого ключа заранее берётся лучший приоритет среди его префиксов
+        self._best: Dict[str, int] = {
+            key: min(priority.get(key[:end], place) for end in range(1, len(key) + 1))
+            for key, place in priority.items()
+        }
+        self._search = re.compile(r"\b" + trie_pattern(priority)).search if priority else None
+
+    @classmethod
+    def from_file(cls, path: Path) -> "MerchantDictionary":
+        raw = path.read_bytes()
+        data = json.loads(raw.decode("utf-8"))
+        merchants = [(keyword, category_id) for keyword, category_id in data.get("merchants", [])]
+        return cls(data.get("mcc", {}), merchants, version=hashlib.sha1(raw).hexdigest())
+
+    def lookup_mcc(self, mcc: Optional[str]) -> Optional[str]:
+        if mcc and len(mcc) == 4 and mcc.isdigit():
+            return self._mcc[int(mcc)]
+        return None
+
+    def lookup_text(self, text: str) -> Optional[str]:
+        """Категория самого приоритетного ключа, найденного в нормализованном тексте."""
+        if self._search is None or not text:
+            return None
+        best: Optional[int] = None
+        match = self._search(text)
+        while match is not None:
+            found = self._best[match.group()]
+            if best is None or found < best:
+                best = found
+            if best == 0:
+                break
+            match = self._search(text, match.start() + 1)
+        return self._categories[best] if best is not None else None
+
+    def lookup(self, text: str, mcc: Optional[str]) -> Optional[str]:
+        """MCC важнее ключевых слов — как в прежней заглушке."""
+        return self.lookup_mcc(mcc) or self.lookup_text(text)
+
+
+def _checked(category_id: str) -> str:
+    if category_id not in CATEGORY_INDEX:
+        raise ValueError(f"unknown category {category_id!r}")
+    return category_id
+
+
+class ReloadingDictionary:
+    """
+    Словарь из файла, который перечитывается при изменении mtime.
+    Если новый файл не разбирается, остаётся прежний словарь, а ошибка
+    сохраняется в last_error.
+    """
+
+    def __init__(self, path: Path = DICTIONARY_PATH) -> None:
+        self.path = path
+        self.last_error: Optional[Exception] = None
+        self._lock = threading.Lock()
+        self._mtime: Optional[int] = None
+        self._dictionary = MerchantDictionary({}, [])
+        self.reload()
+
+    def reload(self) -> MerchantDictionary:
+        """Перечитать файл; ошибка разбора пробрасывается, прежний словарь остаётся."""
+        with self._lock:
+            mtime = os.stat(self.path).st_mtime_ns
+            self._dictionary = MerchantDictionary.from_file(self.path)
+            self._mtime = mtime
+            self.last_error = None
+            return self._dictionary
+
+    def current(self) -> MerchantDictionary:
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return self._dictionary
+        if mtime != self._mtime:
+            try:
+                self.reload()
+            except (OSError, ValueError, TypeError) as exc:
+                # сломанный файл не перечитываем на каждой операции
+                self._mtime = mtime
+                self.last_error = exc
+        return self._dictionary
+
+
+MERCHANT_DICTIONARY = ReloadingDictionary()
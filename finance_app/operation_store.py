@@ -0,0 +1,150 @@
+"""
+Колоночное хранилище операций (struct-of-arrays) для агрегатов без Decimal.
+
+Суммы лежат в int64 минимальных единицах, даты — в int32 порядковых номерах,
+тип и категория — в маленьких целочисленных кодах, мерчанты — словарём.
+Сами объекты Operation тоже хранятся, row(i) отдаёт их существующему коду.
+"""
+
+from array import array
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from finance_app.domain import Operation, OperationType
+
+
+TYPE_CODES: List[OperationType] = list(OperationType)
+_TYPE_INDEX: Dict[OperationType, int] = {op_type: code for code, op_type in enumerate(TYPE_CODES)}
+INCOME_CODE = _TYPE_INDEX[OperationType.INCOME]
+EXPENSE_CODE = _TYPE_INDEX[OperationType.EXPENSE]
+
+
+class _Dictionary:
+    """Словарное кодирование строк: значение -> код, None -> -1."""
+
+    def __init__(self) -> None:
+        self.values: List[str] = []
+        self._codes: Dict[str, int] = {}
+
+    def encode(self, value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def decode(self, code: int) -> Optional[str]:
+        return self.values[code] if code >= 0 else None
+
+
+class OperationStore:
+    def __init__(self, operations: Iterable[Operation] = (), scale: int = 2) -> None:
+        self._reset(scale)
+        self.extend(operations)
+
+    def _reset(self, scale: int) -> None:
+        self.scale = scale
+        self.amounts = array("q")
+        self.dates = array("i")
+        self.types = array("b")
+        self.categories = array("i")
+        self.merchants = array("i")
+        self.category_dict = _Dictionary()
+        self.merchant_dict = _Dictionary()
+        self._rows: List[Operation] = []
+        self._positions: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __iter__(self) -> Iterator[Operation]:
+        return iter(self._rows)
+
+    def row(self, index: int) -> Operation:
+        return self._rows[index]
+
+    def _to_minor(self, amount: Decimal) -> int:
+        exponent = amount.as_tuple().exponent
+        if isinstance(exponent, int) and -exponent > self.scale:
+            # сумма точнее текущего масштаба: переводим всю колонку на больший масштаб
+            factor = 10 ** (-exponent - self.scale)
+            self.amounts = array("q", (value * factor for value in self.amounts))
+            self.scale = -exponent
+        return int(amount.scaleb(self.scale))
+
+    def append(self, op: Operation) -> None:
+        # _to_minor может заменить колонку сумм, поэтому считаем до обращения к ней
+        minor = self._to_minor(op.amount)
+        self.amounts.append(minor)
+        self.dates.append(op.date.toordinal())
+        self.types.append(_TYPE_INDEX[op.type])
+        self.categories.append(self.category_dict.encode(op.category_id))
+        self.merchants.append(self.merchant_dict.encode(op.merchant))
+        self._positions[op.id] = len(self._rows)
+        self._rows.append(op)
+
+    def extend(self, operations: Iterable[Operation]) -> None:
+        for op in operations:
+            self.append(op)
+
+    def clear(self) -> None:
+        self._reset(scale=2)
+
+    def rebuild(self, operations: Iterable[Operation]) -> None:
+        self._reset(scale=2)
+        self.extend(operations)
+
+    def update_category(self, op: Operation) -> None:
+        index = self._positions.get(op.id)
+        if index is not None:
+            self.categories[index] = self.category_dict.encode(op.category_id)
+
+    def to_amount(self, minor: int) -> float:
+        return minor / 10**self.scale
+
+    # --- агрегаты -------------------------------------------------------------
+
+    def totals(self) -> Tuple[int, int]:
+        """(доходы, расходы) в минимальных единицах; расходы по модулю."""
+        income = 0
+        expense = 0
+        for amount, type_code in zip(self.amounts, self.types):
+            if type_code == INCOME_CODE:
+                income += amount
+            elif type_code == EXPENSE_CODE:
+                expense += abs(amount)
+        return income, expense
+
+    def signed_by_category(self, op_type: Optional[OperationType] = None) -> Dict[Optional[str], int]:
+        """Доходы со знаком плюс, всё остальное — минус; ключ — category_id."""
+        wanted = _TYPE_INDEX[op_type] if op_type else None
+        by_code: Dict[int, int] = {}
+        for amount, type_code, category in zip(self.amounts, self.types, self.categories):
+            if wanted is not None and type_code != wanted:
+                continue
+            value = amount if type_code == INCOME_CODE else -abs(amount)
+            by_code[category] = by_code.get(category, 0) + value
+        return {self.category_dict.decode(code): value for code, value in by_code.items()}
+
+    def monthly_totals(self) -> Dict[Tuple[int, int], Tuple[int, int]]:
+        """(год, месяц) -> (доходы, расходы) в минимальных единицах."""
+        months: Dict[int, Tuple[int, int]] = {}
+        buckets: Dict[Tuple[int, int], List[int]] = {}
+        for amount, ordinal, type_code in zip(self.amounts, self.dates, self.types):
+            if type_code != INCOME_CODE and type_code != EXPENSE_CODE:
+                continue
+            key = months.get(ordinal)
+            if key is None:
+                day = date.fromordinal(ordinal)
+                key = months[ordinal] = (day.year, day.month)
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = [0, 0]
+            if type_code == INCOME_CODE:
+                bucket[0] += amount
+            else:
+                bucket[1] += abs(amount)
+        return {key: (values[0], values[1]) for key, values in buckets.items()}
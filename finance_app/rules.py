@@ -1,74 +1,166 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-from typing import Optional, Tuple
+"""
+Правила категоризации — таблица RULES, скомпилированная в один matcher.
+
+Все ключевые слова поля (текст операции или мерчант) собраны в одно регулярное
+выражение-бор, поэтому текст просматривается один раз, а проверяются только
+правила, чьи слова или MCC встретились; результат запоминается по тексту.
+Порядок в таблице — приоритет: срабатывает первое подходящее правило.
+"""
+import hashlib
+import re
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Set, Tuple
 
 from finance_app.category_tree import SERVICE_BASE_IDS
 from finance_app.domain import Operation, OperationType
-from finance_app.utils import Features
+from finance_app.utils import Features, trie_pattern
 
 RuleResult = Tuple[str, str]
 
-
-def apply_rules(operation: Operation, features: Features) -> Optional[RuleResult]:
-    feature_text = features.text
-    merchant_text = features.merchant_norm
-
-    if operation.type == OperationType.EXPENSE and "озон банк" in merchant_text:
-        return "base_transfer_out", "rule: ozon bank transfer"
-
-    if operation.type == OperationType.EXPENSE and "парковки россии" in merchant_text:
-        return "base_transport_car_service", "rule: parking topup"
-
-    if operation.type == OperationType.EXPENSE and any(
-        key in merchant_text
-        for key in ("yandex 5399 market", "yandex market", "market yandex", "ozon", "avito", "wildberries", "wb ru", "wb.")
-    ):
-        return "base_shopping_marketplace", "rule: marketplace merchant"
-    mcc = features.mcc or ""
-
-    if "кэшбэк" in feature_text:
-        return "base_income_cashback", "rule: cashback"
-
-    if operation.type == OperationType.INCOME and any(
-        key in feature_text for key in ("зарплата", "salary", "премия")
-    ):
-        return "base_income_salary", "rule: salary keyword"
-
-    if "пополнение" in feature_text or "зачисление" in feature_text:
-        return "base_topup", "rule: topup keywords"
-
-    if "внесение наличных" in feature_text:
-        return "base_topup", "rule: cash deposit"
-
-    if "снятие" in feature_text or mcc in {"6010", "6011"}:
-        return "base_cashout", "rule: cash out"
-
-    if "перевод между своими" in feature_text or "внутренний перевод" in feature_text:
-        return "base_internal_transfer", "rule: internal transfer keyword"
-    if "перевод со счета" in feature_text and "на счет" in feature_text:
-        return "base_internal_transfer", "rule: internal transfer keyword"
-
-    if "перевод" in feature_text and operation.type == OperationType.EXPENSE:
-        return "base_transfer_out", "rule: outgoing transfer keyword"
-
-    if "перевод" in feature_text and operation.type == OperationType.INCOME:
-        return "base_transfer_in", "rule: incoming transfer keyword"
-
-    if "комиссия за обслуживание" in feature_text or "комиссия за перевыпуск" in feature_text:
-        return "base_home_services", "rule: bank service fee"
-
-    if "копилка для сдачи" in feature_text:
-        return "base_internal_transfer", "rule: savings jar transfer"
-
-    if any(key in feature_text for key in ("погашение од", "погашение кредита", "погашение по кредиту")):
-        return "base_transfer_out", "rule: debt repayment keyword"
-
-    if any(key in feature_text for key in ("артемович", "артем михайлович", "кирилл артемович", "васильев артем")):
-        if operation.type == OperationType.EXPENSE:
-            return "base_transfer_out", "rule: p2p named transfer"
-
-    if "мтс и мгтс" in feature_text:
-        return "base_home_internet", "rule: telecom keyword"
+# сколько сочетаний (текст, мерчант, MCC) помнит CompiledRules
+MEMO_LIMIT = 65536
+
+# кортежи, а не множества: проверка `in` по identity обходится без хэша Enum
+EXPENSE = (OperationType.EXPENSE,)
+INCOME = (OperationType.INCOME,)
+
+
+class Rule(NamedTuple):
+    category_id: str
+    source: str
+    # любое из слов в поле field ("text" или "merchant") либо MCC из mccs
+    keywords: Tuple[str, ...] = ()
+    field: str = "text"
+    mccs: FrozenSet[str] = frozenset()
+    # дополнительно должны встретиться все эти слова того же поля
+    also: Tuple[str, ...] = ()
+    # пусто — любой тип операции
+    types: Tuple[OperationType, ...] = ()
+
+
+RULES: List[Rule] = [
+    Rule("base_transfer_out", "rule: ozon bank transfer", ("озон банк",), "merchant", types=EXPENSE),
+    Rule("base_transport_car_service", "rule: parking topup", ("парковки россии",), "merchant", types=EXPENSE),
+    Rule(
+        "base_shopping_marketplace",
+        "rule: marketplace merchant",
+        ("yandex 5399 market", "yandex market", "market yandex", "ozon", "avito", "wildberries", "wb ru", "wb."),
+        "merchant",
+        types=EXPENSE,
+    ),
+    Rule("base_income_cashback", "rule: cashback", ("кэшбэк",)),
+    Rule("base_income_salary", "rule: salary keyword", ("зарплата", "salary", "премия"), types=INCOME),
+    Rule("base_topup", "rule: topup keywords", ("пополнение", "зачисление")),
+    Rule("base_topup", "rule: cash deposit", ("внесение наличных",)),
+    Rule("base_cashout", "rule: cash out", ("снятие",), mccs=frozenset({"6010", "6011"})),
+    Rule("base_internal_transfer", "rule: internal transfer keyword", ("перевод между своими", "внутренний перевод")),
+    Rule("base_internal_transfer", "rule: internal transfer keyword", ("перевод со счета",), also=("на счет",)),
+    Rule("base_transfer_out", "rule: outgoing transfer keyword", ("перевод",), types=EXPENSE),
+    Rule("base_transfer_in", "rule: incoming transfer keyword", ("перевод",), types=INCOME),
+    Rule("base_home_services", "rule: bank service fee", ("комиссия за обслуживание", "комиссия за перевыпуск")),
+    Rule("base_internal_transfer", "rule: savings jar transfer", ("копилка для сдачи",)),
+    Rule(
+        "base_transfer_out",
+        "rule: debt repayment keyword",
+        ("погашение од", "погашение кредита", "погашение по кредиту"),
+    ),
+    Rule(
+        "base_transfer_out",
+        "rule: p2p named transfer",
+        ("артемович", "артем михайлович", "кирилл артемович", "васильев артем"),
+        types=EXPENSE,
+    ),
+    Rule("base_home_internet", "rule: telecom keyword", ("мтс и мгтс",)),
+]
+
+
+class _KeywordMatcher:
+    """
+    Все вхождения набора подстрок за один проход регулярного выражения.
+    В каждой позиции находится самое длинное слово, а слова, которые в нём
+    содержатся, добавляются из заранее посчитанного implied. Следующий поиск
+    начинается со следующего символа после начала совпадения.
+    """
+
+    def __init__(self, keywords: Iterable[str]) -> None:
+        words = sorted(set(keywords))
+        self._search = re.compile(trie_pattern(words)).search if words else None
+        self._implied: Dict[str, FrozenSet[str]] = {
+            word: frozenset(other for other in words if other in word) for word in words
+        }
+
+    def find(self, text: str) -> FrozenSet[str]:
+        found: FrozenSet[str] = frozenset()
+        if self._search is None or not text:
+            return found
+        match = self._search(text)
+        while match is not None:
+            found = found | self._implied[match.group()]
+            match = self._search(text, match.start() + 1)
+        return found
+
+
+class CompiledRules:
+    def __init__(self, rules: List[Rule], memo_limit: int = MEMO_LIMIT) -> None:
+        self.rules = list(rules)
+        self._by_keyword: Dict[str, Dict[str, List[int]]] = {"text": {}, "merchant": {}}
+        self._by_mcc: Dict[str, List[int]] = {}
+        words: Dict[str, Set[str]] = {"text": set(), "merchant": set()}
+        for index, rule in enumerate(self.rules):
+            words[rule.field].update(rule.keywords + rule.also)
+            for keyword in rule.keywords:
+                self._by_keyword[rule.field].setdefault(keyword, []).append(index)
+            for mcc in rule.mccs:
+                self._by_mcc.setdefault(mcc, []).append(index)
+        self._matchers = {field_name: _KeywordMatcher(field_words) for field_name, field_words in words.items()}
+        # тексты операций в выписках сильно повторяются (те же мерчанты): правила,
+        # подходящие по словам и MCC, запоминаются; тип операции проверяется всегда
+        self._memo: Dict[Tuple[str, str, Optional[str]], Tuple[int, ...]] = {}
+        self._memo_limit = memo_limit
+        # отпечаток таблицы, стабильный между запусками (MCC сортируются: порядок frozenset случаен)
+        canonical = [(*rule[:4], sorted(rule.mccs), rule.also, [t.value for t in rule.types]) for rule in self.rules]
+        self.version = hashlib.sha1(repr(canonical).encode("utf-8")).hexdigest()
+
+    def candidates(self, text: str, merchant_norm: str, mcc: Optional[str]) -> Tuple[int, ...]:
+        """Номера правил (по порядку), чьи слова и MCC подходят; тип операции не проверяется."""
+        found = {"text": self._matchers["text"].find(text), "merchant": self._matchers["merchant"].find(merchant_norm)}
+        positions: Set[int] = set(self._by_mcc.get(mcc or "", ()))
+        for field_name, keywords in found.items():
+            index = self._by_keyword[field_name]
+            for keyword in keywords:
+                positions.update(index.get(keyword, ()))
+        return tuple(
+            position
+            for position in sorted(positions)
+            if found[self.rules[position].field].issuperset(self.rules[position].also)
+        )
+
+    def match(self, operation: Operation, features: Features) -> Optional[RuleResult]:
+        key = (features.text, features.merchant_norm, features.mcc)
+        positions = self._memo.get(key)
+        if positions is None:
+            positions = self.candidates(*key)
+            if self._memo_limit:
+                if len(self._memo) >= self._memo_limit:
+                    self._memo.clear()
+                self._memo[key] = positions
+        for position in positions:
+            rule = self.rules[position]
+            if not rule.types or operation.type in rule.types:
+                return rule.category_id, rule.source
+        return None
+
+
+COMPILED_RULES = CompiledRules(RULES)
+
+
+def apply_rules(
+    operation: Operation, features: Features, compiled: Optional[CompiledRules] = None
+) -> Optional[RuleResult]:
+    matched = (compiled or COMPILED_RULES).match(operation, features)
+    if matched:
+        return matched
 
     if operation.category_id in SERVICE_BASE_IDS:
         return operation.category_id, "rule: already service"
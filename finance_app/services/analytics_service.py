@@ -5,13 +5,20 @@ from typing import Dict, List, Optional, Tuple
 
 from finance_app.category_tree import CATEGORY_INDEX, SERVICE_BASE_IDS, TRAVEL_BASE_IDS, find_parent_sys
 from finance_app.domain import Operation, OperationType, Vault
-from finance_app.utils import normalize_text
+from finance_app.utils import normalize_operation, normalize_text
 
 
 def _select_ops(vault: Vault, operations: Optional[List[Operation]] = None) -> List[Operation]:
     return operations if operations is not None else vault.operations
 
 
+def _whole_vault_store(vault: Vault, operations: Optional[List[Operation]]):
+    # агрегаты по всему vault считаем по колонкам, если колоночное зеркало включено
+    if vault.store is not None and (operations is None or operations is vault.operations):
+        return vault.store
+    return None
+
+
 def filter_operations(
     vault: Vault,
     start: Optional[date] = None,
@@ -19,8 +26,15 @@ def filter_operations(
     exclude_transfers: bool = False,
     transfers_only: bool = False,
 ) -> List[Operation]:
+    # сужаем кандидатов по индексам вместо прохода по всему vault
+    if transfers_only:
+        candidates = vault.index.in_categories(SERVICE_BASE_IDS)
+    elif start or end:
+        candidates = vault.index.between(start, end)
+    else:
+        candidates = vault.operations
     ops = []
-    for op in vault.operations:
+    for op in candidates:
         if start and op.date < start:
             continue
         if end and op.date > end:
@@ -34,6 +48,14 @@ def filter_operations(
 
 
 def compute_totals(vault: Vault, operations: Optional[List[Operation]] = None) -> Dict[str, float]:
+    store = _whole_vault_store(vault, operations)
+    if store is not None:
+        income_minor, expense_minor = store.totals()
+        return {
+            "income": store.to_amount(income_minor),
+            "expense": store.to_amount(expense_minor),
+            "net": store.to_amount(income_minor - expense_minor),
+        }
     ops = _select_ops(vault, operations)
     income = Decimal("0")
     expense = Decimal("0")
@@ -72,18 +94,26 @@ def breakdown_by_base(
     op_type: Optional[OperationType] = None,
     operations: Optional[List[Operation]] = None,
 ) -> List[Dict[str, object]]:
-    ops = _select_ops(vault, operations)
-    totals: Dict[str, Decimal] = defaultdict(Decimal)
-    for op in ops:
-        if op_type and op.type != op_type:
-            continue
-        base = op.category_id or "base_unknown"
-        value = op.amount if op.type == OperationType.INCOME else abs(op.amount) * -1
-        totals[base] += value
+    store = _whole_vault_store(vault, operations)
+    if store is not None:
+        minor_totals: Dict[str, int] = defaultdict(int)
+        for cid, value in store.signed_by_category(op_type).items():
+            minor_totals[cid or "base_unknown"] += value
+        amounts = {cid: store.to_amount(value) for cid, value in minor_totals.items()}
+    else:
+        ops = _select_ops(vault, operations)
+        totals: Dict[str, Decimal] = defaultdict(Decimal)
+        for op in ops:
+            if op_type and op.type != op_type:
+                continue
+            base = op.category_id or "base_unknown"
+            value = op.amount if op.type == OperationType.INCOME else abs(op.amount) * -1
+            totals[base] += value
+        amounts = {cid: float(amount) for cid, amount in totals.items()}
     results = []
-    for cid, amount in totals.items():
+    for cid, amount in amounts.items():
         cat = CATEGORY_INDEX.get(cid)
-        results.append({"id": cid, "name": cat.name if cat else cid, "amount": float(amount)})
+        results.append({"id": cid, "name": cat.name if cat else cid, "amount": amount})
     results.sort(key=lambda x: abs(x["amount"]), reverse=True)
     if limit:
         return results[:limit]
@@ -114,6 +144,16 @@ def service_operations(vault: Vault, operations: Optional[List[Operation]] = Non
 
 
 def monthly_trend(vault: Vault, operations: Optional[List[Operation]] = None) -> List[Dict[str, object]]:
+    store = _whole_vault_store(vault, operations)
+    if store is not None:
+        return [
+            {
+                "label": f"{month:02d}.{str(year)[2:]}",
+                "income": store.to_amount(income),
+                "expense": store.to_amount(expense),
+            }
+            for (year, month), (income, expense) in sorted(store.monthly_totals().items())
+        ]
     ops = _select_ops(vault, operations)
     buckets: Dict[Tuple[int, int], Dict[str, Decimal]] = defaultdict(
         lambda: {"income": Decimal("0"), "expense": Decimal("0")}
@@ -192,8 +232,8 @@ def export_ml_dataset(vault: Vault) -> List[Dict[str, object]]:
         dataset.append(
             {
                 "text": normalize_text(op.description),
-                "merchant": normalize_text(op.merchant),
-                "bank_category": normalize_text(op.bank_category),
+                "merchant": normalize_operation(op).merchant_norm,
+                "bank_category": op.bank_category_norm,
                 "mcc": op.mcc,
                 "amount_abs": float(abs(op.amount)),
                 "bank": op.bank,
@@ -241,13 +281,11 @@ def base_by_sys_hierarchy(
 
 def merchant_breakdown(vault: Vault, base_id: str, limit: int = 10, op_type: Optional[OperationType] = None) -> List[Dict[str, object]]:
     totals: Dict[str, Decimal] = defaultdict(Decimal)
-    for op in vault.operations:
+    index = vault.index
+    for op in index.by_category(base_id):
         if op_type and op.type != op_type:
             continue
-        if op.category_id != base_id:
-            continue
-        merchant = normalize_text(op.merchant) or "unknown_merchant"
-        totals[merchant] += abs(op.amount)
+        totals[index.merchant_norm(op)] += abs(op.amount)
     items = []
     for merchant, amount in sorted(totals.items(), key=lambda x: x[1], reverse=True)[:limit]:
         items.append({"merchant": merchant, "amount": float(amount)})
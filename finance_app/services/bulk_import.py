@@ -0,0 +1,199 @@
+"""
+Пакетный импорт: много выписок или один ZIP за запрос.
+
+Банк определяется по строке заголовка, файлы разбираются параллельно в пуле
+процессов, затем все строки дедуплицируются, категоризуются одной пачкой
+(чанками import_service) и добавляются в vault. lock берётся только на сборку
+операций с дедупликацией и на публикацию; разбор и категоризация (включая
+запросы к LLM) идут без него. Сохранение — забота вызывающего, в commit,
+один раз на всю пачку.
+"""
+
+import zipfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import chain, islice
+from pathlib import Path
+from typing import Callable, ContextManager, Dict, Iterator, List, Optional, Tuple
+
+from finance_app.adapters.alfa_adapter import iter_alfa_rows
+from finance_app.adapters.rows import ParsedRow, build_operation
+from finance_app.adapters.tinkoff_adapter import iter_tinkoff_rows
+from finance_app.domain import Operation, Vault
+from finance_app.fingerprints import Fingerprint, FingerprintFilter, operation_fingerprint
+from finance_app.services import import_service
+from finance_app.services.categorization import CategorizationPipeline
+from finance_app.utils import pool_context
+
+
+ROW_READERS: Dict[str, Callable[[str], Iterator[ParsedRow]]] = {
+    "alfa": iter_alfa_rows,
+    "tinkoff": iter_tinkoff_rows,
+}
+
+# ZIP может прийти откуда угодно: ограничиваем число файлов внутри и их
+# суммарный распакованный размер (zip-бомба)
+MAX_ARCHIVE_MEMBERS = 500
+MAX_ARCHIVE_BYTES = 1024 * 1024 * 1024
+
+
+class ArchiveTooLarge(ValueError):
+    pass
+
+
+def detect_bank(header: str) -> Optional[str]:
+    """Банк по строке заголовка CSV: alfa, tinkoff или None."""
+    header = header.lstrip("\ufeff")
+    if "operationDate" in header:
+        return "alfa"
+    if "Дата операции" in header and "Сумма операции" in header:
+        return "tinkoff"
+    return None
+
+
+def detect_bank_file(path: str) -> Optional[str]:
+    with open(path, "rb") as fp:
+        first_line = fp.readline(64 * 1024)
+    return detect_bank(first_line.decode("utf-8-sig", errors="replace"))
+
+
+def expand_uploads(files: List[Tuple[str, str]], work_dir: str) -> List[Tuple[str, str]]:
+    """
+    Развернуть ZIP-архивы в список (имя, путь). Файлы из архива пишутся под
+    порядковыми именами, имена внутри архива в пути не используются.
+    ArchiveTooLarge — в архиве больше MAX_ARCHIVE_MEMBERS файлов или
+    распакованные файлы всех архивов больше MAX_ARCHIVE_BYTES.
+    """
+    expanded: List[Tuple[str, str]] = []
+    unpacked = 0
+    for name, path in files:
+        if not zipfile.is_zipfile(path):
+            expanded.append((name, path))
+            continue
+        with zipfile.ZipFile(path) as archive:
+            members = [
+                info for info in archive.infolist() if not info.is_dir() and not info.filename.startswith("__MACOSX/")
+            ]
+            if len(members) > MAX_ARCHIVE_MEMBERS:
+                raise ArchiveTooLarge(f"{name}: archive has more than {MAX_ARCHIVE_MEMBERS} files")
+            # file_size из каталога архива проверяем до распаковки...
+            if unpacked + sum(info.file_size for info in members) > MAX_ARCHIVE_BYTES:
+                raise ArchiveTooLarge(f"{name}: archive unpacks to more than {MAX_ARCHIVE_BYTES} bytes")
+            for info in members:
+                target = Path(work_dir) / f"member-{len(expanded)}.csv"
+                with archive.open(info) as src, open(target, "wb") as dst:
+                    # ...и считаем фактически записанное: каталогу можно соврать
+                    while chunk := src.read(1024 * 1024):
+                        unpacked += len(chunk)
+                        if unpacked > MAX_ARCHIVE_BYTES:
+                            raise ArchiveTooLarge(f"{name}: archive unpacks to more than {MAX_ARCHIVE_BYTES} bytes")
+                        dst.write(chunk)
+                expanded.append((Path(info.filename).name, str(target)))
+    return expanded
+
+
+def _read_statement(task: Tuple[str, str]) -> List[ParsedRow]:
+    bank, path = task
+    return list(ROW_READERS[bank](path))
+
+
+def import_statements(
+    vault: Vault,
+    pipeline: CategorizationPipeline,
+    files: List[Tuple[str, str]],
+    new_file_id: Callable[[], str],
+    workers: int = 1,
+    chunk_size: int = import_service.CHUNK_SIZE,
+    lock: Optional[ContextManager] = None,
+    commit: Optional[Callable[[List[dict]], None]] = None,
+) -> List[dict]:
+    """
+    Импортировать пачку выписок (имя, путь). Для каждого файла возвращает
+    {"id", "name", "bank", "count", "skipped"} или {"name", "error"}, если
+    формат не распознан. commit(results) вызывается под lock сразу после
+    добавления операций в vault.
+    """
+    lock = lock if lock is not None else nullcontext()
+    results: List[dict] = []
+    tasks: List[Tuple[str, str]] = []
+    for name, path in files:
+        bank = detect_bank_file(path)
+        if bank is None:
+            results.append({"name": name, "error": "unknown_format"})
+            continue
+        results.append({"name": name, "bank": bank})
+        tasks.append((bank, path))
+
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=pool_context()) as pool:
+            parsed = list(pool.map(_read_statement, tasks))
+    else:
+        parsed = [_read_statement(task) for task in tasks]
+
+    # дедупликация до добавления в vault: учитываем и строки предыдущих файлов пачки
+    pending: Counter = Counter()
+    batches: List[List[Operation]] = []
+    statements = iter(parsed)
+    with lock:
+        for result in results:
+            if "error" in result:
+                continue
+            result["id"] = new_file_id()
+            fingerprints = FingerprintFilter(vault, pending)
+            operations = []
+            for row in next(statements):
+                operation = build_operation(vault, result["bank"], row, result["id"])
+                if fingerprints.admit(operation):
+                    operations.append(operation)
+            pending.update(fingerprints.admitted)
+            result["skipped"] = fingerprints.skipped
+            batches.append(operations)
+        counted = _vault_counts(vault, batches)
+
+    operations = chain.from_iterable(batches)
+    while chunk := list(islice(operations, chunk_size)):
+        import_service.categorize_chunk(pipeline, chunk)
+
+    with lock:
+        batches = _drop_concurrent_duplicates(vault, results, batches, counted)
+        for operations in batches:
+            for op in operations:
+                vault.add_operation(op)
+        if commit is not None:
+            commit(results)
+    return results
+
+
+def _vault_counts(vault: Vault, batches: List[List[Operation]]) -> Dict[Fingerprint, int]:
+    """Сколько операций с отпечатками пачки было в vault при дедупликации."""
+    return {
+        fingerprint: vault.index.fingerprint_count(fingerprint)
+        for fingerprint in {operation_fingerprint(op) for op in chain.from_iterable(batches)}
+    }
+
+
+def _drop_concurrent_duplicates(
+    vault: Vault, results: List[dict], batches: List[List[Operation]], counted: Dict[Fingerprint, int]
+) -> List[List[Operation]]:
+    """
+    Пока пачка категоризовалась без lock, другой импорт мог добавить те же
+    строки: столько же первых копий каждого отпечатка теперь дубли.
+    """
+    extra = Counter(
+        {fingerprint: vault.index.fingerprint_count(fingerprint) - before for fingerprint, before in counted.items()}
+    )
+    kept_batches = []
+    imported = (result for result in results if "error" not in result)
+    for result, operations in zip(imported, batches):
+        kept = []
+        for op in operations:
+            fingerprint = operation_fingerprint(op)
+            if extra[fingerprint] > 0:
+                extra[fingerprint] -= 1
+                result["skipped"] += 1
+            else:
+                kept.append(op)
+        result["count"] = len(kept)
+        kept_batches.append(kept)
+    return kept_batches
@@ -1,13 +1,21 @@
+import hashlib
 from collections import Counter
-from typing import Dict, Optional, Tuple
+from decimal import Decimal
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from time import perf_counter
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 from finance_app import rules
 from finance_app import category_mapping
 from finance_app.category_tree import CATEGORY_INDEX
 from finance_app.domain import Operation, OperationType
-from finance_app.utils import Features, build_features, normalize_text
+from finance_app.merchant_dictionary import MERCHANT_DICTIONARY, ReloadingDictionary
+from finance_app.utils import Features, build_features, normalize_operation, normalize_text, pool_context
+from finance_app.services.decision_cache import DecisionCache, DecisionKey, decision_key
 from finance_app.services.ml_model import SimpleMLModel
 from finance_app.services.llm_categorizer import LLMCategorizer
+from finance_app.services.stage_metrics import StageBatch, StageMetrics
 
 
 class CategorizationPipeline:
@@ -16,44 +24,237 @@ class CategorizationPipeline:
         unknown_tracker: Optional[Dict[str, int]] = None,
         ml_model: Optional[SimpleMLModel] = None,
         llm_categorizer: Optional[LLMCategorizer] = None,
+        decision_cache: Optional[DecisionCache] = None,
+        merchant_dictionary: Optional[ReloadingDictionary] = None,
+        compiled_rules: Optional[rules.CompiledRules] = None,
+        mapping: Optional[Dict[Tuple[str, str], str]] = None,
     ):
         self.unknown_tracker = unknown_tracker if unknown_tracker is not None else {}
         self.unmapped_counter: Counter[Tuple[str, str]] = Counter()
         self.ml_model = ml_model
         self.llm_categorizer = llm_categorizer
+        self.decision_cache = decision_cache
+        self.merchant_dictionary = merchant_dictionary or MERCHANT_DICTIONARY
+        # другая версия правил и маппинга — для сравнения версий; по умолчанию действующие
+        self.compiled_rules = compiled_rules or rules.COMPILED_RULES
+        self.mapping = mapping if mapping is not None else category_mapping.BANK_CATEGORY_TO_BASE
+        self.metrics = StageMetrics()
 
     def categorize(self, operation: Operation) -> Optional[str]:
+        batch = StageBatch()
+        try:
+            return self._categorize_one(operation, batch)
+        finally:
+            self.metrics.commit(batch)
+
+    def _categorize_one(self, operation: Operation, batch: StageBatch) -> Optional[str]:
+        batch.operations += 1
         features = build_features(operation)
+        if self._categorize_known(operation, features, batch):
+            return operation.category_id
+
+        self._validate_decisions()
+        key = self._decision_key(operation, features)
+        if self._apply_cached(operation, key, batch):
+            return operation.category_id
+
+        source = self._ml_source()
+        started = perf_counter()
+        ml_guess = self._ml_model_predict(operation) if source == "ml_model" else self._ml_stub(operation, features)
+        assigned = self._assign(operation, ml_guess, source)
+        batch.add(source, perf_counter() - started, assigned)
+        if assigned:
+            self._remember(key, operation)
+            return ml_guess
+
+        if self._llm_ready():
+            started = perf_counter()
+            llm_guess = self._llm_predict(operation)
+            assigned = self._assign(operation, llm_guess, "llm")
+            batch.add("llm", perf_counter() - started, assigned)
+            if assigned:
+                self._remember(key, operation)
+                return llm_guess
+
+        return self._categorize_fallback(operation, batch)
+
+    def categorize_many(self, operations: Sequence[Operation]) -> List[Optional[str]]:
+        """
+        Пакетная категоризация: правила и маппинг — построчно, оставшиеся строки
+        уходят в ML одним вызовом predict, нераспознанные ML — одной пачкой в LLM.
+        Операции, чья сигнатура уже есть в кэше решений, до моделей не доходят.
+        Результат — category_id для каждой операции в исходном порядке.
+        """
+        batch = StageBatch()
+        try:
+            self._categorize_batch(operations, batch)
+        finally:
+            self.metrics.commit(batch)
+        return [op.category_id for op in operations]
+
+    def _categorize_batch(self, operations: Sequence[Operation], batch: StageBatch) -> None:
+        batch.operations += len(operations)
+        pending: List[Tuple[Operation, Features, Optional[DecisionKey]]] = []
+        self._validate_decisions()
+        for op in operations:
+            features = build_features(op)
+            if self._categorize_known(op, features, batch):
+                continue
+            key = self._decision_key(op, features)
+            if not self._apply_cached(op, key, batch):
+                pending.append((op, features, key))
+        if not pending:
+            return
+
+        source = self._ml_source()
+        started = perf_counter()
+        if source == "ml_model":
+            ml_guesses = self.ml_model.predict_many([op for op, _, _ in pending])
+        else:
+            dictionary = self.merchant_dictionary.current()
+            ml_guesses = [dictionary.lookup(features.text, features.mcc) for _, features, _ in pending]
+        elapsed = perf_counter() - started
+        leftovers: List[Tuple[Operation, Optional[DecisionKey]]] = []
+        for (op, _, key), guess in zip(pending, ml_guesses):
+            if self._assign(op, guess, source):
+                self._remember(key, op)
+            else:
+                leftovers.append((op, key))
+        batch.add_bulk(source, elapsed, len(pending), len(pending) - len(leftovers))
+
+        if leftovers and self._llm_ready():
+            started = perf_counter()
+            llm_guesses = self.llm_categorizer.predict_many([op for op, _ in leftovers])
+            elapsed = perf_counter() - started
+            rest = []
+            for (op, key), guess in zip(leftovers, llm_guesses):
+                if self._assign(op, guess, "llm"):
+                    self._remember(key, op)
+                else:
+                    rest.append((op, key))
+            batch.add_bulk("llm", elapsed, len(leftovers), len(leftovers) - len(rest))
+            leftovers = rest
+
+        for op, _ in leftovers:
+            self._categorize_fallback(op, batch)
 
-        rule_result = rules.apply_rules(operation, features)
+    def decision_version(self) -> str:
+        """Отпечаток всего, от чего зависят решения ML/LLM: правил, маппинга, словаря мерчантов и моделей."""
+        ml, llm = self.ml_model, self.llm_categorizer
+        parts = [
+            self.compiled_rules.version,
+            category_mapping.mapping_version(self.mapping),
+            self.merchant_dictionary.current().version,
+            f"ml:{bool(ml and ml.is_ready())}:{getattr(ml, 'version', None)}",
+            f"llm:{bool(llm and llm.is_ready())}:{getattr(llm, 'model', None)}",
+        ]
+        return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()
+
+    def worker_state(self) -> dict:
+        """То, из чего процесс пула собирает такой же пайплайн: модели, словарь мерчантов, снимок кэша решений."""
+        cache = self.decision_cache
+        return {
+            "ml_model": self.ml_model,
+            "llm_categorizer": self.llm_categorizer,
+            "merchant_dictionary_path": self.merchant_dictionary.path,
+            "decision_cache": (cache.max_entries, cache.export()) if cache is not None else None,
+            # действующие правила и маппинг процесс берёт из своих модулей
+            "rules": None if self.compiled_rules is rules.COMPILED_RULES else self.compiled_rules.rules,
+            "mapping": None if self.mapping is category_mapping.BANK_CATEGORY_TO_BASE else self.mapping,
+        }
+
+    @classmethod
+    def from_worker_state(cls, state: dict) -> "CategorizationPipeline":
+        cache = None
+        if state["decision_cache"] is not None:
+            max_entries, data = state["decision_cache"]
+            cache = DecisionCache(path=None, max_entries=max_entries)
+            cache.restore(data)
+        return cls(
+            ml_model=state["ml_model"],
+            llm_categorizer=state["llm_categorizer"],
+            decision_cache=cache,
+            merchant_dictionary=ReloadingDictionary(state["merchant_dictionary_path"]),
+            compiled_rules=rules.CompiledRules(state["rules"]) if state["rules"] is not None else None,
+            mapping=state["mapping"],
+        )
+
+    def status(self) -> Dict[str, object]:
+        dictionary = self.merchant_dictionary.current()
+        error = self.merchant_dictionary.last_error
+        return {
+            "decision_cache": self.decision_cache.status() if self.decision_cache is not None else None,
+            "merchant_dictionary": {
+                "merchants": dictionary.size,
+                "version": dictionary.version,
+                "error": str(error) if error else None,
+            },
+            "stages": self.metrics.status(),
+        }
+
+    def _validate_decisions(self) -> None:
+        if self.decision_cache is not None:
+            self.decision_cache.validate(self.decision_version())
+
+    def _decision_key(self, operation: Operation, features: Features) -> Optional[DecisionKey]:
+        return decision_key(operation, features) if self.decision_cache is not None else None
+
+    def _apply_cached(self, operation: Operation, key: Optional[DecisionKey], batch: StageBatch) -> bool:
+        """Решение ML/LLM, уже принятое для такой же сигнатуры мерчанта."""
+        if key is None:
+            return False
+        started = perf_counter()
+        cached = self.decision_cache.get(key)
+        batch.add("decision_cache", perf_counter() - started, cached is not None)
+        if cached is None:
+            return False
+        operation.category_id, operation.categorization_source = cached
+        return True
+
+    def _remember(self, key: Optional[DecisionKey], operation: Operation) -> None:
+        if key is not None:
+            self.decision_cache.put(key, operation.category_id, operation.categorization_source)
+
+    def _categorize_known(self, operation: Operation, features: Features, batch: StageBatch) -> bool:
+        """Правила и маппинг категорий банка; False — нужна модель."""
+        started = perf_counter()
+        rule_result = rules.apply_rules(operation, features, self.compiled_rules)
+        rules_done = perf_counter()
+        batch.add("rules", rules_done - started, bool(rule_result))
         if rule_result:
             operation.category_id, operation.categorization_source = rule_result[0], rule_result[1]
-            return operation.category_id
+            return True
 
-        mapped = category_mapping.lookup_base_category_norm(operation.bank, features.bank_category_norm)
+        mapped = category_mapping.lookup_base_category_norm(operation.bank, features.bank_category_norm, self.mapping)
+        batch.add("mapping", perf_counter() - rules_done, bool(mapped))
         if mapped:
             operation.category_id = mapped
             operation.categorization_source = "mapping"
-            return mapped
+            return True
         if features.bank_category_norm:
             self._track_unmapped(operation.bank, features.bank_category_norm)
+        return False
 
-        ml_guess = self._ml_model_predict(operation) if self.ml_model and self.ml_model.is_ready() else self._ml_stub(operation, features)
-        if ml_guess:
-            operation.category_id = ml_guess
-            operation.categorization_source = "ml_model" if self.ml_model and self.ml_model.is_ready() else "ml_stub"
-            return ml_guess
+    def _ml_source(self) -> str:
+        return "ml_model" if self.ml_model and self.ml_model.is_ready() else "ml_stub"
+
+    def _llm_ready(self) -> bool:
+        return bool(self.llm_categorizer and self.llm_categorizer.is_ready())
 
-        llm_guess = self._llm_predict(operation)
-        if llm_guess:
-            operation.category_id = llm_guess
-            operation.categorization_source = "llm"
-            return llm_guess
+    @staticmethod
+    def _assign(operation: Operation, guess: Optional[str], source: str) -> bool:
+        if not guess:
+            return False
+        operation.category_id = guess
+        operation.categorization_source = source
+        return True
 
+    def _categorize_fallback(self, operation: Operation, batch: StageBatch) -> Optional[str]:
+        started = perf_counter()
         fallback_guess = self._fallback_stub(operation)
-        if fallback_guess:
-            operation.category_id = fallback_guess
-            operation.categorization_source = "fallback_stub"
+        assigned = self._assign(operation, fallback_guess, "fallback_stub")
+        batch.add("fallback", perf_counter() - started, assigned)
+        if assigned:
             return fallback_guess
 
         operation.category_id = None
@@ -62,63 +263,7 @@ class CategorizationPipeline:
         return None
 
     def _ml_stub(self, operation: Operation, features: Features) -> Optional[str]:
-        text = features.text
-        if features.mcc:
-            mcc_map = {
-                "5411": "base_shopping_groceries",
-                "5814": "base_food_fastfood",
-                "5812": "base_food_restaurants",
-                "4111": "base_transport_public",
-                "4121": "base_transport_taxi",
-                "4789": "base_travel_dutyfree",
-                "4511": "base_travel_flights",
-                "4112": "base_travel_trains",
-                "7011": "base_travel_hotels",
-                "5541": "base_transport_fuel",
-                "5542": "base_transport_fuel",
-                "5977": "base_health_fitness",
-            }
-            if features.mcc in mcc_map:
-                return mcc_map[features.mcc]
-
-        keyword_map = {
-        "ашан": "base_shopping_groceries",
-        "перекрест": "base_shopping_groceries",
-        "perekrest": "base_shopping_groceries",
-        "lenta": "base_shopping_groceries",
-        "pyateroch": "base_shopping_groceries",
-        "pyatero": "base_shopping_groceries",
-        "magnit": "base_shopping_groceries",
-        "da!": "base_shopping_groceries",
-        "chesnok": "base_shopping_groceries",
-        "malishev": "base_shopping_groceries",
-        "yandex market": "base_shopping_marketplace",
-        "market yandex": "base_shopping_marketplace",
-        "ozon": "base_shopping_marketplace",
-        "wildberries": "base_shopping_marketplace",
-        "wb ru": "base_shopping_marketplace",
-            "avito": "base_shopping_marketplace",
-            "vkusnoitochka": "base_food_fastfood",
-            "kfc": "base_food_fastfood",
-            "burger": "base_food_fastfood",
-            "coffee": "base_food_coffee",
-            "starbucks": "base_food_coffee",
-            "taxi": "base_transport_taxi",
-            "yandex go": "base_transport_taxi",
-            "yandex.taxi": "base_transport_taxi",
-            "uber": "base_transport_taxi",
-            "aero": "base_travel_flights",
-            "airlines": "base_travel_flights",
-            "rjd": "base_travel_trains",
-            "cinema": "base_entertainment_cinema",
-            "кин": "base_entertainment_cinema",
-            "apteka": "base_shopping_pharmacy",
-            "аптека": "base_shopping_pharmacy",
-        }
-        for key, base_id in keyword_map.items():
-            if key in text:
-                return base_id
-        return None
+        return self.merchant_dictionary.current().lookup(features.text, features.mcc)
 
     def _fallback_stub(self, operation: Operation) -> Optional[str]:
         # Fallback to a safe default leaf category when nothing matched.
@@ -150,17 +295,138 @@ class CategorizationPipeline:
         return self.llm_categorizer.predict(operation)
 
 
-def categorize_vault(vault, pipeline: CategorizationPipeline) -> None:
-    for op in vault.operations:
-        pipeline.categorize(op)
+# сколько операций categorize_vault / reclassify_unknown отдают в categorize_many за раз
+BATCH_SIZE = 2000
+
+
+def _batches(operations: Iterable[Operation], size: int = BATCH_SIZE) -> Iterator[List[Operation]]:
+    iterator = iter(operations)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+# с какого числа операций categorize_vault / reclassify_unknown уходят в пул процессов
+PARALLEL_MIN_OPERATIONS = 20_000
+
+# пайплайн процесса пула: собирается один раз в инициализаторе, а не на каждый шард
+_worker_pipeline: Optional[CategorizationPipeline] = None
+
+ShardResult = Tuple[List[Tuple[Optional[str], Optional[str]]], Dict[str, int], Counter, dict, dict]
+
+
+def _init_worker(state: dict) -> None:
+    global _worker_pipeline
+    _worker_pipeline = CategorizationPipeline.from_worker_state(state)
+
+
+# поля операции, которые читает пайплайн; pickle кортежа строк в разы дешевле pickle Operation
+ShardRow = Tuple[str, str, str, Optional[str], Optional[str], Optional[str], str, Optional[str], str, str, str]
+
+
+def _shard_row(op: Operation) -> ShardRow:
+    return (
+        op.bank,
+        op.type.value,
+        op.description,
+        op.merchant,
+        op.mcc,
+        op.bank_category,
+        str(op.amount),
+        op.category_id,
+        op.text_norm,
+        op.merchant_norm,
+        op.bank_category_norm,
+    )
+
+
+def _shard_operation(index: int, row: ShardRow) -> Operation:
+    bank, op_type, description, merchant, mcc, bank_category, amount, category_id, text_norm, merchant_norm, bank_category_norm = row
+    return Operation(
+        id=str(index),
+        account_id="",
+        bank=bank,
+        date=None,
+        amount=Decimal(amount),
+        currency="",
+        type=OperationType(op_type),
+        description=description,
+        merchant=merchant,
+        mcc=mcc,
+        bank_category=bank_category,
+        category_id=category_id,
+        text_norm=text_norm,
+        merchant_norm=merchant_norm,
+        bank_category_norm=bank_category_norm,
+    )
+
+
+def _categorize_shard(rows: List[ShardRow]) -> ShardResult:
+    """(category_id, categorization_source) в порядке строк шарда плюс счётчики, кэш решений и метрики процесса."""
+    pipeline = _worker_pipeline
+    operations = [_shard_operation(index, row) for index, row in enumerate(rows)]
+    pipeline.unknown_tracker = {}
+    pipeline.unmapped_counter = Counter()
+    pipeline.metrics.reset()
+    for batch in _batches(operations):
+        pipeline.categorize_many(batch)
+    decisions = [(op.category_id, op.categorization_source) for op in operations]
+    cache = pipeline.decision_cache.export() if pipeline.decision_cache is not None else {}
+    return decisions, pipeline.unknown_tracker, pipeline.unmapped_counter, cache, pipeline.metrics.export()
+
+
+def categorize_parallel(operations: List[Operation], pipeline: CategorizationPipeline, workers: int) -> None:
+    """
+    Категоризация в пуле процессов: операции режутся на шарды по числу
+    процессов и уходят в них кортежами полей, каждый процесс один раз собирает
+    пайплайн из worker_state(), а результаты, счётчики и новые решения кэша
+    вливаются за один проход. Процессы стартуют через utils.pool_context().
+    """
+    if not operations:
+        return
+    if pipeline.decision_cache is not None:
+        # шарды наследуют актуальную версию, иначе их решения не примутся в merge
+        pipeline.decision_cache.validate(pipeline.decision_version())
+    size = -(-len(operations) // workers)
+    shards = [operations[start : start + size] for start in range(0, len(operations), size)]
+    rows = ([_shard_row(normalize_operation(op)) for op in shard] for shard in shards)
+    with ProcessPoolExecutor(
+        max_workers=len(shards),
+        mp_context=pool_context(),
+        initializer=_init_worker,
+        initargs=(pipeline.worker_state(),),
+    ) as pool:
+        for shard, (decisions, unknown, unmapped, cache, metrics) in zip(shards, pool.map(_categorize_shard, rows)):
+            for op, (category_id, source) in zip(shard, decisions):
+                op.category_id, op.categorization_source = category_id, source
+            for key, count in unknown.items():
+                pipeline.unknown_tracker[key] = pipeline.unknown_tracker.get(key, 0) + count
+            pipeline.unmapped_counter.update(unmapped)
+            pipeline.metrics.merge(metrics)
+            if pipeline.decision_cache is not None:
+                pipeline.decision_cache.merge(cache)
+
+
+def _categorize_all(operations: List[Operation], pipeline: CategorizationPipeline, workers: int) -> None:
+    if workers > 1 and len(operations) >= PARALLEL_MIN_OPERATIONS:
+        categorize_parallel(operations, pipeline, workers)
+        return
+    for batch in _batches(operations):
+        pipeline.categorize_many(batch)
+
+
+def categorize_vault(vault, pipeline: CategorizationPipeline, workers: int = 1) -> None:
+    _categorize_all(vault.operations, pipeline, workers)
+    vault.recategorized(vault.operations)
 
 
-def reclassify_unknown(vault, pipeline: CategorizationPipeline) -> None:
+def reclassify_unknown(vault, pipeline: CategorizationPipeline, workers: int = 1) -> List[Operation]:
     """
     Переклассифицировать только операции с category_id == None или base_unknown.
-    Используется после обучения ML или обновления маппинга.
+    Используется после обучения ML или обновления маппинга. Возвращает эти операции.
     """
-    for op in vault.operations:
-        if op.category_id is None or op.category_id == "base_unknown":
-            op.category_id = None
-            pipeline.categorize(op)
+    changed = [op for op in vault.operations if op.category_id is None or op.category_id == "base_unknown"]
+    for op in changed:
+        op.category_id = None
+    _categorize_all(changed, pipeline, workers)
+    vault.recategorized(changed)
+    return changed
@@ -0,0 +1,248 @@
+"""
+Бинарный колоночный снапшот vault: старт быстрее, чем с JSON-состояния.
+
+Файл: сигнатура, длина и JSON-заголовок (таблицы строк, счета, файлы, описание
+колонок), затем выровненные массивы фиксированной ширины: порядковые номера дат
+(int32), суммы в минимальных единицах (int64), коды типов (uint8) и индексы в
+таблицы строк (int32, -1 — пусто). Загрузка идёт через mmap без разбора JSON
+на каждую операцию, но все Operation строятся при старте, и это основная
+часть его времени. JSON-формат storage остаётся для экспорта.
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from finance_app.domain import Operation, OperationType, Vault
+from finance_app.services import storage
+from finance_app.utils import NORMALIZATION_VERSION, normalize_operation, renormalize_stale
+
+
+SNAPSHOT_PATH = Path("data") / "vault_state.bin"
+
+MAGIC = b"FAVCOL01"
+_HEADER_LEN = struct.Struct("<I")
+_ALIGN = 8
+
+TYPE_CODES: List[OperationType] = list(OperationType)
+
+STRING_COLUMNS = (
+    "id",
+    "account_id",
+    "bank",
+    "currency",
+    "description",
+    "merchant",
+    "mcc",
+    "bank_category",
+    "category_id",
+    "categorization_source",
+    "source_file_id",
+    "text_norm",
+    "merchant_norm",
+    "bank_category_norm",
+)
+
+
+def _amount_scale(operations: List[Operation]) -> int:
+    scale = 2
+    for op in operations:
+        exponent = op.amount.as_tuple().exponent
+        if isinstance(exponent, int) and -exponent > scale:
+            scale = -exponent
+    return scale
+
+
+def _encode_strings(values: List[Optional[str]]) -> Tuple[List[str], array]:
+    table: List[str] = []
+    positions: Dict[str, int] = {}
+    codes = array("i")
+    for value in values:
+        if value is None:
+            codes.append(-1)
+            continue
+        code = positions.get(value)
+        if code is None:
+            code = positions[value] = len(table)
+            table.append(value)
+        codes.append(code)
+    return table, codes
+
+
+def write_snapshot(
+    path: Path,
+    operations: List[Operation],
+    accounts: Optional[dict] = None,
+    uploaded_files: Optional[List[dict]] = None,
+) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    scale = _amount_scale(operations)
+    type_index = {op_type: code for code, op_type in enumerate(TYPE_CODES)}
+
+    columns: Dict[str, array] = {
+        "date": array("i", (op.date.toordinal() for op in operations)),
+        "amount": array("q", (int(op.amount.scaleb(scale)) for op in operations)),
+        "type": array("B", (type_index[op.type] for op in operations)),
+    }
+    for op in operations:
+        normalize_operation(op)
+    strings: Dict[str, List[str]] = {}
+    for name in STRING_COLUMNS:
+        strings[name], columns[name] = _encode_strings([getattr(op, name) for op in operations])
+
+    layout = []
+    offset = 0
+    for name, values in columns.items():
+        size = len(values) * values.itemsize
+        layout.append({"name": name, "typecode": values.typecode, "offset": offset, "size": size})
+        offset += size + (-size % _ALIGN)
+    header = json.dumps(
+        {
+            "count": len(operations),
+            "scale": scale,
+            "byteorder": sys.byteorder,
+            "normalization_version": NORMALIZATION_VERSION,
+            "columns": layout,
+            "strings": strings,
+            "accounts": {k: vars(v) for k, v in (accounts or {}).items()},
+            "uploaded_files": uploaded_files or [],
+        },
+        ensure_ascii=False,
+    ).encode("utf-8")
+    prefix_len = len(MAGIC) + _HEADER_LEN.size + len(header)
+
+    tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+    with tmp_path.open("wb") as fp:
+        fp.write(MAGIC)
+        fp.write(_HEADER_LEN.pack(len(header)))
+        fp.write(header)
+        fp.write(b"\0" * (-prefix_len % _ALIGN))
+        for values in columns.values():
+            data = values.tobytes()
+            fp.write(data)
+            fp.write(b"\0" * (-len(data) % _ALIGN))
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.replace(tmp_path, path)
+
+
+def save_state(vault: Vault, uploaded_files: List[dict], path: Optional[Path] = None) -> None:
+    write_snapshot(path or SNAPSHOT_PATH, list(vault.operations), vault.accounts, uploaded_files)
+
+
+def _string_column(table: List[str], codes) -> List[Optional[str]]:
+    # код -1 указывает на None в конце таблицы: декодирование целиком в map, без цикла Python
+    return list(map([*table, None].__getitem__, codes))
+
+
+def read_snapshot(path: Path) -> Tuple[List[Operation], dict]:
+    """
+    Прочитать снапшот: операции и заголовок (accounts, uploaded_files). Колонки
+    читаются без копирования — memoryview поверх mmap, — но Operation строятся
+    сразу все: vault живёт в памяти целиком, и его индексы нужны с первого запроса.
+    Признаки другой версии нормализации пересчитываются.
+    """
+    with path.open("rb") as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if mm[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a columnar vault snapshot")
+        (header_len,) = _HEADER_LEN.unpack_from(mm, len(MAGIC))
+        header_start = len(MAGIC) + _HEADER_LEN.size
+        header = json.loads(mm[header_start : header_start + header_len].decode("utf-8"))
+        data_start = header_start + header_len
+        data_start += -data_start % _ALIGN
+
+        views = [memoryview(mm)]
+        columns: Dict[str, Sequence[int]] = {}
+        try:
+            for col in header["columns"]:
+                start = data_start + col["offset"]
+                raw = views[0][start : start + col["size"]]
+                views.append(raw)
+                if header["byteorder"] == sys.byteorder:
+                    columns[col["name"]] = raw.cast(col["typecode"])
+                    views.append(columns[col["name"]])
+                else:
+                    values = array(col["typecode"])
+                    values.frombytes(raw)
+                    values.byteswap()
+                    columns[col["name"]] = values
+            operations = _build_operations(header, columns)
+        finally:
+            # представления поверх mmap нужно отпустить до его закрытия
+            for view in reversed(views):
+                view.release()
+    renormalize_stale(operations, header.get("normalization_version"))
+    return operations, header
+
+
+def _build_operations(header: dict, columns: Dict[str, Sequence[int]]) -> List[Operation]:
+    count = header["count"]
+    strings: Dict[str, List[str]] = header["strings"]
+    decoded: Dict[str, List[Optional[str]]] = {
+        # снапшот старой версии может не содержать колонку
+        name: _string_column(strings[name], columns[name]) if name in strings else [None] * count
+        for name in STRING_COLUMNS
+    }
+
+    # даты и суммы повторяются, поэтому объекты строим один раз на значение
+    scale = header["scale"]
+    dates = {ordinal: date.fromordinal(ordinal) for ordinal in set(columns["date"])}
+    amounts = {minor: Decimal(minor).scaleb(-scale) for minor in set(columns["amount"])}
+    return [
+        Operation(
+            id=op_id,
+            account_id=account_id,
+            bank=bank,
+            date=dates[ordinal],
+            amount=amounts[minor],
+            currency=currency,
+            type=TYPE_CODES[type_code],
+            description=description or "",
+            merchant=merchant,
+            mcc=mcc,
+            bank_category=bank_category,
+            category_id=category_id,
+            categorization_source=categorization_source,
+            source_file_id=source_file_id,
+            text_norm=text_norm,
+            merchant_norm=merchant_norm,
+            bank_category_norm=bank_category_norm,
+        )
+        for (
+            ordinal,
+            minor,
+            type_code,
+            op_id,
+            account_id,
+            bank,
+            currency,
+            description,
+            merchant,
+            mcc,
+            bank_category,
+            category_id,
+            categorization_source,
+            source_file_id,
+            text_norm,
+            merchant_norm,
+            bank_category_norm,
+        ) in zip(columns["date"], columns["amount"], columns["type"], *(decoded[name] for name in STRING_COLUMNS))
+    ]
+
+
+def load_state(vault: Vault, path: Optional[Path] = None) -> Tuple[List[dict], bool]:
+    path = path or SNAPSHOT_PATH
+    if not path.exists():
+        return [], False
+    operations, header = read_snapshot(path)
+    vault.accounts = {acc_id: storage.deserialize_account(acc) for acc_id, acc in header["accounts"].items()}
+    vault.replace_operations(operations)
+    return header["uploaded_files"], True
@@ -0,0 +1,144 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Tuple
+
+from finance_app.domain import Operation
+from finance_app.utils import Features
+
+
+DECISION_CACHE_PATH = Path("data") / "decision_cache.json"
+
+# сколько сигнатур мерчантов помнит кэш; дольше всех не использованные вытесняются
+MAX_ENTRIES = 50_000
+
+# (bank, type, merchant_norm, bank_category_norm, mcc)
+DecisionKey = Tuple[str, str, str, str, str]
+Decision = Tuple[str, str]
+
+
+@dataclass
+class DecisionCacheStatus:
+    size: int
+    max_entries: int
+    hits: int
+    misses: int
+    hit_rate: Optional[float]
+    version: Optional[str]
+
+
+def decision_key(operation: Operation, features: Features) -> Optional[DecisionKey]:
+    """
+    Сигнатура операции; None — без мерчанта решение не переиспользуется: одна
+    категория банка объединяет разные покупки, и модель решает по тексту.
+    """
+    if not features.merchant_norm:
+        return None
+    return (features.bank, operation.type.value, features.merchant_norm, features.bank_category_norm, features.mcc or "")
+
+
+class DecisionCache:
+    """
+    LRU-кэш решений ML/LLM по сигнатуре мерчанта. Кэш привязан к версии
+    правил, маппинга и моделей: при смене версии он очищается. save()/load()
+    переносят его через рестарт.
+    """
+
+    def __init__(self, path: Optional[Path] = DECISION_CACHE_PATH, max_entries: int = MAX_ENTRIES) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.version: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[DecisionKey, Decision]" = OrderedDict()
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def validate(self, version: str) -> None:
+        """Сбросить решения, принятые другой версией правил, маппинга или модели."""
+        with self._lock:
+            if version == self.version:
+                return
+            if self._entries:
+                self._entries.clear()
+                self._dirty = True
+            self.version = version
+
+    def get(self, key: DecisionKey) -> Optional[Decision]:
+        with self._lock:
+            decision = self._entries.get(key)
+            if decision is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return decision
+
+    def put(self, key: DecisionKey, category_id: str, source: str) -> None:
+        with self._lock:
+            self._entries[key] = (category_id, source)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._dirty = True
+
+    def status(self) -> DecisionCacheStatus:
+        total = self.hits + self.misses
+        return DecisionCacheStatus(
+            size=len(self._entries),
+            max_entries=self.max_entries,
+            hits=self.hits,
+            misses=self.misses,
+            hit_rate=self.hits / total if total else None,
+            version=self.version,
+        )
+
+    def export(self) -> dict:
+        """Версия и записи в порядке LRU — для файла и для процессов пула."""
+        with self._lock:
+            return {"version": self.version, "entries": [[*key, *decision] for key, decision in self._entries.items()]}
+
+    def merge(self, data: dict) -> None:
+        """Добавить записи export() другого кэша, если они приняты той же версией."""
+        if data.get("version") != self.version:
+            return
+        for row in data.get("entries", []):
+            self.put(tuple(row[:5]), row[5], row[6])
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+        data = self.export()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f"{self.path.name}.tmp")
+        with tmp_path.open("w", encoding="utf-8") as fp:
+            json.dump(data, fp, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def load(self) -> bool:
+        if self.path is None or not self.path.exists():
+            return False
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return False
+        self.restore(data)
+        return True
+
+    def restore(self, data: dict) -> None:
+        with self._lock:
+            self.version = data.get("version")
+            self._entries.clear()
+            for row in data.get("entries", [])[-self.max_entries :]:
+                self._entries[tuple(row[:5])] = (row[5], row[6])
+            self._dirty = False
@@ -0,0 +1,396 @@
+"""
+Импорт выписки как задание с контрольными точками.
+
+У задания свой каталог data/jobs/<id>/:
+  job.json          — чекпоинт: строк разобрано, категоризовано, смещение последнего чанка;
+  source.csv        — сырая выписка, сохранённая receive_upload до запуска;
+  operations.jsonl  — уже категоризованные операции, по чанку за запись.
+
+Каждый чанк после записи в operations.jsonl отдаётся в publish — операции
+сразу видны в vault. Файл выписки и состояние на диске фиксирует commit в
+конце задания; если задание упало с ошибкой, rollback убирает уже
+опубликованные операции, и vault остаётся таким, каким был до задания. После рестарта задание с полностью полученной выпиской
+продолжается с чекпоинта — строки до смещения заново не категоризуются;
+задание с недокачанной выпиской отбрасывается, клиент ответа всё равно не получил.
+
+ImportJobRunner выполняет задания по одному в фоновом потоке: запрос на
+импорт возвращает id задания сразу, прогресс читается через progress().
+"""
+
+import io
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from contextlib import nullcontext
+from dataclasses import asdict, dataclass, field, fields
+from itertools import islice
+from pathlib import Path
+from typing import BinaryIO, Callable, ContextManager, Dict, List, Optional
+from uuid import uuid4
+
+from finance_app.adapters import alfa_adapter, tinkoff_adapter
+from finance_app.adapters.rows import build_operation, decode_stream
+from finance_app.domain import Account, Operation, Vault
+from finance_app.fingerprints import FingerprintFilter
+from finance_app.services import import_service, storage
+from finance_app.services.categorization import CategorizationPipeline
+from finance_app.utils import NORMALIZATION_VERSION, renormalize_stale
+
+
+JOBS_DIR = Path("data") / "jobs"
+JOB_FILE = "job.json"
+SOURCE_FILE = "source.csv"
+STAGED_FILE = "operations.jsonl"
+
+ENCODINGS = {"alfa": alfa_adapter.ENCODING, "tinkoff": tinkoff_adapter.ENCODING}
+ROW_READERS = {"alfa": alfa_adapter.iter_alfa_rows, "tinkoff": tinkoff_adapter.iter_tinkoff_rows}
+
+# pending -> running -> committing -> done; failed — ошибка, описание в error
+PENDING, RUNNING, COMMITTING, DONE, FAILED = "pending", "running", "committing", "done", "failed"
+
+# publish(operations, job) — операции чанка становятся видны в vault;
+# commit(operations, job) — задание завершено, все его операции сохраняются на диск;
+# rollback(job) — задание упало, опубликованные операции убираются из vault
+PublishCallback = Callable[[List[Operation], "ImportJob"], None]
+CommitCallback = Callable[[List[Operation], "ImportJob"], None]
+RollbackCallback = Callable[["ImportJob"], None]
+
+# сколько завершённых заданий ImportJobRunner помнит для progress()
+MAX_FINISHED_JOBS = 100
+
+
+@dataclass
+class ImportJob:
+    id: str
+    bank: str
+    name: str
+    file_id: str
+    status: str = PENDING
+    upload_complete: bool = False
+    rows_parsed: int = 0
+    rows_categorized: int = 0
+    # сколько разобранных строк выписки уже обработано и лежит в operations.jsonl
+    committed_offset: int = 0
+    skipped: int = 0
+    # счета операций задания: нужны, если падение случилось во время commit
+    accounts: Dict[str, dict] = field(default_factory=dict)
+    # размер выписки и сколько байт уже прочитано — для оценки оставшегося времени
+    bytes_total: Optional[int] = None
+    bytes_read: int = 0
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    # строки и байты на момент запуска: при возобновлении скорость считаем только по новому прогону
+    run_rows_start: int = 0
+    run_bytes_start: int = 0
+    # версия нормализации признаков в operations.jsonl; None — задание старше версий
+    normalization_version: Optional[int] = None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ImportJob":
+        known = {f.name for f in fields(cls)}
+        return cls(**{key: value for key, value in data.items() if key in known})
+
+    def progress(self) -> dict:
+        """Фаза, обработанные строки, скорость (строк/с) и оценка оставшегося времени."""
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        rows = self.rows_parsed - self.run_rows_start
+        read = self.bytes_read - self.run_bytes_start
+        throughput = rows / elapsed if elapsed > 0 else None
+        eta = None
+        if self.status == DONE:
+            eta = 0.0
+        elif self.status == RUNNING and self.bytes_total and read > 0:
+            eta = max(self.bytes_total - self.bytes_read, 0) * elapsed / read
+        return {
+            "id": self.id,
+            "name": self.name,
+            "bank": self.bank,
+            "file_id": self.file_id,
+            "phase": self.status,
+            "rows_parsed": self.rows_parsed,
+            "rows_categorized": self.rows_categorized,
+            "skipped": self.skipped,
+            "bytes_read": self.bytes_read,
+            "bytes_total": self.bytes_total,
+            "rows_per_second": round(throughput, 1) if throughput is not None else None,
+            "eta_seconds": round(eta, 1) if eta is not None else None,
+            "error": self.error,
+        }
+
+
+class _ProgressReader(io.RawIOBase):
+    """Бинарный поток файла выписки, который считает прочитанные байты в задании."""
+
+    def __init__(self, stream: BinaryIO, job: ImportJob) -> None:
+        self._stream = stream
+        self._job = job
+
+    def readable(self) -> bool:
+        return True
+
+    def close(self) -> None:
+        if not self.closed:
+            self._stream.close()
+        super().close()
+
+    def readinto(self, buffer) -> int:
+        data = self._stream.read(len(buffer))
+        self._job.bytes_read += len(data)
+        buffer[: len(data)] = data
+        return len(data)
+
+
+def _job_dir(job_id: str, jobs_dir: Optional[Path]) -> Path:
+    return (jobs_dir or JOBS_DIR) / job_id
+
+
+def save_checkpoint(job: ImportJob, jobs_dir: Optional[Path] = None) -> None:
+    path = _job_dir(job.id, jobs_dir) / JOB_FILE
+    tmp_path = path.with_name(f"{path.name}.tmp")
+    with tmp_path.open("w", encoding="utf-8") as fp:
+        json.dump(asdict(job), fp, ensure_ascii=False)
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.replace(tmp_path, path)
+
+
+def create_job(bank: str, name: str, file_id: str, jobs_dir: Optional[Path] = None) -> ImportJob:
+    job = ImportJob(
+        id=uuid4().hex, bank=bank, name=name, file_id=file_id, normalization_version=NORMALIZATION_VERSION
+    )
+    _job_dir(job.id, jobs_dir).mkdir(parents=True, exist_ok=True)
+    save_checkpoint(job, jobs_dir)
+    return job
+
+
+def load_job(job_id: str, jobs_dir: Optional[Path] = None) -> Optional[ImportJob]:
+    path = _job_dir(job_id, jobs_dir) / JOB_FILE
+    try:
+        return ImportJob.from_dict(json.loads(path.read_text(encoding="utf-8")))
+    except (OSError, ValueError):
+        return None
+
+
+def unfinished_jobs(jobs_dir: Optional[Path] = None) -> List[ImportJob]:
+    """Задания, прерванные рестартом, в порядке создания."""
+    root = jobs_dir or JOBS_DIR
+    if not root.exists():
+        return []
+    jobs = [load_job(path.name, jobs_dir) for path in root.iterdir() if path.is_dir()]
+    return sorted((job for job in jobs if job and job.status not in {DONE, FAILED}), key=lambda job: job.created_at)
+
+
+def receive_upload(job: ImportJob, stream: BinaryIO, jobs_dir: Optional[Path] = None) -> None:
+    """Сохранить выписку целиком в каталог задания; после этого задание переживает рестарт."""
+    path = _job_dir(job.id, jobs_dir) / SOURCE_FILE
+    with path.open("wb") as fp:
+        shutil.copyfileobj(stream, fp)
+        fp.flush()
+        os.fsync(fp.fileno())
+    job.bytes_total = path.stat().st_size
+    job.upload_complete = True
+    save_checkpoint(job, jobs_dir)
+
+
+def discard_job(job: ImportJob, jobs_dir: Optional[Path] = None) -> None:
+    shutil.rmtree(_job_dir(job.id, jobs_dir), ignore_errors=True)
+
+
+def _load_staged(job: ImportJob, jobs_dir: Optional[Path]) -> List[Operation]:
+    path = _job_dir(job.id, jobs_dir) / STAGED_FILE
+    if not path.exists():
+        return []
+    staged: List[Operation] = []
+    offset = 0
+    with path.open("r+b") as fp:
+        for line in islice(fp, job.rows_categorized):
+            staged.append(storage.deserialize_operation(json.loads(line)))
+            offset += len(line)
+        # строки после последнего чекпоинта (падение между записью и чекпоинтом) отрезаем
+        fp.truncate(offset)
+    renormalize_stale(staged, job.normalization_version)
+    return staged
+
+
+def run_job(
+    job: ImportJob,
+    vault: Vault,
+    pipeline: CategorizationPipeline,
+    publish: PublishCallback,
+    commit: CommitCallback,
+    chunk_size: int = import_service.CHUNK_SIZE,
+    workers: int = 1,
+    jobs_dir: Optional[Path] = None,
+    lock: Optional[ContextManager] = None,
+    rollback: Optional[RollbackCallback] = None,
+) -> ImportJob:
+    """
+    Выполнить или продолжить задание; выписка уже сохранена receive_upload и
+    читается из source.csv (с workers > 1 — разбирается параллельно).
+    lock берётся на время работы с vault (сборка операций чанка, publish,
+    rollback, commit), категоризация идёт без него.
+    """
+    lock = lock if lock is not None else nullcontext()
+    job_dir = _job_dir(job.id, jobs_dir)
+    job.started_at = time.time()
+    job.finished_at = None
+    if job.status == COMMITTING:
+        # упали во время commit: commit должен сам распознать уже сохранённый file_id
+        staged = _load_staged(job, jobs_dir)
+        with lock:
+            for account_id, account in job.accounts.items():
+                vault.accounts.setdefault(account_id, Account(**account))
+            publish(staged, job)
+            commit(staged, job)
+        return _finish(job, jobs_dir)
+
+    staged = _load_staged(job, jobs_dir)
+    job.status = RUNNING
+    job.error = None
+    save_checkpoint(job, jobs_dir)
+
+    source_path = job_dir / SOURCE_FILE
+    # выписка читается с начала: прогресс прошлого запуска не суммируем с этим
+    job.bytes_read = 0
+    job.run_bytes_start = 0
+    if workers > 1:
+        source = str(source_path)
+    else:
+        source = decode_stream(_ProgressReader(source_path.open("rb"), job), ENCODINGS[job.bank])
+    try:
+        rows = ROW_READERS[job.bank](source, workers)
+        fingerprints = FingerprintFilter(vault)
+        with lock:
+            # строки до чекпоинта уже в operations.jsonl: прогоняем их только через
+            # фильтр дублей, чтобы счётчики вхождений совпали с первым запуском
+            for row in islice(rows, job.committed_offset):
+                fingerprints.admit(build_operation(vault, job.bank, row, job.file_id))
+            if staged:
+                publish(staged, job)
+        job.rows_parsed = job.committed_offset
+        job.run_rows_start = job.rows_parsed
+        job.run_bytes_start = job.bytes_read
+        with (job_dir / STAGED_FILE).open("a", encoding="utf-8") as staged_fp:
+            while True:
+                chunk_rows = list(islice(rows, chunk_size))
+                if not chunk_rows:
+                    break
+                operations = []
+                with lock:
+                    for row in chunk_rows:
+                        operation = build_operation(vault, job.bank, row, job.file_id)
+                        if fingerprints.admit(operation):
+                            operations.append(operation)
+                import_service.categorize_chunk(pipeline, operations)
+                staged_fp.writelines(
+                    json.dumps(storage.serialize_operation(op), ensure_ascii=False) + "\n" for op in operations
+                )
+                staged_fp.flush()
+                os.fsync(staged_fp.fileno())
+                staged.extend(operations)
+                job.rows_parsed += len(chunk_rows)
+                job.rows_categorized = len(staged)
+                job.committed_offset = job.rows_parsed
+                job.skipped = fingerprints.skipped
+                save_checkpoint(job, jobs_dir)
+                with lock:
+                    publish(operations, job)
+    except Exception as exc:
+        job.status = FAILED
+        job.error = str(exc) or exc.__class__.__name__
+        job.finished_at = time.time()
+        if rollback is not None:
+            with lock:
+                rollback(job)
+        discard_job(job, jobs_dir)
+        raise
+    finally:
+        if not isinstance(source, str):
+            source.close()
+
+    job.status = COMMITTING
+    with lock:
+        account_ids = {op.account_id for op in staged}
+        job.accounts = {acc_id: vars(vault.accounts[acc_id]) for acc_id in account_ids if acc_id in vault.accounts}
+        save_checkpoint(job, jobs_dir)
+        commit(staged, job)
+    return _finish(job, jobs_dir)
+
+
+def resumable_jobs(jobs_dir: Optional[Path] = None) -> List[ImportJob]:
+    """Задания, прерванные рестартом, которые можно продолжить; недокачанные выписки удаляются."""
+    jobs = []
+    for job in unfinished_jobs(jobs_dir):
+        if job.upload_complete:
+            jobs.append(job)
+        else:
+            discard_job(job, jobs_dir)
+    return jobs
+
+
+def _finish(job: ImportJob, jobs_dir: Optional[Path]) -> ImportJob:
+    job.status = DONE
+    job.finished_at = time.time()
+    discard_job(job, jobs_dir)
+    return job
+
+
+class ImportJobRunner:
+    """
+    Очередь заданий импорта с одним фоновым потоком: задания идут по порядку,
+    поэтому дедупликация между ними видит операции предыдущих. run(job)
+    выполняет задание целиком (обычно это run_job с нужными колбэками).
+    """
+
+    def __init__(self, run: Callable[[ImportJob], object]) -> None:
+        self._run = run
+        self._queue: "queue.Queue[ImportJob]" = queue.Queue()
+        self._jobs: Dict[str, ImportJob] = {}
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._loop, name="import-jobs", daemon=True)
+        self._thread.start()
+
+    def submit(self, job: ImportJob) -> ImportJob:
+        with self._lock:
+            self._jobs[job.id] = job
+            self._forget_finished()
+        self._queue.put(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[ImportJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> List[ImportJob]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def join(self) -> None:
+        """Дождаться выполнения всех поставленных заданий."""
+        self._queue.join()
+
+    def _forget_finished(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in {DONE, FAILED}]
+        for job_id in finished[: max(len(finished) - MAX_FINISHED_JOBS, 0)]:
+            del self._jobs[job_id]
+
+    def _loop(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                self._run(job)
+            except Exception as exc:
+                # поток продолжает следующие задания; каталог задания, упавшего
+                # во время commit, остаётся и будет продолжен после рестарта
+                if job.status not in {DONE, FAILED}:
+                    job.status = FAILED
+                    job.error = str(exc) or exc.__class__.__name__
+                    job.finished_at = time.time()
+            finally:
+                self._queue.task_done()
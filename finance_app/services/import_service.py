@@ -1,31 +1,85 @@
+from itertools import islice
 from pathlib import Path
-from typing import Iterable
+from typing import Callable, Iterable, List, Optional
 
-from finance_app.adapters.alfa_adapter import import_alfa_csv
-from finance_app.adapters.tinkoff_adapter import import_tinkoff_csv
+from finance_app.adapters.alfa_adapter import iter_alfa_operations
+from finance_app.adapters.rows import StatementSource
+from finance_app.adapters.tinkoff_adapter import iter_tinkoff_operations
 from finance_app.services.categorization import CategorizationPipeline
-from finance_app.domain import Vault, OperationType
+from finance_app.domain import Operation, Vault, OperationType
+from finance_app.fingerprints import FingerprintFilter
 
 
-def import_alfa_file_into_vault(vault: Vault, pipeline: CategorizationPipeline, path: str, file_id: str) -> int:
-    operations = import_alfa_csv(vault, path, file_id)
-    for op in operations:
+# сколько строк выписки категоризуется и попадает в vault за один шаг
+CHUNK_SIZE = 1000
+
+ChunkCallback = Callable[[List[Operation]], None]
+
+
+def categorize_chunk(pipeline: CategorizationPipeline, chunk: List[Operation]) -> None:
+    rest = []
+    for op in chunk:
         if op.type == OperationType.TRANSFER:
             op.category_id = op.category_id or "base_topup"
             op.categorization_source = op.categorization_source or "import"
             continue
-        pipeline.categorize(op)
-    return len(operations)
+        rest.append(op)
+    if rest:
+        pipeline.categorize_many(rest)
+
+
+def import_operations_into_vault(
+    vault: Vault,
+    pipeline: CategorizationPipeline,
+    operations: Iterable[Operation],
+    chunk_size: int = CHUNK_SIZE,
+    on_chunk: Optional[ChunkCallback] = None,
+) -> int:
+    """
+    Потоковый импорт: строки адаптера собираются в чанки по chunk_size,
+    чанк категоризуется и целиком добавляется в vault. В памяти, кроме самого
+    vault, живёт только текущий чанк, сколько бы строк ни было в выписке.
+    """
+    iterator = iter(operations)
+    count = 0
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            break
+        categorize_chunk(pipeline, chunk)
+        # в vault операции попадают уже с категориями, recategorized не нужен
+        for op in chunk:
+            vault.add_operation(op)
+        count += len(chunk)
+        if on_chunk is not None:
+            on_chunk(chunk)
+    return count
+
+
+def import_alfa_file_into_vault(
+    vault: Vault,
+    pipeline: CategorizationPipeline,
+    source: StatementSource,
+    file_id: str,
+    fingerprints: Optional[FingerprintFilter] = None,
+    chunk_size: int = CHUNK_SIZE,
+    on_chunk: Optional[ChunkCallback] = None,
+    workers: int = 1,
+) -> int:
+    operations = iter_alfa_operations(vault, source, file_id, fingerprints, workers)
+    return import_operations_into_vault(vault, pipeline, operations, chunk_size, on_chunk)
 
 
 def import_tinkoff_file_into_vault(
-    vault: Vault, pipeline: CategorizationPipeline, path: str, file_id: str
+    vault: Vault,
+    pipeline: CategorizationPipeline,
+    source: StatementSource,
+    file_id: str,
+    fingerprints: Optional[FingerprintFilter] = None,
+    chunk_size: int = CHUNK_SIZE,
+    on_chunk: Optional[ChunkCallback] = None,
+    workers: int = 1,
 ) -> int:
-    operations = import_tinkoff_csv(vault, path, file_id)
-    for op in operations:
-        if op.type == OperationType.TRANSFER:
-            op.category_id = op.category_id or "base_topup"
-            op.categorization_source = op.categorization_source or "import"
-            continue
-        pipeline.categorize(op)
-    return len(operations)
+    operations = iter_tinkoff_operations(vault, source, file_id, fingerprints, workers)
+    return import_operations_into_vault(vault, pipeline, operations, chunk_size, on_chunk)
+
@@ -1,7 +1,7 @@
 import json
 import time
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple
 
 import requests
 
@@ -12,6 +12,48 @@ from finance_app.utils import build_features
 
 ALLOWED_CATEGORY_IDS: List[str] = [cat.id for cat in iter_leaf_categories()]
 
+FEW_SHOTS = [
+    (
+        {
+            "description": "Lenta supermarket purchase",
+            "merchant": "Lenta",
+            "bank_category": "supermarket",
+            "mcc": "5411",
+            "amount": -1543.2,
+            "bank": "tinkoff",
+        },
+        "base_shopping_groceries",
+    ),
+    (
+        {
+            "description": "Yandex Go taxi ride",
+            "merchant": "Yandex Taxi",
+            "bank_category": "taxi",
+            "mcc": "4121",
+            "amount": -480,
+            "bank": "alfa",
+        },
+        "base_transport_taxi",
+    ),
+    (
+        {
+            "description": "Apteka Izhevsk",
+            "merchant": "Apteka 36-6",
+            "bank_category": "pharmacy",
+            "mcc": "5122",
+            "amount": -920.5,
+            "bank": "tinkoff",
+        },
+        "base_shopping_pharmacy",
+    ),
+]
+
+
+# сколько операций predict_many отправляет в одном запросе
+BATCH_SIZE = 20
+
+CacheKey = Tuple[str, str, str, str, str]
+
 
 @dataclass
 class LLMStatus:
@@ -33,13 +75,15 @@ class LLMCategorizer:
         api_url: str = "https://api.openai.com/v1/chat/completions",
         timeout: int = 12,
         cache_ttl_seconds: int = 3600,
+        batch_size: int = BATCH_SIZE,
     ) -> None:
         self.api_key = api_key
         self.model = model
         self.api_url = api_url
         self.timeout = timeout
         self.cache_ttl_seconds = cache_ttl_seconds
-        self._cache: Dict[Tuple[str, str, str, str, str], Tuple[float, str]] = {}
+        self.batch_size = batch_size
+        self._cache: Dict[CacheKey, Tuple[float, str]] = {}
 
     def is_ready(self) -> bool:
         return bool(self.api_key and self.model and self.api_url)
@@ -52,20 +96,63 @@ class LLMCategorizer:
             return None
 
         feats = build_features(operation)
-        cache_key = (
+        cache_key = self._cache_key(feats)
+        cached = self._read_cache(cache_key)
+        if cached:
+            return cached
+
+        data = self._request(self._build_payload(operation, feats))
+        guess = self._parse_response(data) if data is not None else None
+        if guess:
+            self._write_cache(cache_key, guess)
+        return guess
+
+    def predict_many(self, operations: Sequence[Operation]) -> List[Optional[str]]:
+        """
+        Категории для пачки операций: одинаковые по ключу кэша операции
+        спрашиваются один раз, остальные уходят в API пачками по batch_size.
+        """
+        results: List[Optional[str]] = [None] * len(operations)
+        if not self.is_ready():
+            return results
+
+        pending: Dict[CacheKey, Tuple[Operation, object, List[int]]] = {}
+        for index, operation in enumerate(operations):
+            feats = build_features(operation)
+            cache_key = self._cache_key(feats)
+            cached = self._read_cache(cache_key)
+            if cached:
+                results[index] = cached
+            elif cache_key in pending:
+                pending[cache_key][2].append(index)
+            else:
+                pending[cache_key] = (operation, feats, [index])
+
+        items = list(pending.items())
+        for start in range(0, len(items), self.batch_size):
+            batch = items[start : start + self.batch_size]
+            guesses = self._request_batch([(operation, feats) for _, (operation, feats, _) in batch])
+            for (cache_key, (_, _, indexes)), guess in zip(batch, guesses):
+                if not guess:
+                    continue
+                self._write_cache(cache_key, guess)
+                for index in indexes:
+                    results[index] = guess
+        return results
+
+    @staticmethod
+    def _cache_key(feats) -> CacheKey:
+        return (
             feats.merchant_norm,
             feats.bank_category_norm,
             feats.mcc or "",
             feats.text,
             feats.bank,
         )
-        cached = self._read_cache(cache_key)
-        if cached:
-            return cached
 
-        payload = self._build_payload(operation, feats)
+    def _request(self, payload: Dict[str, object]) -> Optional[object]:
+        """JSON ответа API; None — ошибка сети или API."""
         headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
-
         try:
             response = requests.post(self.api_url, headers=headers, json=payload, timeout=self.timeout)
         except Exception:
@@ -73,14 +160,30 @@ class LLMCategorizer:
 
         if response.status_code != 200:
             return None
+        try:
+            return response.json()
+        except ValueError:
+            return None
 
-        guess = self._parse_response(response.json())
-        if guess:
-            self._write_cache(cache_key, guess)
-        return guess
-
-    def _build_payload(self, operation: Operation, feats) -> Dict[str, object]:
-        user_payload = {
+    def _request_batch(self, batch: List[Tuple[Operation, object]]) -> List[Optional[str]]:
+        if len(batch) == 1:
+            operation, feats = batch[0]
+            data = self._request(self._build_payload(operation, feats))
+            return [self._parse_response(data) if data is not None else None]
+
+        data = self._request(self._build_batch_payload(batch))
+        guesses = self._parse_batch_response(data, len(batch)) if data is not None else None
+        if guesses is None:
+            # модель не вернула список нужной длины — спрашиваем по одной
+            guesses = []
+            for operation, feats in batch:
+                single = self._request(self._build_payload(operation, feats))
+                guesses.append(self._parse_response(single) if single is not None else None)
+        return guesses
+
+    @staticmethod
+    def _operation_payload(operation: Operation, feats) -> Dict[str, object]:
+        return {
             "description": operation.description or "",
             "merchant": operation.merchant or "",
             "bank_category": operation.bank_category or "",
@@ -88,44 +191,10 @@ class LLMCategorizer:
             "amount": float(operation.amount),
             "bank": operation.bank,
             "normalized_text": feats.text,
-            "allowed_category_ids": ALLOWED_CATEGORY_IDS,
         }
 
-        few_shots = [
-            (
-                {
-                    "description": "Lenta supermarket purchase",
-                    "merchant": "Lenta",
-                    "bank_category": "supermarket",
-                    "mcc": "5411",
-                    "amount": -1543.2,
-                    "bank": "tinkoff",
-                },
-                "base_shopping_groceries",
-            ),
-            (
-                {
-                    "description": "Yandex Go taxi ride",
-                    "merchant": "Yandex Taxi",
-                    "bank_category": "taxi",
-                    "mcc": "4121",
-                    "amount": -480,
-                    "bank": "alfa",
-                },
-                "base_transport_taxi",
-            ),
-            (
-                {
-                    "description": "Apteka Izhevsk",
-                    "merchant": "Apteka 36-6",
-                    "bank_category": "pharmacy",
-                    "mcc": "5122",
-                    "amount": -920.5,
-                    "bank": "tinkoff",
-                },
-                "base_shopping_pharmacy",
-            ),
-        ]
+    def _build_payload(self, operation: Operation, feats) -> Dict[str, object]:
+        user_payload = {**self._operation_payload(operation, feats), "allowed_category_ids": ALLOWED_CATEGORY_IDS}
 
         messages = [
             {
@@ -138,7 +207,7 @@ class LLMCategorizer:
             }
         ]
 
-        for shot_user, shot_label in few_shots:
+        for shot_user, shot_label in FEW_SHOTS:
             messages.append({"role": "user", "content": json.dumps(shot_user, ensure_ascii=True)})
             messages.append({"role": "assistant", "content": json.dumps({"category_id": shot_label})})
 
@@ -151,6 +220,46 @@ class LLMCategorizer:
             "messages": messages,
         }
 
+    def _build_batch_payload(self, batch: List[Tuple[Operation, object]]) -> Dict[str, object]:
+        user_payload = {
+            "operations": [self._operation_payload(operation, feats) for operation, feats in batch],
+            "allowed_category_ids": ALLOWED_CATEGORY_IDS,
+        }
+        messages = [
+            {
+                "role": "system",
+                "content": (
+                    "You classify bank operations into category ids, one per operation, in the same order. "
+                    "Respond ONLY with JSON like {\"category_ids\": [\"base_transport_taxi\", \"base_shopping_groceries\"]}. "
+                    "Use only the allowed category ids provided by the user."
+                ),
+            },
+            {"role": "user", "content": json.dumps({"operations": [shot for shot, _ in FEW_SHOTS]}, ensure_ascii=True)},
+            {"role": "assistant", "content": json.dumps({"category_ids": [label for _, label in FEW_SHOTS]})},
+            {"role": "user", "content": json.dumps(user_payload, ensure_ascii=True)},
+        ]
+        return {
+            "model": self.model,
+            "temperature": 0,
+            "max_tokens": 20 * len(batch),
+            "messages": messages,
+        }
+
+    def _parse_batch_response(self, data: Dict[str, object], expected: int) -> Optional[List[Optional[str]]]:
+        choices = data.get("choices") if isinstance(data, dict) else None
+        if not choices or not isinstance(choices[0], dict):
+            return None
+        content = (choices[0].get("message") or {}).get("content")
+        if isinstance(content, str):
+            try:
+                content = json.loads(content)
+            except ValueError:
+                return None
+        candidates = content.get("category_ids") if isinstance(content, dict) else None
+        if not isinstance(candidates, list) or len(candidates) != expected:
+            return None
+        return [candidate if self._is_allowed(candidate) else None for candidate in candidates]
+
     def _parse_response(self, data: Dict[str, object]) -> Optional[str]:
         choices = data.get("choices") if isinstance(data, dict) else None
         if not choices:
@@ -189,7 +298,7 @@ class LLMCategorizer:
     def _is_allowed(self, candidate: Optional[str]) -> bool:
         return bool(candidate) and candidate in ALLOWED_CATEGORY_IDS
 
-    def _read_cache(self, key: Tuple[str, str, str, str, str]) -> Optional[str]:
+    def _read_cache(self, key: CacheKey) -> Optional[str]:
         cached = self._cache.get(key)
         if not cached:
             return None
@@ -199,5 +308,5 @@ class LLMCategorizer:
             return None
         return value
 
-    def _write_cache(self, key: Tuple[str, str, str, str, str], value: str) -> None:
+    def _write_cache(self, key: CacheKey, value: str) -> None:
         self._cache[key] = (time.time(), value)
@@ -1,5 +1,6 @@
 from dataclasses import dataclass
-from typing import Dict, Iterable, List, Optional
+from typing import Dict, Iterable, List, Optional, Sequence
+from uuid import uuid4
 
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.linear_model import LogisticRegression
@@ -33,6 +34,8 @@ class SimpleMLModel:
         self.label_mapping: List[str] = []
         self.samples_count: int = 0
         self.last_metrics: Optional[Dict[str, float]] = None
+        # меняется при каждом обучении и сохраняется с моделью: по нему сбрасывается кэш решений
+        self.version: Optional[str] = None
 
     def fit(self, operations: Iterable[Operation]) -> MLStatus:
         texts: List[str] = []
@@ -41,19 +44,7 @@ class SimpleMLModel:
         for op in operations:
             if not op.category_id or op.category_id in SERVICE_BASE_IDS or op.category_id == "base_unknown":
                 continue
-            feats = build_features(op)
-            text = " ".join(
-                part
-                for part in [
-                    feats.text,
-                    feats.bank_category_norm,
-                    feats.merchant_norm,
-                    feats.bank,
-                    feats.mcc or "",
-                ]
-                if part
-            )
-            texts.append(text)
+            texts.append(self._feature_text(op))
             labels.append(op.category_id)
 
         self.samples_count = len(texts)
@@ -61,6 +52,7 @@ class SimpleMLModel:
             self.pipeline = None
             self.label_mapping = []
             self.last_metrics = None
+            self.version = None
             return MLStatus(trained=False, samples=self.samples_count, classes=[], metrics=None)
 
         X_train, X_test, y_train, y_test = self._train_test_split_safe(texts, labels)
@@ -79,6 +71,7 @@ class SimpleMLModel:
             }
         self.last_metrics = metrics
         self.label_mapping = sorted(list(set(labels)))
+        self.version = uuid4().hex
         return MLStatus(trained=True, samples=self.samples_count, classes=self.label_mapping, metrics=metrics)
 
     def _train_test_split_safe(self, texts: List[str], labels: List[str]):
@@ -94,11 +87,10 @@ class SimpleMLModel:
     def is_ready(self) -> bool:
         return self.pipeline is not None
 
-    def predict(self, operation: Operation) -> Optional[str]:
-        if not self.pipeline:
-            return None
+    @staticmethod
+    def _feature_text(operation: Operation) -> str:
         feats = build_features(operation)
-        text = " ".join(
+        return " ".join(
             part
             for part in [
                 feats.text,
@@ -109,10 +101,18 @@ class SimpleMLModel:
             ]
             if part
         )
+
+    def predict(self, operation: Operation) -> Optional[str]:
+        return self.predict_many([operation])[0]
+
+    def predict_many(self, operations: Sequence[Operation]) -> List[Optional[str]]:
+        """Один векторизованный вызов predict на все операции."""
+        if not self.pipeline or not operations:
+            return [None] * len(operations)
         try:
-            return self.pipeline.predict([text])[0]
+            return self.pipeline.predict([self._feature_text(op) for op in operations]).tolist()
         except Exception:
-            return None
+            return [None] * len(operations)
 
     def status(self) -> MLStatus:
         return MLStatus(
@@ -132,6 +132,7 @@ class SimpleMLModel:
                 "samples": self.samples_count,
                 "classes": self.label_mapping,
                 "metrics": self.last_metrics,
+                "version": self.version,
             },
             path,
         )
@@ -144,4 +145,6 @@ class SimpleMLModel:
         self.samples_count = data.get("samples", 0)
         self.label_mapping = data.get("classes", [])
         self.last_metrics = data.get("metrics")
+        # модели, сохранённые до появления версии, отличаем по числу примеров
+        self.version = data.get("version") or f"legacy-{self.samples_count}"
         return True
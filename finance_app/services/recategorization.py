@@ -0,0 +1,199 @@
+"""
+Инкрементальная перекатегоризация при смене правил или маппинга.
+
+Конфигурация категоризации — таблица правил и маппинг категорий банка. Снимок
+конфигурации, которой категоризован vault, лежит в data/categorization.json.
+При смене версии перекатегоризуются только операции, чьи признаки (категория
+банка, слова текста, MCC) задевают изменённые правила или записи маппинга:
+их находит обратный индекс VaultIndex.with_features. diff_configs делает то
+же без изменения vault и считает, сколько операций сменит категорию.
+"""
+
+import hashlib
+import json
+import os
+from collections import Counter
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from finance_app import category_mapping, rules
+from finance_app.domain import Operation, OperationType, Vault
+from finance_app.rules import CompiledRules, Rule
+from finance_app.services.categorization import BATCH_SIZE, CategorizationPipeline
+
+
+CONFIG_PATH = Path("data") / "categorization.json"
+
+Mapping = Dict[Tuple[str, str], str]
+
+
+@dataclass
+class CategorizationConfig:
+    rules: List[Rule]
+    mapping: Mapping
+
+    @classmethod
+    def current(cls) -> "CategorizationConfig":
+        return cls(list(rules.RULES), dict(category_mapping.BANK_CATEGORY_TO_BASE))
+
+    @property
+    def version(self) -> str:
+        return hashlib.sha1(json.dumps(self.to_dict(), ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def to_dict(self) -> dict:
+        return {
+            "rules": [_rule_to_dict(rule) for rule in self.rules],
+            "mapping": [[bank, bank_category, base_id] for (bank, bank_category), base_id in sorted(self.mapping.items())],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict, base: Optional["CategorizationConfig"] = None) -> "CategorizationConfig":
+        """Конфигурация из JSON; недостающие rules или mapping берутся из base."""
+        base = base or cls.current()
+        parsed_rules = [_rule_from_dict(item) for item in data["rules"]] if "rules" in data else list(base.rules)
+        if "mapping" in data:
+            mapping = {(bank, bank_category): base_id for bank, bank_category, base_id in data["mapping"]}
+        else:
+            mapping = dict(base.mapping)
+        return cls(parsed_rules, mapping)
+
+
+def _rule_to_dict(rule: Rule) -> dict:
+    return {
+        "category_id": rule.category_id,
+        "source": rule.source,
+        "keywords": list(rule.keywords),
+        "field": rule.field,
+        "mccs": sorted(rule.mccs),
+        "also": list(rule.also),
+        "types": [op_type.value for op_type in rule.types],
+    }
+
+
+def _rule_from_dict(data: dict) -> Rule:
+    if data.get("field", "text") not in {"text", "merchant"}:
+        raise ValueError(f"bad rule field {data.get('field')!r}")
+    return Rule(
+        category_id=data["category_id"],
+        source=data["source"],
+        keywords=tuple(data.get("keywords", ())),
+        field=data.get("field", "text"),
+        mccs=frozenset(data.get("mccs", ())),
+        also=tuple(data.get("also", ())),
+        types=tuple(OperationType(value) for value in data.get("types", ())),
+    )
+
+
+def load_config(path: Optional[Path] = None) -> Optional[CategorizationConfig]:
+    path = path or CONFIG_PATH
+    try:
+        return CategorizationConfig.from_dict(json.loads(path.read_text(encoding="utf-8")))
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def save_config(config: CategorizationConfig, path: Optional[Path] = None) -> None:
+    path = path or CONFIG_PATH
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.tmp")
+    tmp_path.write_text(json.dumps(config.to_dict(), ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def changed_rules(old: List[Rule], new: List[Rule]) -> Set[Rule]:
+    """Правила, добавленные, удалённые или сменившие место относительно общих правил."""
+    old_set, new_set = set(old), set(new)
+    changed = old_set ^ new_set
+    old_common = [rule for rule in old if rule in new_set]
+    new_common = [rule for rule in new if rule in old_set]
+    for before, after in zip(old_common, new_common):
+        if before != after:
+            changed.update((before, after))
+    return changed
+
+
+def affected_operations(vault: Vault, old: CategorizationConfig, new: CategorizationConfig) -> List[Operation]:
+    """Надмножество операций, чья категория может зависеть от разницы old и new."""
+    # запись (bank, категория) задевает операции с этой категорией; банк сверит сам пайплайн
+    bank_categories = {
+        bank_category
+        for bank, bank_category in old.mapping.keys() | new.mapping.keys()
+        if old.mapping.get((bank, bank_category)) != new.mapping.get((bank, bank_category))
+    }
+    keywords: Set[str] = set()
+    mccs: Set[str] = set()
+    for rule in changed_rules(old.rules, new.rules):
+        keywords.update(rule.keywords)
+        mccs.update(rule.mccs)
+    # переводы категоризуются при импорте, пайплайн их не трогает (import_service.categorize_chunk)
+    return [op for op in vault.index.with_features(bank_categories, keywords, mccs) if op.type != OperationType.TRANSFER]
+
+
+def _categorize_afresh(operations: List[Operation], pipeline: CategorizationPipeline) -> None:
+    # прежняя категория сбрасывается: иначе сервисную категорию удалённого правила
+    # сохранил бы "rule: already service"
+    for op in operations:
+        op.category_id = None
+    for start in range(0, len(operations), BATCH_SIZE):
+        pipeline.categorize_many(operations[start : start + BATCH_SIZE])
+
+
+def _pipeline_for(pipeline: CategorizationPipeline, config: CategorizationConfig) -> CategorizationPipeline:
+    """Пайплайн с моделями pipeline, но правилами и маппингом config; без кэша решений и общих счётчиков."""
+    return CategorizationPipeline(
+        ml_model=pipeline.ml_model,
+        llm_categorizer=pipeline.llm_categorizer,
+        merchant_dictionary=pipeline.merchant_dictionary,
+        compiled_rules=CompiledRules(config.rules),
+        mapping=config.mapping,
+    )
+
+
+def _categorized_copies(operations: List[Operation], pipeline: CategorizationPipeline) -> List[Tuple[Optional[str], str]]:
+    copies = [replace(op) for op in operations]
+    _categorize_afresh(copies, pipeline)
+    return [(op.category_id, op.categorization_source) for op in copies]
+
+
+def diff_configs(
+    vault: Vault, pipeline: CategorizationPipeline, old: CategorizationConfig, new: CategorizationConfig
+) -> dict:
+    """
+    Сколько операций сменят категорию при переходе с old на new. Vault не
+    меняется: обе версии прогоняются на копиях затронутых операций.
+    """
+    candidates = affected_operations(vault, old, new)
+    before = _categorized_copies(candidates, _pipeline_for(pipeline, old))
+    after = _categorized_copies(candidates, _pipeline_for(pipeline, new))
+    transitions = Counter(
+        (old_category, new_category)
+        for (old_category, _), (new_category, _) in zip(before, after)
+        if old_category != new_category
+    )
+    return {
+        "from_version": old.version,
+        "to_version": new.version,
+        "candidates": len(candidates),
+        "moved": sum(transitions.values()),
+        "transitions": [
+            {"from": old_category, "to": new_category, "count": count}
+            for (old_category, new_category), count in transitions.most_common()
+        ],
+    }
+
+
+def apply_config_change(
+    vault: Vault, pipeline: CategorizationPipeline, old: CategorizationConfig, new: CategorizationConfig
+) -> List[Operation]:
+    """
+    Перекатегоризовать действующим pipeline (его правила и маппинг — это new)
+    только операции, затронутые переходом с old. Возвращает операции, чья
+    категория или источник изменились.
+    """
+    candidates = affected_operations(vault, old, new)
+    before = [(op.category_id, op.categorization_source) for op in candidates]
+    _categorize_afresh(candidates, pipeline)
+    changed = [op for op, previous in zip(candidates, before) if (op.category_id, op.categorization_source) != previous]
+    vault.recategorized(changed)
+    return changed
@@ -0,0 +1,137 @@
+"""
+Хранилище по сегментам: один неизменяемый колоночный файл на каждый source_file_id
+и маленький manifest.json со списком загруженных файлов и счетами.
+
+Удаление или замена выписки — это удаление одного файла сегмента и перезапись
+манифеста, остальные сегменты не трогаются. При загрузке сегменты читаются
+по одному в порядке манифеста; в памяти, кроме vault, только текущий сегмент.
+
+Параллельной загрузки нет намеренно: декодирование сегмента — чистый Python,
+потоки упираются в GIL, а процессам пришлось бы передавать операции обратно
+через pickle, и одна распаковка в основном процессе дороже самого чтения
+сегмента (~10 против ~6.6 мкс на операцию на 200k операций).
+"""
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from finance_app.domain import Operation, Vault
+from finance_app.services import columnar_snapshot, storage
+from finance_app.utils import NORMALIZATION_VERSION
+
+
+SEGMENTS_DIR = Path("data") / "segments"
+MANIFEST_NAME = "manifest.json"
+# операции без source_file_id (например, из старых состояний) живут в отдельном сегменте
+UNSOURCED_SEGMENT = "_unsourced"
+
+
+def _segment_key(op: Operation) -> str:
+    return op.source_file_id or UNSOURCED_SEGMENT
+
+
+def _segment_path(segments_dir: Path, key: str) -> Path:
+    return segments_dir / f"{key}.seg"
+
+
+def _segment_digest(operations: List[Operation]) -> str:
+    # сегмент неизменяем, пока не поменялся состав операций или их категории
+    digest = hashlib.sha1()
+    for op in operations:
+        digest.update(f"{op.id}\0{op.category_id}\0{op.categorization_source}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _segment_entry(operations: List[Operation]) -> dict:
+    # сегмент со старой версией нормализации переписывается при следующем сохранении
+    return {"count": len(operations), "digest": _segment_digest(operations), "normalization_version": NORMALIZATION_VERSION}
+
+
+def _read_manifest(segments_dir: Path) -> Optional[dict]:
+    path = segments_dir / MANIFEST_NAME
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def _write_manifest(segments_dir: Path, vault: Vault, uploaded_files: List[dict], segments: Dict[str, dict]) -> None:
+    segments_dir.mkdir(parents=True, exist_ok=True)
+    data = {
+        "uploaded_files": uploaded_files,
+        "accounts": {k: vars(v) for k, v in vault.accounts.items()},
+        "segments": segments,
+    }
+    path = segments_dir / MANIFEST_NAME
+    tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+    tmp_path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def _group_by_segment(operations: List[Operation]) -> Dict[str, List[Operation]]:
+    groups: Dict[str, List[Operation]] = {}
+    for op in operations:
+        groups.setdefault(_segment_key(op), []).append(op)
+    return groups
+
+
+def save_state(vault: Vault, uploaded_files: List[dict], segments_dir: Optional[Path] = None) -> None:
+    """
+    Полное сохранение: переписываются только сегменты, у которых изменился
+    состав или категории, лишние сегменты удаляются.
+    """
+    segments_dir = segments_dir or SEGMENTS_DIR
+    manifest = _read_manifest(segments_dir) or {}
+    previous: Dict[str, dict] = manifest.get("segments") or {}
+    segments: Dict[str, dict] = {}
+    for key, operations in _group_by_segment(vault.operations).items():
+        entry = _segment_entry(operations)
+        if previous.get(key) != entry or not _segment_path(segments_dir, key).exists():
+            columnar_snapshot.write_snapshot(_segment_path(segments_dir, key), operations)
+        segments[key] = entry
+    _write_manifest(segments_dir, vault, uploaded_files, segments)
+    for key in previous.keys() - segments.keys():
+        _segment_path(segments_dir, key).unlink(missing_ok=True)
+
+
+def add_segment(
+    vault: Vault, file_id: str, operations: List[Operation], uploaded_files: List[dict], segments_dir: Optional[Path] = None
+) -> None:
+    """Записать сегмент одного файла выписки и обновить манифест."""
+    segments_dir = segments_dir or SEGMENTS_DIR
+    manifest = _read_manifest(segments_dir) or {}
+    segments: Dict[str, dict] = manifest.get("segments") or {}
+    columnar_snapshot.write_snapshot(_segment_path(segments_dir, file_id), operations)
+    segments[file_id] = _segment_entry(operations)
+    _write_manifest(segments_dir, vault, uploaded_files, segments)
+
+
+def delete_segment(vault: Vault, file_id: str, uploaded_files: List[dict], segments_dir: Optional[Path] = None) -> None:
+    """Удалить сегмент файла выписки: сначала манифест, потом сам файл."""
+    segments_dir = segments_dir or SEGMENTS_DIR
+    manifest = _read_manifest(segments_dir) or {}
+    segments: Dict[str, dict] = manifest.get("segments") or {}
+    segments.pop(file_id, None)
+    _write_manifest(segments_dir, vault, uploaded_files, segments)
+    _segment_path(segments_dir, file_id).unlink(missing_ok=True)
+
+
+def iter_segments(segments_dir: Optional[Path] = None) -> Iterator[Tuple[str, List[Operation]]]:
+    """Читать сегменты по одному в порядке манифеста."""
+    segments_dir = segments_dir or SEGMENTS_DIR
+    manifest = _read_manifest(segments_dir) or {}
+    for key in manifest.get("segments") or {}:
+        yield key, columnar_snapshot.read_snapshot(_segment_path(segments_dir, key))[0]
+
+
+def load_state(vault: Vault, segments_dir: Optional[Path] = None) -> Tuple[List[dict], bool]:
+    segments_dir = segments_dir or SEGMENTS_DIR
+    manifest = _read_manifest(segments_dir)
+    if manifest is None:
+        return [], False
+    vault.accounts = {acc_id: storage.deserialize_account(acc) for acc_id, acc in (manifest.get("accounts") or {}).items()}
+    vault.replace_operations(op for _, operations in iter_segments(segments_dir) for op in operations)
+    return manifest.get("uploaded_files") or [], True
@@ -0,0 +1,250 @@
+"""
+SQLite-хранилище состояния с тем же интерфейсом, что и storage.save_state/load_state.
+
+Операции лежат в одной таблице с индексами по date, category_id, account_id и
+source_file_id: удаление файла и выборка query_operations (её использует
+/api/operations) идут по индексу.
+
+Ограничение: при старте load_state всё равно поднимает все строки в Vault в
+памяти, и аналитика, категоризация и остальные эндпоинты работают с ним, а не с
+базой. SQLite здесь — инкрементальное хранилище (без переписывания всего
+состояния на каждую мутацию), а не замена vault в памяти.
+"""
+
+import json
+import sqlite3
+from contextlib import closing
+from datetime import date
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+from finance_app.domain import Account, Operation, OperationType, Vault
+from finance_app.services import storage
+from finance_app.utils import NORMALIZATION_VERSION, renormalize_stale
+
+
+DB_PATH = Path("data") / "vault.sqlite3"
+
+_OPERATION_COLUMNS = (
+    "id",
+    "account_id",
+    "bank",
+    "date",
+    "amount",
+    "currency",
+    "type",
+    "description",
+    "merchant",
+    "mcc",
+    "bank_category",
+    "category_id",
+    "categorization_source",
+    "source_file_id",
+    "text_norm",
+    "merchant_norm",
+    "bank_category_norm",
+)
+
+# колонки, добавленные после первой версии схемы: старые базы догоняются ALTER TABLE
+_ADDED_COLUMNS = ("text_norm", "merchant_norm", "bank_category_norm")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS operations (
+    id TEXT PRIMARY KEY,
+    account_id TEXT NOT NULL,
+    bank TEXT NOT NULL,
+    date TEXT NOT NULL,
+    amount TEXT NOT NULL,
+    currency TEXT NOT NULL,
+    type TEXT NOT NULL,
+    description TEXT NOT NULL,
+    merchant TEXT,
+    mcc TEXT,
+    bank_category TEXT,
+    category_id TEXT,
+    categorization_source TEXT,
+    source_file_id TEXT,
+    text_norm TEXT,
+    merchant_norm TEXT,
+    bank_category_norm TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_operations_date ON operations (date);
+CREATE INDEX IF NOT EXISTS idx_operations_category ON operations (category_id);
+CREATE INDEX IF NOT EXISTS idx_operations_account ON operations (account_id);
+CREATE INDEX IF NOT EXISTS idx_operations_source_file ON operations (source_file_id);
+CREATE TABLE IF NOT EXISTS accounts (
+    id TEXT PRIMARY KEY,
+    bank TEXT NOT NULL,
+    name TEXT NOT NULL,
+    number TEXT
+);
+CREATE TABLE IF NOT EXISTS uploaded_files (
+    position INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    meta TEXT NOT NULL
+);
+"""
+
+
+def connect(path: Optional[Path] = None) -> sqlite3.Connection:
+    db_path = path or DB_PATH
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(db_path))
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    existing = {row["name"] for row in conn.execute("PRAGMA table_info(operations)")}
+    for column in _ADDED_COLUMNS:
+        if column not in existing:
+            conn.execute(f"ALTER TABLE operations ADD COLUMN {column} TEXT")
+    return conn
+
+
+def _operation_row(op: Operation) -> tuple:
+    data = storage.serialize_operation(op)
+    return tuple(data[col] for col in _OPERATION_COLUMNS)
+
+
+def _row_operation(row: sqlite3.Row) -> Operation:
+    return storage.deserialize_operation(dict(row))
+
+
+def _write_accounts(conn: sqlite3.Connection, accounts: Iterable[Account]) -> None:
+    conn.executemany(
+        "INSERT OR REPLACE INTO accounts (id, bank, name, number) VALUES (?, ?, ?, ?)",
+        [(acc.id, acc.bank, acc.name, acc.number) for acc in accounts],
+    )
+
+
+def _write_files(conn: sqlite3.Connection, uploaded_files: List[dict]) -> None:
+    conn.execute("DELETE FROM uploaded_files")
+    conn.executemany(
+        "INSERT INTO uploaded_files (position, id, meta) VALUES (?, ?, ?)",
+        [(pos, f["id"], json.dumps(f, ensure_ascii=False)) for pos, f in enumerate(uploaded_files)],
+    )
+
+
+_INSERT_OPERATION = (
+    f"INSERT OR REPLACE INTO operations ({', '.join(_OPERATION_COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in _OPERATION_COLUMNS)})"
+)
+
+
+def save_state(vault: Vault, uploaded_files: List[dict], path: Optional[Path] = None) -> None:
+    with closing(connect(path)) as conn, conn:
+        conn.execute("DELETE FROM operations")
+        conn.execute("DELETE FROM accounts")
+        conn.executemany(_INSERT_OPERATION, [_operation_row(op) for op in vault.operations])
+        _write_accounts(conn, vault.accounts.values())
+        _write_files(conn, uploaded_files)
+        conn.execute(f"PRAGMA user_version = {NORMALIZATION_VERSION}")
+
+
+def load_state(vault: Vault, path: Optional[Path] = None) -> Tuple[List[dict], bool]:
+    if not (path or DB_PATH).exists():
+        return [], False
+    with closing(connect(path)) as conn:
+        uploaded_files = [json.loads(row["meta"]) for row in conn.execute("SELECT meta FROM uploaded_files ORDER BY position")]
+        vault.accounts = {
+            row["id"]: Account(id=row["id"], bank=row["bank"], name=row["name"], number=row["number"])
+            for row in conn.execute("SELECT * FROM accounts")
+        }
+        operations = [_row_operation(row) for row in conn.execute("SELECT * FROM operations ORDER BY rowid")]
+        # версия нормализации признаков хранится в user_version базы
+        (version,) = conn.execute("PRAGMA user_version").fetchone()
+        if renormalize_stale(operations, version):
+            with conn:
+                conn.executemany(
+                    "UPDATE operations SET text_norm = ?, merchant_norm = ?, bank_category_norm = ? WHERE id = ?",
+                    [(op.text_norm, op.merchant_norm, op.bank_category_norm, op.id) for op in operations],
+                )
+                conn.execute(f"PRAGMA user_version = {NORMALIZATION_VERSION}")
+        vault.replace_operations(operations)
+    return uploaded_files, True
+
+
+def add_operations(
+    vault: Vault, operations: List[Operation], uploaded_files: List[dict], path: Optional[Path] = None
+) -> None:
+    account_ids = {op.account_id for op in operations}
+    with closing(connect(path)) as conn, conn:
+        conn.executemany(_INSERT_OPERATION, [_operation_row(op) for op in operations])
+        _write_accounts(conn, [vault.accounts[acc_id] for acc_id in account_ids if acc_id in vault.accounts])
+        _write_files(conn, uploaded_files)
+
+
+def update_categories(operations: Iterable[Operation], path: Optional[Path] = None) -> None:
+    with closing(connect(path)) as conn, conn:
+        conn.executemany(
+            "UPDATE operations SET category_id = ?, categorization_source = ? WHERE id = ?",
+            [(op.category_id, op.categorization_source, op.id) for op in operations],
+        )
+
+
+def delete_file(file_id: str, uploaded_files: List[dict], path: Optional[Path] = None) -> int:
+    with closing(connect(path)) as conn, conn:
+        cursor = conn.execute("DELETE FROM operations WHERE source_file_id = ?", (file_id,))
+        _write_files(conn, uploaded_files)
+        return cursor.rowcount
+
+
+def query_operations(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    category_id: Optional[str] = None,
+    account_id: Optional[str] = None,
+    source_file_id: Optional[str] = None,
+    op_type: Optional[OperationType] = None,
+    exclude_categories: Iterable[str] = (),
+    limit: Optional[int] = None,
+    newest_first: bool = False,
+    path: Optional[Path] = None,
+) -> List[Operation]:
+    clauses: List[str] = []
+    params: List[object] = []
+    if start:
+        clauses.append("date >= ?")
+        params.append(start.isoformat())
+    if end:
+        clauses.append("date <= ?")
+        params.append(end.isoformat())
+    if category_id:
+        clauses.append("category_id = ?")
+        params.append(category_id)
+    if account_id:
+        clauses.append("account_id = ?")
+        params.append(account_id)
+    if source_file_id:
+        clauses.append("source_file_id = ?")
+        params.append(source_file_id)
+    if op_type:
+        clauses.append("type = ?")
+        params.append(op_type.value)
+    excluded = list(exclude_categories)
+    if excluded:
+        clauses.append(f"(category_id IS NULL OR category_id NOT IN ({', '.join('?' for _ in excluded)}))")
+        params.extend(excluded)
+    sql = "SELECT * FROM operations"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY date DESC, rowid" if newest_first else " ORDER BY date, rowid"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    with closing(connect(path)) as conn:
+        return [_row_operation(row) for row in conn.execute(sql, params)]
+
+
+def migrate_from_json(path: Optional[Path] = None) -> int:
+    """
+    Однократно перенести JSON-состояние (снапшот + журнал) в SQLite.
+    Если база уже существует, ничего не делает. Возвращает число перенесённых операций.
+    """
+    if (path or DB_PATH).exists():
+        return 0
+    vault = Vault()
+    uploaded_files, has_state = storage.load_state(vault)
+    if not has_state:
+        return 0
+    save_state(vault, uploaded_files, path)
+    return len(vault.operations)
@@ -0,0 +1,189 @@
+"""
+Метрики стадий категоризации: сколько операций дошло до стадии, сколько из
+них она категоризовала и гистограмма задержки на операцию (p50/p95/p99).
+
+Пайплайн копит замеры пачки в StageBatch без блокировок и сливает их в
+StageMetrics одним commit. Пакетные стадии (predict_many ML и LLM) дают одну
+длительность на всю пачку — в гистограмму она идёт как средняя на операцию с
+весом, равным размеру пачки.
+"""
+
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from functools import partial
+from typing import DefaultDict, Dict, List, Optional, Tuple
+
+
+# порядок стадий в пайплайне
+STAGES = ("rules", "mapping", "decision_cache", "ml_model", "ml_stub", "llm", "fallback")
+
+# верхние границы корзин: от 0.5 мкс с шагом x1.25 до ~2.5 минут
+BUCKET_BOUNDS: Tuple[float, ...] = tuple(0.5e-6 * 1.25**k for k in range(90))
+
+_bucket_of = partial(bisect_left, BUCKET_BOUNDS)
+
+
+@dataclass
+class StageStatus:
+    calls: int
+    hits: int
+    hit_rate: Optional[float]
+    total_ms: float
+    p50_ms: Optional[float]
+    p95_ms: Optional[float]
+    p99_ms: Optional[float]
+    max_ms: Optional[float]
+
+
+class LatencyHistogram:
+    """Логарифмическая гистограмма; перцентиль — верхняя граница корзины, не больше максимума."""
+
+    def __init__(self) -> None:
+        self.counts: List[int] = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float, weight: int = 1) -> None:
+        self.counts[_bucket_of(seconds)] += weight
+        self.count += weight
+        self.total += seconds * weight
+        if seconds > self.max:
+            self.max = seconds
+
+    def add_many(self, latencies: List[float]) -> None:
+        if not latencies:
+            return
+        for index, count in Counter(map(_bucket_of, latencies)).items():
+            self.counts[index] += count
+        self.count += len(latencies)
+        self.total += sum(latencies)
+        self.max = max(self.max, max(latencies))
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return min(BUCKET_BOUNDS[index], self.max) if index < len(BUCKET_BOUNDS) else self.max
+        return self.max
+
+    def merge(self, counts: List[int], total: float, max_seconds: float) -> None:
+        for index, count in enumerate(counts):
+            self.counts[index] += count
+        self.count += sum(counts)
+        self.total += total
+        self.max = max(self.max, max_seconds)
+
+
+class _Stage:
+    def __init__(self) -> None:
+        self.calls = 0
+        self.hits = 0
+        self.latency = LatencyHistogram()
+
+    def status(self) -> StageStatus:
+        latency = self.latency
+
+        def ms(seconds: Optional[float]) -> Optional[float]:
+            return round(seconds * 1000, 4) if seconds is not None else None
+
+        return StageStatus(
+            calls=self.calls,
+            hits=self.hits,
+            hit_rate=self.hits / self.calls if self.calls else None,
+            total_ms=round(latency.total * 1000, 3),
+            p50_ms=ms(latency.percentile(0.50)),
+            p95_ms=ms(latency.percentile(0.95)),
+            p99_ms=ms(latency.percentile(0.99)),
+            max_ms=ms(latency.max if latency.count else None),
+        )
+
+
+class StageBatch:
+    """Замеры одной пачки; не потокобезопасен, живёт внутри одного вызова пайплайна."""
+
+    def __init__(self) -> None:
+        self.operations = 0
+        self.latencies: DefaultDict[str, List[float]] = defaultdict(list)
+        self.hits: DefaultDict[str, int] = defaultdict(int)
+        # пакетные вызовы: стадия -> [(длительность, операций)]
+        self.bulk: DefaultDict[str, List[Tuple[float, int]]] = defaultdict(list)
+
+    def add(self, stage: str, seconds: float, hit: bool) -> None:
+        self.latencies[stage].append(seconds)
+        if hit:
+            self.hits[stage] += 1
+
+    def add_bulk(self, stage: str, seconds: float, calls: int, hits: int) -> None:
+        """Один пакетный вызов на calls операций."""
+        if not calls:
+            return
+        self.bulk[stage].append((seconds, calls))
+        self.hits[stage] += hits
+
+
+class StageMetrics:
+    def __init__(self) -> None:
+        self.operations = 0
+        self._stages: Dict[str, _Stage] = {stage: _Stage() for stage in STAGES}
+        self._lock = threading.Lock()
+
+    def commit(self, batch: StageBatch) -> None:
+        with self._lock:
+            self.operations += batch.operations
+            for name, latencies in batch.latencies.items():
+                stage = self._stage(name)
+                stage.calls += len(latencies)
+                stage.latency.add_many(latencies)
+            for name, bulk in batch.bulk.items():
+                stage = self._stage(name)
+                for seconds, calls in bulk:
+                    stage.calls += calls
+                    stage.latency.add(seconds / calls, calls)
+            for name, hits in batch.hits.items():
+                self._stage(name).hits += hits
+
+    def _stage(self, name: str) -> _Stage:
+        stage = self._stages.get(name)
+        if stage is None:
+            stage = self._stages[name] = _Stage()
+        return stage
+
+    def status(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "operations": self.operations,
+                "stages": {name: stage.status() for name, stage in self._stages.items()},
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self.operations = 0
+            self._stages = {stage: _Stage() for stage in STAGES}
+
+    def export(self) -> dict:
+        """Сырые счётчики и корзины — чтобы слить метрики процесса пула в основной."""
+        with self._lock:
+            return {
+                "operations": self.operations,
+                "stages": {
+                    name: [stage.calls, stage.hits, list(stage.latency.counts), stage.latency.total, stage.latency.max]
+                    for name, stage in self._stages.items()
+                    if stage.calls
+                },
+            }
+
+    def merge(self, data: dict) -> None:
+        with self._lock:
+            self.operations += data.get("operations", 0)
+            for name, (calls, hits, counts, total, max_seconds) in data.get("stages", {}).items():
+                stage = self._stage(name)
+                stage.calls += calls
+                stage.hits += hits
+                stage.latency.merge(counts, total, max_seconds)
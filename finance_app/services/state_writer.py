@@ -0,0 +1,152 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class StateWriter:
+    """
+    Фоновый поток сохранения состояния. Мутации вызывают schedule(), поток ждёт
+    паузы в delay секунд (но не дольше max_delay с первой мутации) и делает одну
+    запись на всю пачку. flush() — барьер: возвращается, когда всё
+    запланированное записано.
+
+    Неудачная запись сразу пишется в лог и остаётся незаписанной: поток
+    повторяет её с паузой от retry_delay, удваивая до max_retry_delay. Ошибка
+    видна в status() до следующей удачной записи, а flush() повторяет запись
+    сразу и поднимает ошибку, если повтор тоже не удался.
+    """
+
+    def __init__(
+        self,
+        save: Callable[[], None],
+        delay: float = 1.0,
+        max_delay: float = 10.0,
+        retry_delay: float = 1.0,
+        max_retry_delay: float = 60.0,
+    ) -> None:
+        self._save = save
+        self.delay = delay
+        self.max_delay = max_delay
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._cond = threading.Condition()
+        self._scheduled = 0
+        self._written = 0
+        self._first_pending_at: Optional[float] = None
+        self._last_scheduled_at = 0.0
+        self._flush_requested = False
+        self._stopped = False
+        self.writes = 0
+        self.failures = 0
+        # ошибка последней записи (None после удачной) и неудачных попыток подряд
+        self._failing: Optional[BaseException] = None
+        self._failed_at: Optional[float] = None
+        self._failed_in_row = 0
+        self._retry_at = 0.0
+        self._succeeded_at: Optional[float] = None
+        self._thread = threading.Thread(target=self._run, name="state-writer", daemon=True)
+        self._thread.start()
+
+    def schedule(self) -> None:
+        with self._cond:
+            now = time.monotonic()
+            if self._scheduled == self._written:
+                self._first_pending_at = now
+            self._scheduled += 1
+            self._last_scheduled_at = now
+            self._cond.notify_all()
+
+    def pending(self) -> bool:
+        with self._cond:
+            return self._scheduled != self._written
+
+    def status(self) -> Dict[str, object]:
+        with self._cond:
+            return {
+                "pending": self._scheduled != self._written,
+                "writes": self.writes,
+                "failures": self.failures,
+                "last_success_at": self._succeeded_at,
+                "error": str(self._failing) if self._failing is not None else None,
+                "error_at": self._failed_at,
+            }
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Записать всё запланированное прямо сейчас и дождаться записи; ошибка записи поднимается."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            target = self._scheduled
+            if self._written >= target:
+                return True
+            failures = self.failures
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._written < target:
+                if self.failures > failures and self._failing is not None:
+                    raise self._failing
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def close(self) -> None:
+        try:
+            self.flush()
+        except Exception:
+            # последняя попытка при остановке: ошибка уже в логе, состояние осталось pending
+            pass
+        finally:
+            with self._cond:
+                self._stopped = True
+                self._cond.notify_all()
+            self._thread.join()
+
+    def _due_in(self) -> float:
+        now = time.monotonic()
+        quiet_until = self._last_scheduled_at + self.delay
+        hard_until = (self._first_pending_at or now) + self.max_delay
+        # после неудачной записи ждём паузу повтора, даже если мутаций больше нет
+        return max(min(quiet_until, hard_until), self._retry_at) - now
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._stopped and self._scheduled == self._written:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                while not self._flush_requested and not self._stopped:
+                    wait = self._due_in()
+                    if wait <= 0:
+                        break
+                    self._cond.wait(wait)
+                target = self._scheduled
+                self._flush_requested = False
+            error: Optional[BaseException] = None
+            try:
+                self._save()
+            except Exception as exc:
+                logger.exception("background state write failed")
+                error = exc
+            with self._cond:
+                if error is None:
+                    self._written = target
+                    self.writes += 1
+                    self._failing = None
+                    self._failed_in_row = 0
+                    self._retry_at = 0.0
+                    self._succeeded_at = time.time()
+                else:
+                    # _written не двигаем: состояние не на диске, запись повторится
+                    self.failures += 1
+                    self._failing = error
+                    self._failed_at = time.time()
+                    self._failed_in_row += 1
+                    backoff = min(self.retry_delay * 2 ** (self._failed_in_row - 1), self.max_retry_delay)
+                    self._retry_at = time.monotonic() + backoff
+                self._cond.notify_all()
@@ -1,15 +1,27 @@
 import json
+import os
+import threading
 from datetime import datetime
 from decimal import Decimal
 from pathlib import Path
-from typing import List, Tuple
+from typing import Iterable, List, Optional, Tuple
 from uuid import uuid4
 
 from finance_app.domain import Account, Operation, OperationType, Vault
+from finance_app.utils import NORMALIZATION_VERSION, normalize_operation, renormalize_stale
 
 
 STATE_PATH = Path("data") / "vault_state.json"
 PASS_PATH = Path("data") / "auth.json"
+JOURNAL_PATH = Path("data") / "vault_journal.jsonl"
+
+# после стольких записей в журнале запускаем фоновое сжатие в снапшот
+JOURNAL_COMPACT_THRESHOLD = 50_000
+
+_journal_lock = threading.Lock()
+_snapshot_lock = threading.Lock()
+_journal_records = 0
+_compaction_thread: Optional[threading.Thread] = None
 
 
 def ensure_state_dir() -> None:
@@ -17,6 +29,7 @@ def ensure_state_dir() -> None:
 
 
 def serialize_operation(op: Operation) -> dict:
+    normalize_operation(op)
     return {
         "id": op.id,
         "account_id": op.account_id,
@@ -32,6 +45,9 @@ def serialize_operation(op: Operation) -> dict:
         "category_id": op.category_id,
         "categorization_source": op.categorization_source,
         "source_file_id": op.source_file_id,
+        "text_norm": op.text_norm,
+        "merchant_norm": op.merchant_norm,
+        "bank_category_norm": op.bank_category_norm,
     }
 
 
@@ -51,6 +67,9 @@ def deserialize_operation(data: dict) -> Operation:
         category_id=data.get("category_id"),
         categorization_source=data.get("categorization_source"),
         source_file_id=data.get("source_file_id"),
+        text_norm=data.get("text_norm"),
+        merchant_norm=data.get("merchant_norm"),
+        bank_category_norm=data.get("bank_category_norm"),
     )
 
 
@@ -65,29 +84,233 @@ def deserialize_account(data: dict) -> Account:
     )
 
 
-def save_state(vault: Vault, uploaded_files: List[dict]) -> None:
-    ensure_state_dir()
-    data = {
+def _rotated_journal_path() -> Path:
+    return JOURNAL_PATH.with_name(JOURNAL_PATH.name + ".compacting")
+
+
+def _state_payload(accounts: dict, operations: List[Operation], uploaded_files: List[dict]) -> dict:
+    return {
+        "normalization_version": NORMALIZATION_VERSION,
         "uploaded_files": uploaded_files,
-        "accounts": {k: vars(v) for k, v in vault.accounts.items()},
-        "operations": [serialize_operation(op) for op in vault.operations],
+        "accounts": {k: vars(v) for k, v in accounts.items()},
+        "operations": [serialize_operation(op) for op in operations],
     }
-    STATE_PATH.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def export_state(vault: Vault, uploaded_files: List[dict]) -> dict:
+    """JSON-представление состояния (формат vault_state.json) для выгрузки."""
+    return _state_payload(vault.accounts, vault.operations, uploaded_files)
+
+
+def _write_snapshot(accounts: dict, operations: List[Operation], uploaded_files: List[dict]) -> None:
+    ensure_state_dir()
+    data = _state_payload(accounts, operations, uploaded_files)
+    # пишем во временный файл и подменяем, чтобы падение не оставило обрезанный снапшот
+    tmp_path = STATE_PATH.with_name(f"{STATE_PATH.name}.{threading.get_ident()}.tmp")
+    with tmp_path.open("w", encoding="utf-8") as fp:
+        json.dump(data, fp, ensure_ascii=False)
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.replace(tmp_path, STATE_PATH)
+
+
+def save_state(vault: Vault, uploaded_files: List[dict]) -> None:
+    global _journal_records
+    with _snapshot_lock, _journal_lock:
+        _write_snapshot(vault.accounts, vault.operations, uploaded_files)
+        # снапшот содержит всё состояние, журнал больше не нужен
+        for path in (JOURNAL_PATH, _rotated_journal_path()):
+            if path.exists():
+                path.unlink()
+        _journal_records = 0
 
 
 def load_state(vault: Vault) -> Tuple[List[dict], bool]:
-    if not STATE_PATH.exists():
+    has_snapshot = STATE_PATH.exists()
+    journals = [path for path in (_rotated_journal_path(), JOURNAL_PATH) if path.exists()]
+    if not has_snapshot and not journals:
         return [], False
-    content = json.loads(STATE_PATH.read_text(encoding="utf-8"))
-    uploaded_files = content.get("uploaded_files") or []
-    accounts_raw = content.get("accounts") or {}
-    vault.accounts = {acc_id: deserialize_account(acc_data) for acc_id, acc_data in accounts_raw.items()}
-    vault.operations.clear()
-    for op_data in content.get("operations", []):
-        vault.operations.append(deserialize_operation(op_data))
+    uploaded_files: List[dict] = []
+    vault.accounts = {}
+    vault.replace_operations([])
+    if has_snapshot:
+        content = json.loads(STATE_PATH.read_text(encoding="utf-8"))
+        uploaded_files = content.get("uploaded_files") or []
+        accounts_raw = content.get("accounts") or {}
+        vault.accounts = {acc_id: deserialize_account(acc_data) for acc_id, acc_data in accounts_raw.items()}
+        operations = [deserialize_operation(op_data) for op_data in content.get("operations", [])]
+        renormalize_stale(operations, content.get("normalization_version"))
+        vault.replace_operations(operations)
+    for path in journals:
+        replay_journal(vault, uploaded_files, path)
     return uploaded_files, True
 
 
+# --- журнал операций ---------------------------------------------------------
+#
+# Вместо перезаписи всего vault_state.json каждая мутация дописывает в
+# vault_journal.jsonl по одной JSON-строке на событие:
+#   {"event": "account", "account": {...}}
+#   {"event": "add", "op": {...}, "normalization_version": ...}
+#   {"event": "recategorize", "id": ..., "category_id": ..., "categorization_source": ...}
+#   {"event": "file_add", "file": {...}}
+#   {"event": "file_delete", "file_id": ...}
+# При загрузке журнал проигрывается поверх снапшота. Повторное применение
+# события ничего не ломает, поэтому падение посреди сжатия безопасно.
+
+
+def append_journal(records: Iterable[dict]) -> int:
+    global _journal_records
+    lines = [json.dumps(record, ensure_ascii=False) + "\n" for record in records]
+    if not lines:
+        return 0
+    with _journal_lock:
+        ensure_state_dir()
+        with JOURNAL_PATH.open("a", encoding="utf-8") as fp:
+            fp.writelines(lines)
+            fp.flush()
+            os.fsync(fp.fileno())
+        _journal_records += len(lines)
+    return len(lines)
+
+
+def journal_add_operations(vault: Vault, operations: List[Operation], uploaded_file: Optional[dict] = None) -> int:
+    records: List[dict] = []
+    account_ids = {op.account_id for op in operations}
+    for acc_id in sorted(account_ids):
+        account = vault.accounts.get(acc_id)
+        if account:
+            records.append({"event": "account", "account": vars(account)})
+    records.extend(
+        {"event": "add", "op": serialize_operation(op), "normalization_version": NORMALIZATION_VERSION}
+        for op in operations
+    )
+    # запись о файле идёт последней: файл появляется в списке только после всех его операций
+    if uploaded_file is not None:
+        records.append({"event": "file_add", "file": uploaded_file})
+    return append_journal(records)
+
+
+def journal_recategorize(operations: Iterable[Operation]) -> int:
+    return append_journal(
+        {
+            "event": "recategorize",
+            "id": op.id,
+            "category_id": op.category_id,
+            "categorization_source": op.categorization_source,
+        }
+        for op in operations
+    )
+
+
+def journal_delete_file(file_id: str) -> int:
+    return append_journal([{"event": "file_delete", "file_id": file_id}])
+
+
+def replay_journal(vault: Vault, uploaded_files: List[dict], path: Optional[Path] = None) -> int:
+    """
+    Применить события журнала к vault и списку файлов. Возвращает число применённых записей.
+    Недописанная последняя строка (падение во время записи) пропускается.
+    """
+    global _journal_records
+    path = path or JOURNAL_PATH
+    if not path.exists():
+        return 0
+    known_ids = {op.id for op in vault.operations}
+    by_id = {op.id: op for op in vault.operations}
+    applied = 0
+    good_offset = 0
+    torn = False
+    with path.open("rb") as fp:
+        for line in fp:
+            try:
+                if not line.endswith(b"\n"):
+                    raise ValueError("torn record")
+                record = json.loads(line.decode("utf-8"))
+            except ValueError:
+                torn = True
+                break
+            good_offset += len(line)
+            event = record.get("event")
+            if event == "account":
+                account = deserialize_account(record.get("account") or {})
+                vault.accounts[account.id] = account
+            elif event == "add":
+                op = deserialize_operation(record["op"])
+                renormalize_stale([op], record.get("normalization_version"))
+                if op.id not in known_ids:
+                    vault.add_operation(op)
+                    known_ids.add(op.id)
+                    by_id[op.id] = op
+            elif event == "recategorize":
+                op = by_id.get(record.get("id"))
+                if op is not None:
+                    op.category_id = record.get("category_id")
+                    op.categorization_source = record.get("categorization_source")
+                    vault.recategorized([op])
+            elif event == "file_add":
+                meta = record.get("file") or {}
+                if all(f.get("id") != meta.get("id") for f in uploaded_files):
+                    uploaded_files.append(meta)
+            elif event == "file_delete":
+                file_id = record.get("file_id")
+                uploaded_files[:] = [f for f in uploaded_files if f.get("id") != file_id]
+                vault.remove_file_operations(file_id)
+                known_ids = {op.id for op in vault.operations}
+                by_id = {op.id: op for op in vault.operations}
+            applied += 1
+    if torn:
+        # отрезаем хвост, иначе следующие записи приклеятся к битой строке
+        with path.open("r+b") as fp:
+            fp.truncate(good_offset)
+    _journal_records += applied
+    return applied
+
+
+def compact_journal(vault: Vault, uploaded_files: List[dict]) -> None:
+    """
+    Свернуть журнал в снапшот. Журнал переименовывается, после чего новые
+    записи идут уже в свежий файл; переименованный удаляется только когда
+    снапшот записан.
+    """
+    global _journal_records
+    with _snapshot_lock:
+        with _journal_lock:
+            if not JOURNAL_PATH.exists():
+                return
+            rotated = _rotated_journal_path()
+            if rotated.exists():
+                # предыдущее сжатие не завершилось: склеиваем, чтобы ничего не потерять
+                with rotated.open("a", encoding="utf-8") as dst, JOURNAL_PATH.open(encoding="utf-8") as src:
+                    dst.write(src.read())
+                JOURNAL_PATH.unlink()
+            else:
+                os.replace(JOURNAL_PATH, rotated)
+            _journal_records = 0
+            accounts = dict(vault.accounts)
+            operations = list(vault.operations)
+            files = [dict(f) for f in uploaded_files]
+        # новые записи уже идут в свежий журнал, снапшот пишем без блокировки журнала
+        _write_snapshot(accounts, operations, files)
+        with _journal_lock:
+            if rotated.exists():
+                rotated.unlink()
+
+
+def maybe_compact_journal(vault: Vault, uploaded_files: List[dict]) -> bool:
+    """Запустить сжатие журнала в фоновом потоке, если он перерос порог."""
+    global _compaction_thread
+    if _journal_records < JOURNAL_COMPACT_THRESHOLD:
+        return False
+    if _compaction_thread is not None and _compaction_thread.is_alive():
+        return False
+    _compaction_thread = threading.Thread(
+        target=compact_journal, args=(vault, uploaded_files), name="journal-compaction", daemon=True
+    )
+    _compaction_thread.start()
+    return True
+
+
 def new_file_id() -> str:
     return str(uuid4())
 
@@ -20,6 +20,8 @@ const state = {
   transfersCharts: { methods: null, pairs: null, net: null },
   quickCharts: { balance: null, topCats: null },
   recentOps: [],
+  vault: { epoch: null, version: null },
+  homeStale: true,
   analyticsByTab: {
     expense: { period: { start: "", end: "" }, data: null },
     income: { period: { start: "", end: "" }, data: null },
@@ -176,11 +178,33 @@ function startApp() {
     if (!fileInput.files.length) {
       return showToast("Выберите CSV-файл");
     }
-    const data = new FormData();
-    data.append("bank", bank);
-    data.append("file", fileInput.files[0]);
-    await safeApiFetch("/api/import", { method: "POST", body: data });
-    showToast("Импорт завершён");
+    const files = Array.from(fileInput.files);
+    // несколько файлов или архив — пакетный импорт, банк определит сервер
+    const bulk = files.length > 1 || files[0].name.toLowerCase().endsWith(".zip");
+    let result;
+    if (bulk) {
+      const data = new FormData();
+      files.forEach((f) => data.append("files", f));
+      const res = await safeApiFetch("/api/import/bulk", { method: "POST", body: data });
+      result = await res.json().catch(() => ({}));
+    } else {
+      // один файл отправляем сырым телом; разбор идёт в фоновом задании
+      const params = new URLSearchParams({ bank, name: files[0].name });
+      const res = await safeApiFetch(`/api/import?${params.toString()}`, {
+        method: "POST",
+        headers: { "Content-Type": "text/csv" },
+        body: files[0],
+      });
+      const started = await res.json().catch(() => ({}));
+      if (!res.ok || !started.job_id) {
+        return showToast(started.error || "Не удалось загрузить файл");
+      }
+      result = await waitImportJob(started.job_id);
+      if (result.phase === "failed") {
+        return showToast(`Ошибка импорта: ${result.error || "неизвестная"}`);
+      }
+    }
+    showToast(result.skipped ? `Импорт завершён, пропущено дублей: ${result.skipped}` : "Импорт завершён");
     refresh();
   });
 
@@ -315,31 +339,79 @@ function startApp() {
   refresh();
 }
 
-async function refresh() {
-  const { start, end } = state.analyticsByTab[activeAnalyticsTab].period;
+// Опрашиваем задание импорта до завершения; операции появляются в аналитике по мере готовности чанков.
+async function waitImportJob(jobId) {
+  for (;;) {
+    const job = await apiJson(`/api/import/jobs/${jobId}`);
+    if (job.phase === "done" || job.phase === "failed" || job.error === "not found") return job;
+    const eta = job.eta_seconds !== null && job.eta_seconds !== undefined ? `, осталось ~${Math.ceil(job.eta_seconds)} с` : "";
+    showToast(`Импорт: ${job.rows_parsed} строк${eta}`);
+    refresh();
+    await new Promise((resolve) => setTimeout(resolve, 1000));
+  }
+}
+
+// Спрашиваем у сервера, менялся ли vault с прошлой синхронизации.
+// Аналитика считается на сервере, поэтому сами операции дельты не нужны: только счётчики.
+// true — данные изменились (или версия неизвестна) и их нужно перечитать.
+async function syncVault() {
+  const params = new URLSearchParams({ counts: "true" });
+  if (state.vault.version !== null) params.set("since", String(state.vault.version));
+  if (state.vault.epoch) params.set("epoch", state.vault.epoch);
+  const delta = await apiJson(`/api/changes?${params.toString()}`);
+  const changed = delta.reset || delta.added > 0 || delta.removed > 0 || delta.recategorized > 0;
+  state.vault = { epoch: delta.epoch, version: delta.version };
+  if (changed) {
+    state.homeStale = true;
+    Object.values(state.analyticsByTab).forEach((tab) => {
+      tab.data = null;
+    });
+  }
+  return changed;
+}
+
+function analyticsParams(tab) {
+  const { start, end } = state.analyticsByTab[tab].period;
   const params = new URLSearchParams();
   if (start) params.set("start_date", start);
   if (end) params.set("end_date", end);
-  params.set("exclude_transfers", activeAnalyticsTab === "transfers" ? "false" : "true");
+  params.set("exclude_transfers", tab === "transfers" ? "false" : "true");
+  return params.toString();
+}
 
-  const homePromise = apiJson("/api/analytics?exclude_transfers=true");
-  const tabPromise = apiJson(`/api/analytics?${params.toString()}`);
+async function refresh() {
+  const changed = await syncVault();
+  const tabState = state.analyticsByTab[activeAnalyticsTab];
+  const { start, end } = tabState.period;
+  const params = analyticsParams(activeAnalyticsTab);
+  // vault не менялся и период тот же: аналитика вкладки уже актуальна (опрос задания импорта)
+  if (!changed && tabState.data && tabState.dataParams === params) return;
+
+  // сводку главной страницы перечитываем только после изменений vault
+  const homePromise = state.homeStale ? apiJson("/api/analytics?exclude_transfers=true") : Promise.resolve(null);
+  const tabPromise = apiJson(`/api/analytics?${params}`);
   const [homeAnalytics, analytics] = await Promise.all([homePromise, tabPromise]);
 
-  state.homeAnalytics = homeAnalytics;
-  updateCards();
-  renderHomeSummary();
+  if (homeAnalytics) {
+    state.homeAnalytics = homeAnalytics;
+    state.homeStale = false;
+    updateCards();
+    renderHomeSummary();
+  }
 
-  state.analyticsByTab[activeAnalyticsTab].data = analytics;
+  tabState.data = analytics;
   if ((!start || !end) && analytics.period_all) {
-    state.analyticsByTab[activeAnalyticsTab].period = {
+    tabState.period = {
       start: start || analytics.period_all.start,
       end: end || analytics.period_all.end,
     };
     syncAnalyticsInputs();
   }
+  // пустой период — это весь vault, т.е. то же, что подставленные границы
+  tabState.dataParams = analyticsParams(activeAnalyticsTab);
   state.analytics = analytics;
   renderAnalyticsForTab(activeAnalyticsTab);
+  if (!changed) return;
   await renderFiles();
   await loadOperations();
   await loadRecentOperations();
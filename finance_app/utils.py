@@ -1,20 +1,67 @@
+import multiprocessing
 import re
 from dataclasses import dataclass
+from datetime import date, datetime
 from decimal import Decimal
-from typing import Optional
+from functools import lru_cache
+from typing import Dict, Iterable, Optional
 
 from finance_app.domain import Operation
 
 
+_NON_WORD = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+
+# мерчанты, категории банка и названия банков повторяются из строки в строку
+NORMALIZE_CACHE_SIZE = 65536
+
+# версия normalize_text и признаков normalize_operation: сохраняется вместе с
+# состоянием. Увеличивать при любом изменении их результата — сохранённые
+# признаки с другой версией пересчитываются при загрузке
+NORMALIZATION_VERSION = 1
+
+
+def pool_context() -> multiprocessing.context.BaseContext:
+    """
+    Контекст для пулов процессов. Сервер многопоточный (фоновая запись, задания
+    импорта, потоки BLAS), и fork может оставить в дочернем процессе чужие
+    захваченные блокировки, поэтому процессы стартуют через forkserver (spawn,
+    где его нет).
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
 def normalize_text(value: Optional[str]) -> str:
     if not value:
         return ""
     lowered = value.lower().replace("ё", "е")
-    cleaned = re.sub(r"[^\w\s]", " ", lowered)
-    cleaned = re.sub(r"\s+", " ", cleaned)
+    cleaned = _NON_WORD.sub(" ", lowered)
+    cleaned = _SPACES.sub(" ", cleaned)
     return cleaned.strip()
 
 
+def trie_pattern(words: Iterable[str]) -> str:
+    """Регулярное выражение-бор: общие префиксы слов вынесены, каждая позиция проверяется за один спуск."""
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # слово может закончиться здесь: жадный ? сначала пробует более длинное
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
 def parse_decimal(value: Optional[str]) -> Decimal:
     if value is None:
         return Decimal("0")
@@ -27,6 +74,61 @@ def parse_decimal(value: Optional[str]) -> Decimal:
         return Decimal("0")
 
 
+# Быстрые парсеры для адаптеров: результат тот же, что у strptime/parse_decimal,
+# но без разбора формата на каждой строке. Даты и суммы в выписках сильно
+# повторяются, поэтому разобранные значения запоминаются.
+_MEMO_LIMIT = 65536
+_date_memo: Dict[str, date] = {}
+_amount_memo: Dict[Optional[str], Decimal] = {}
+
+
+def parse_dmy_date(value: str) -> date:
+    """То же, что datetime.strptime(value, "%d.%m.%Y").date()."""
+    parsed = _date_memo.get(value)
+    if parsed is not None:
+        return parsed
+    if len(value) == 10 and value[2] == "." and value[5] == "." and value.isascii():
+        digits = value[0:2] + value[3:5] + value[6:10]
+        if digits.isdigit():
+            # date() сам отвергнет 31.02 и 00.13, как и strptime — ValueError
+            parsed = date(int(value[6:10]), int(value[3:5]), int(value[0:2]))
+    if parsed is None:
+        # нестандартная запись (например, 1.2.2025) — как раньше
+        parsed = datetime.strptime(value, "%d.%m.%Y").date()
+    if len(_date_memo) >= _MEMO_LIMIT:
+        _date_memo.clear()
+    _date_memo[value] = parsed
+    return parsed
+
+
+def parse_dmy_hms_date(value: str) -> date:
+    """То же, что datetime.strptime(value, "%d.%m.%Y %H:%M:%S").date()."""
+    if (
+        len(value) == 19
+        and value[10] == " "
+        and value[13] == ":"
+        and value[16] == ":"
+        and value.isascii()
+        and (value[11:13] + value[14:16] + value[17:19]).isdigit()
+        and int(value[11:13]) < 24
+        and int(value[14:16]) < 60
+        and int(value[17:19]) < 60
+    ):
+        return parse_dmy_date(value[:10])
+    return datetime.strptime(value, "%d.%m.%Y %H:%M:%S").date()
+
+
+def parse_amount(value: Optional[str]) -> Decimal:
+    """То же, что parse_decimal, с памятью уже встречавшихся строк (Decimal неизменяем)."""
+    amount = _amount_memo.get(value)
+    if amount is None:
+        amount = parse_decimal(value)
+        if len(_amount_memo) >= _MEMO_LIMIT:
+            _amount_memo.clear()
+        _amount_memo[value] = amount
+    return amount
+
+
 def build_feature_text(*parts: Optional[str]) -> str:
     return " ".join(p.strip() for p in parts if p and p.strip())
 
@@ -41,16 +143,36 @@ class Features:
     bank: str
 
 
+def normalize_operation(operation: Operation, force: bool = False) -> Operation:
+    """
+    Посчитать нормализованные тексты операции, если их ещё нет (или force). Они
+    хранятся в самой операции и сохраняются вместе с vault, поэтому считаются
+    один раз — при импорте или после смены NORMALIZATION_VERSION.
+    """
+    if force or operation.text_norm is None:
+        operation.bank_category_norm = normalize_text(operation.bank_category)
+        operation.merchant_norm = normalize_text(operation.merchant)
+        operation.text_norm = normalize_text(
+            build_feature_text(operation.description, operation.merchant, operation.bank_category)
+        )
+    return operation
+
+
+def renormalize_stale(operations: Iterable[Operation], version: Optional[int]) -> bool:
+    """Пересчитать признаки, сохранённые другой версией нормализации (None — версия не сохранена)."""
+    if version == NORMALIZATION_VERSION:
+        return False
+    for operation in operations:
+        normalize_operation(operation, force=True)
+    return True
+
+
 def build_features(operation: Operation) -> Features:
-    bank_category_norm = normalize_text(operation.bank_category)
-    merchant_norm = normalize_text(operation.merchant)
-    text = normalize_text(
-        build_feature_text(operation.description, operation.merchant, operation.bank_category)
-    )
+    normalize_operation(operation)
     return Features(
-        text=text,
-        bank_category_norm=bank_category_norm,
-        merchant_norm=merchant_norm,
+        text=operation.text_norm,
+        bank_category_norm=operation.bank_category_norm,
+        merchant_norm=operation.merchant_norm,
         mcc=(operation.mcc or "").strip() or None,
         amount_abs=abs(operation.amount),
         bank=normalize_text(operation.bank),
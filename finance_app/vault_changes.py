@@ -0,0 +1,96 @@
+"""
+Версия vault и журнал изменений для дельта-синхронизации клиентов.
+
+Каждая мутация через методы Vault увеличивает версию и пишет записи
+(added / removed / recategorized) с этой версией. since(version) сворачивает
+записи новее version в одну дельту. Журнал ограничен по длине: если клиент
+отстал сильнее или vault был заменён целиком (reset), он получает
+reset=True и должен перезагрузить данные полностью.
+"""
+
+from collections import deque
+from typing import Deque, Dict, Iterable, Optional, Tuple
+from uuid import uuid4
+
+from finance_app.domain import Operation
+
+
+ADDED = "added"
+REMOVED = "removed"
+RECATEGORIZED = "recategorized"
+
+MAX_ENTRIES = 100_000
+
+
+class ChangeLog:
+    def __init__(self, max_entries: int = MAX_ENTRIES) -> None:
+        # epoch меняется при рестарте процесса: версии разных эпох несравнимы
+        self.epoch = uuid4().hex
+        self.version = 0
+        self.max_entries = max_entries
+        self._entries: Deque[Tuple[int, str, Operation]] = deque()
+        # изменения с версией <= _floor в журнале уже не восстановить
+        self._floor = 0
+
+    def _record(self, kind: str, operations: Iterable[Operation]) -> None:
+        version = self.version + 1
+        recorded = False
+        for op in operations:
+            self._entries.append((version, kind, op))
+            recorded = True
+        if not recorded:
+            return
+        self.version = version
+        while len(self._entries) > self.max_entries:
+            self._floor = self._entries.popleft()[0]
+
+    def added(self, operations: Iterable[Operation]) -> None:
+        self._record(ADDED, operations)
+
+    def removed(self, operations: Iterable[Operation]) -> None:
+        self._record(REMOVED, operations)
+
+    def recategorized(self, operations: Iterable[Operation]) -> None:
+        self._record(RECATEGORIZED, operations)
+
+    def reset(self) -> None:
+        """Vault заменён целиком: дельты до этой версии больше не имеют смысла."""
+        self.version += 1
+        self._entries.clear()
+        self._floor = self.version
+
+    def since(self, version: Optional[int], epoch: Optional[str] = None) -> Dict[str, object]:
+        """
+        Дельта после version: операции, добавленные или перекатегоризованные
+        (последнее состояние), и id удалённых. Добавленная и затем удалённая
+        операция в дельту не попадает.
+        """
+        result: Dict[str, object] = {"epoch": self.epoch, "version": self.version, "reset": False}
+        if version is None or (epoch and epoch != self.epoch) or version > self.version or version < self._floor:
+            result["reset"] = True
+            return result
+        added: Dict[int, Operation] = {}
+        recategorized: Dict[int, Operation] = {}
+        removed: Dict[int, str] = {}
+        # записи идут по возрастанию версии: берём хвост новее version с конца
+        tail = []
+        for entry in reversed(self._entries):
+            if entry[0] <= version:
+                break
+            tail.append(entry)
+        for _, kind, op in reversed(tail):
+            key = id(op)
+            if kind == ADDED:
+                added[key] = op
+                removed.pop(key, None)
+            elif kind == RECATEGORIZED:
+                if key not in added:
+                    recategorized[key] = op
+            elif kind == REMOVED:
+                recategorized.pop(key, None)
+                if added.pop(key, None) is None:
+                    removed[key] = op.id
+        result["added"] = list(added.values())
+        result["recategorized"] = list(recategorized.values())
+        result["removed"] = list(removed.values())
+        return result
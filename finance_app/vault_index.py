@@ -0,0 +1,221 @@
+"""
+Вторичные индексы Vault: по дате (отсортированный список), category_id,
+account_id, source_file_id, нормализованному мерчанту и отпечатку операции,
+плюс обратный индекс признаков категоризации: нормализованная категория банка,
+слова нормализованного текста (в нём и мерчант) и MCC.
+
+Индексы обновляются инкрементально через методы Vault (add_operation,
+remove_file_operations, recategorized, ...). Выборки возвращают операции в
+порядке добавления в vault, как это делал бы полный проход по vault.operations.
+Ключ операции в индексах — сам объект (id(op)), а не op.id: так дубликаты id
+из старых состояний не теряются.
+
+Индекс не потокобезопасен, и чтение тоже его меняет (индекс по дате
+досортировывается при первом запросе), поэтому читать его нужно под тем же
+lock, под которым vault меняется (в app.py — state_lock).
+"""
+
+from bisect import bisect_left, bisect_right
+from datetime import date
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from finance_app.domain import Operation
+from finance_app.fingerprints import Fingerprint, operation_fingerprint
+from finance_app.utils import normalize_operation
+
+
+UNKNOWN_MERCHANT = "unknown_merchant"
+
+_Bucket = Dict[int, Operation]
+
+
+def _date_of(op: Operation) -> date:
+    return op.date
+
+
+class VaultIndex:
+    def __init__(self, operations: Iterable[Operation] = ()) -> None:
+        self._seq: Dict[int, int] = {}
+        self._next_seq = 0
+        # по дате: отсортированная часть + хвост новых операций, сливаются при первом запросе
+        self._by_date: List[Operation] = []
+        self._date_pending: List[Operation] = []
+        self._date_has_removed = False
+        self._by_category: Dict[Optional[str], _Bucket] = {}
+        self._category_of: Dict[int, Optional[str]] = {}
+        self._by_account: Dict[str, _Bucket] = {}
+        self._by_source_file: Dict[Optional[str], _Bucket] = {}
+        self._by_merchant: Dict[str, _Bucket] = {}
+        self._merchant_of: Dict[int, str] = {}
+        self._fingerprints: Dict[Fingerprint, int] = {}
+        self._by_bank_category: Dict[str, _Bucket] = {}
+        self._by_token: Dict[str, _Bucket] = {}
+        self._by_mcc: Dict[str, _Bucket] = {}
+        for op in operations:
+            self.add(op)
+
+    def __len__(self) -> int:
+        return len(self._seq)
+
+    # --- обновление -----------------------------------------------------------
+
+    def add(self, op: Operation) -> None:
+        key = id(op)
+        self._seq[key] = self._next_seq
+        self._next_seq += 1
+        self._date_pending.append(op)
+        self._category_of[key] = op.category_id
+        self._by_category.setdefault(op.category_id, {})[key] = op
+        self._by_account.setdefault(op.account_id, {})[key] = op
+        self._by_source_file.setdefault(op.source_file_id, {})[key] = op
+        merchant = normalize_operation(op).merchant_norm or UNKNOWN_MERCHANT
+        self._merchant_of[key] = merchant
+        self._by_merchant.setdefault(merchant, {})[key] = op
+        fingerprint = operation_fingerprint(op)
+        self._fingerprints[fingerprint] = self._fingerprints.get(fingerprint, 0) + 1
+        # признаки берутся из сохранённой нормализации и не меняются, пока операция в vault
+        self._by_bank_category.setdefault(op.bank_category_norm, {})[key] = op
+        for token in set(op.text_norm.split()):
+            self._by_token.setdefault(token, {})[key] = op
+        if op.mcc:
+            self._by_mcc.setdefault(op.mcc, {})[key] = op
+
+    def remove(self, operations: Iterable[Operation]) -> None:
+        for op in operations:
+            key = id(op)
+            if self._seq.pop(key, None) is None:
+                continue
+            _discard(self._by_category, self._category_of.pop(key, op.category_id), key)
+            _discard(self._by_account, op.account_id, key)
+            _discard(self._by_source_file, op.source_file_id, key)
+            _discard(self._by_merchant, self._merchant_of.pop(key, UNKNOWN_MERCHANT), key)
+            _discard(self._by_bank_category, op.bank_category_norm, key)
+            for token in set(op.text_norm.split()):
+                _discard(self._by_token, token, key)
+            _discard(self._by_mcc, op.mcc, key)
+            self._date_has_removed = True
+            fingerprint = operation_fingerprint(op)
+            left = self._fingerprints.get(fingerprint, 0) - 1
+            if left > 0:
+                self._fingerprints[fingerprint] = left
+            else:
+                self._fingerprints.pop(fingerprint, None)
+
+    def recategorized(self, op: Operation) -> bool:
+        """Перенести операцию в корзину новой категории; False, если категория не менялась."""
+        key = id(op)
+        if key not in self._seq:
+            return False
+        previous = self._category_of.get(key)
+        if previous == op.category_id:
+            return False
+        _discard(self._by_category, previous, key)
+        self._category_of[key] = op.category_id
+        self._by_category.setdefault(op.category_id, {})[key] = op
+        return True
+
+    # --- выборки --------------------------------------------------------------
+
+    def _in_vault_order(self, operations: Iterable[Operation]) -> List[Operation]:
+        return sorted(operations, key=lambda op: self._seq[id(op)])
+
+    def _date_sorted(self) -> List[Operation]:
+        if self._date_has_removed:
+            self._by_date = [op for op in self._by_date if id(op) in self._seq]
+            self._date_pending = [op for op in self._date_pending if id(op) in self._seq]
+            self._date_has_removed = False
+        if self._date_pending:
+            # timsort сливает уже отсортированную часть с хвостом почти за линию
+            self._by_date.extend(self._date_pending)
+            self._date_pending = []
+            self._by_date.sort(key=lambda op: (op.date, self._seq[id(op)]))
+        return self._by_date
+
+    def _date_slice(self, start: Optional[date], end: Optional[date]) -> List[Operation]:
+        ordered = self._date_sorted()
+        lo = bisect_left(ordered, start, key=_date_of) if start else 0
+        hi = bisect_right(ordered, end, key=_date_of) if end else len(ordered)
+        return ordered[lo:hi]
+
+    def between(self, start: Optional[date] = None, end: Optional[date] = None) -> List[Operation]:
+        """Операции с start <= date <= end в порядке vault."""
+        return self._in_vault_order(self._date_slice(start, end))
+
+    def newest_first(self, start: Optional[date] = None, end: Optional[date] = None) -> Iterator[Operation]:
+        """
+        Операции по убыванию даты; внутри одного дня — в порядке vault,
+        как sorted(..., key=date, reverse=True). Ленивый: можно остановиться на limit.
+        """
+        window = self._date_slice(start, end)
+        hi = len(window)
+        while hi > 0:
+            lo = bisect_left(window, window[hi - 1].date, 0, hi, key=_date_of)
+            yield from window[lo:hi]
+            hi = lo
+
+    def by_category(self, category_id: Optional[str]) -> List[Operation]:
+        return self._in_vault_order(self._by_category.get(category_id, {}).values())
+
+    def in_categories(self, category_ids: Iterable[Optional[str]]) -> List[Operation]:
+        ops: List[Operation] = []
+        for category_id in category_ids:
+            ops.extend(self._by_category.get(category_id, {}).values())
+        return self._in_vault_order(ops)
+
+    def by_account(self, account_id: str) -> List[Operation]:
+        return self._in_vault_order(self._by_account.get(account_id, {}).values())
+
+    def by_source_file(self, file_id: Optional[str]) -> List[Operation]:
+        return self._in_vault_order(self._by_source_file.get(file_id, {}).values())
+
+    def by_merchant(self, merchant_norm: str) -> List[Operation]:
+        return self._in_vault_order(self._by_merchant.get(merchant_norm, {}).values())
+
+    def fingerprint_count(self, fingerprint: Fingerprint) -> int:
+        """Сколько операций vault с таким отпечатком (см. finance_app.fingerprints)."""
+        return self._fingerprints.get(fingerprint, 0)
+
+    def with_features(
+        self,
+        bank_categories: Iterable[str] = (),
+        keywords: Iterable[str] = (),
+        mccs: Iterable[str] = (),
+    ) -> List[Operation]:
+        """
+        Операции, у которых совпадает хоть один признак: категория банка, MCC или
+        ключевое слово правил — подстрока нормализованного текста. Для слова
+        ключа ищутся слова словаря, которые его содержат; результат — надмножество
+        точных совпадений, для многословных ключей операция должна содержать все слова.
+        """
+        found: Dict[int, Operation] = {}
+        for bank_category in bank_categories:
+            found.update(self._by_bank_category.get(bank_category, {}))
+        for mcc in mccs:
+            found.update(self._by_mcc.get(mcc, {}))
+        for keyword in keywords:
+            matched: Optional[Dict[int, Operation]] = None
+            for word in keyword.split():
+                with_word: Dict[int, Operation] = {}
+                for token, bucket in self._by_token.items():
+                    if word in token:
+                        with_word.update(bucket)
+                matched = with_word if matched is None else {key: op for key, op in matched.items() if key in with_word}
+                if not matched:
+                    break
+            found.update(matched or {})
+        return self._in_vault_order(found.values())
+
+    def merchant_norm(self, op: Operation) -> str:
+        merchant = self._merchant_of.get(id(op))
+        if merchant is None:
+            merchant = normalize_operation(op).merchant_norm or UNKNOWN_MERCHANT
+        return merchant
+
+
+def _discard(buckets: Dict, bucket_key, op_key: int) -> None:
+    bucket = buckets.get(bucket_key)
+    if bucket is None:
+        return
+    bucket.pop(op_key, None)
+    if not bucket:
+        del buckets[bucket_key]
@@ -0,0 +1,129 @@
+import zipfile
+from dataclasses import replace
+from itertools import count
+
+import pytest
+
+from finance_app.domain import Vault
+from finance_app.services import bulk_import
+
+
+class DummyPipeline:
+    def __init__(self):
+        self.calls = 0
+
+    def categorize(self, operation):
+        self.calls += 1
+        operation.category_id = "base_dummy"
+        operation.categorization_source = "dummy"
+        return operation.category_id
+
+    def categorize_many(self, operations):
+        return [self.categorize(op) for op in operations]
+
+
+ALFA_HEADER = "\ufeffoperationDate,accountName,accountNumber,type,amount,currency,comment,merchant,mcc,category"
+TINKOFF_HEADER = "Дата операции;Сумма операции;Валюта операции;Описание;Категория;MCC;Номер карты"
+
+
+def test_bulk_import_detects_banks_in_zip_and_dedups_across_files(tmp_path):
+    archive = tmp_path / "statements.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("2025-11/alfa.csv", "\n".join([ALFA_HEADER, "01.11.2025,Main,1,expense,100,RUB,Coffee,Cafe,5814,Food"]))
+        # декабрьская выписка пересекается с ноябрьской по первой строке
+        zf.writestr(
+            "2025-12/alfa.csv",
+            "\n".join(
+                [
+                    ALFA_HEADER,
+                    "01.11.2025,Main,1,expense,100,RUB,Coffee,Cafe,5814,Food",
+                    "01.12.2025,Main,1,expense,90,RUB,Bus,Metro,4111,Transport",
+                ]
+            ),
+        )
+        zf.writestr("tinkoff.csv", "\n".join([TINKOFF_HEADER, "02.12.2025 10:00:00;-150;RUB;Taxi;Transport;4121;5555"]))
+        zf.writestr("readme.txt", "not a statement")
+
+    vault = Vault()
+    pipeline = DummyPipeline()
+    ids = count(1)
+    files = bulk_import.expand_uploads([("statements.zip", str(archive))], str(tmp_path))
+    results = bulk_import.import_statements(vault, pipeline, files, lambda: f"file-{next(ids)}")
+
+    assert [(r["name"], r.get("bank"), r.get("count"), r.get("skipped")) for r in results] == [
+        ("alfa.csv", "alfa", 1, 0),
+        ("alfa.csv", "alfa", 1, 1),
+        ("tinkoff.csv", "tinkoff", 1, 0),
+        ("readme.txt", None, None, None),
+    ]
+    assert results[-1]["error"] == "unknown_format"
+    assert pipeline.calls == 3
+    assert [op.source_file_id for op in vault.operations] == ["file-1", "file-2", "file-3"]
+    assert all(op.category_id == "base_dummy" for op in vault.operations)
+
+
+def test_archive_over_the_size_limit_is_rejected_before_extraction(tmp_path, monkeypatch):
+    archive = tmp_path / "bomb.zip"
+    with zipfile.ZipFile(archive, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("alfa.csv", ALFA_HEADER + "\n" + "0" * 10_000)
+    monkeypatch.setattr(bulk_import, "MAX_ARCHIVE_BYTES", 5_000)
+
+    with pytest.raises(bulk_import.ArchiveTooLarge):
+        bulk_import.expand_uploads([("bomb.zip", str(archive))], str(tmp_path))
+    assert not list(tmp_path.glob("member-*"))
+
+
+def test_archive_with_too_many_files_is_rejected(tmp_path, monkeypatch):
+    archive = tmp_path / "many.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        for i in range(3):
+            zf.writestr(f"{i}.csv", ALFA_HEADER)
+    monkeypatch.setattr(bulk_import, "MAX_ARCHIVE_MEMBERS", 2)
+
+    # лишние файлы не отбрасываются молча: весь архив отклоняется
+    with pytest.raises(bulk_import.ArchiveTooLarge):
+        bulk_import.expand_uploads([("many.zip", str(archive))], str(tmp_path))
+
+
+def test_statements_are_parsed_in_worker_processes(tmp_path):
+    files = []
+    for day in (1, 2):
+        path = tmp_path / f"alfa-{day}.csv"
+        path.write_text(f"{ALFA_HEADER}\n0{day}.11.2025,Main,1,expense,100,RUB,Coffee,Cafe,5814,Food", encoding="utf-8")
+        files.append((path.name, str(path)))
+    ids = count(1)
+
+    vault = Vault()
+    results = bulk_import.import_statements(vault, DummyPipeline(), files, lambda: f"file-{next(ids)}", workers=2)
+    assert [r["count"] for r in results] == [1, 1]
+    assert len(vault.operations) == 2
+
+
+def test_rows_imported_concurrently_during_categorization_are_skipped(tmp_path):
+    statement = tmp_path / "alfa.csv"
+    statement.write_text(
+        "\n".join(
+            [
+                ALFA_HEADER,
+                "01.11.2025,Main,1,expense,100,RUB,Coffee,Cafe,5814,Food",
+                "01.12.2025,Main,1,expense,90,RUB,Bus,Metro,4111,Transport",
+            ]
+        ),
+        encoding="utf-8",
+    )
+    vault = Vault()
+    committed = []
+
+    class ConcurrentImport(DummyPipeline):
+        def categorize_many(self, operations):
+            # пока пачка категоризуется без lock, другой импорт добавляет ту же строку
+            vault.add_operation(replace(operations[0], id="other", source_file_id="other-file"))
+            return super().categorize_many(operations)
+
+    results = bulk_import.import_statements(
+        vault, ConcurrentImport(), [("alfa.csv", str(statement))], lambda: "file-1", commit=committed.append
+    )
+
+    assert (results[0]["count"], results[0]["skipped"]) == (1, 1)
+    assert [op.description for op in vault.index.by_source_file("file-1")] == ["Bus"]
+    assert committed == [results]
@@ -109,3 +109,65 @@ def test_fallback_stub_when_nothing_matches(make_operation):
     category = pipeline.categorize(op)
     assert category == "base_unknown"
     assert op.categorization_source == "fallback_stub"
+
+
+class BatchMLModel(DummyMLModel):
+    def __init__(self, predictions):
+        super().__init__(prediction=None)
+        self.predictions = predictions
+        self.batches = []
+
+    def predict_many(self, operations):
+        self.batches.append(len(operations))
+        return [self.predictions.get(op.id) for op in operations]
+
+
+class BatchLLM(DummyLLM):
+    def __init__(self, prediction):
+        super().__init__(prediction=prediction)
+        self.batches = []
+
+    def predict_many(self, operations):
+        self.batches.append([op.id for op in operations])
+        return [self.prediction for _ in operations]
+
+
+def test_categorize_many_batches_model_stages(make_operation):
+    salary = make_operation(op_id="salary", description="Salary payment", op_type=OperationType.INCOME, amount=Decimal("1000"))
+    ml_hit = make_operation(op_id="ml", description="Unmapped expense", merchant="Some shop", bank_category="unknown")
+    llm_hit = make_operation(op_id="llm", description="Other expense", merchant="Vendor", bank_category="unknown")
+    ml = BatchMLModel({"ml": "base_food_fastfood"})
+    llm = BatchLLM(prediction="base_travel_other")
+    pipeline = CategorizationPipeline(ml_model=ml, llm_categorizer=llm)
+
+    result = pipeline.categorize_many([salary, ml_hit, llm_hit])
+
+    assert result == ["base_income_salary", "base_food_fastfood", "base_travel_other"]
+    assert [op.categorization_source for op in (ml_hit, llm_hit)] == ["ml_model", "llm"]
+    assert ml.batches == [2]  # один вызов модели на все строки без правила и маппинга
+    assert llm.batches == [["llm"]]
+    assert ml.calls == 0 and llm.calls == 0
+
+
+def test_parallel_recategorization_matches_serial(tmp_path, make_operation):
+    from finance_app.services.categorization import categorize_parallel
+    from finance_app.services.decision_cache import DecisionCache
+
+    def operations():
+        rows = [("Salary payment", None, None), ("Coffee", "Coffee Bar", "Кофейни"), ("Unknown expense", "Vendor", "")]
+        return [
+            make_operation(op_id=f"op-{n}", description=rows[n % 3][0], merchant=rows[n % 3][1], bank_category=rows[n % 3][2])
+            for n in range(9)
+        ]
+
+    serial_ops, parallel_ops = operations(), operations()
+    serial = CategorizationPipeline()
+    serial.categorize_many(serial_ops)
+    pipeline = CategorizationPipeline(decision_cache=DecisionCache(tmp_path / "decisions.json"))
+    categorize_parallel(parallel_ops, pipeline, workers=2)
+
+    assert [(op.category_id, op.categorization_source) for op in parallel_ops] == [
+        (op.category_id, op.categorization_source) for op in serial_ops
+    ]
+    assert pipeline.unmapped_counter == serial.unmapped_counter
+    assert len(pipeline.decision_cache) == 1  # решение заглушки по "coffee bar" вернулось из процесса
@@ -0,0 +1,50 @@
+from datetime import date
+from decimal import Decimal
+
+from finance_app.domain import Account, OperationType, Vault
+from finance_app.services import columnar_snapshot, storage
+
+
+def test_columnar_snapshot_roundtrip(tmp_path, make_operation):
+    path = tmp_path / "vault_state.bin"
+    vault = Vault()
+    vault.accounts["acc-1"] = Account(id="acc-1", bank="alfa", name="Primary", number=None)
+    vault.add_operation(
+        make_operation(
+            op_id="c-1",
+            account_id="acc-1",
+            dt=date(2025, 3, 1),
+            amount=Decimal("-123.456"),
+            merchant="Кофейня",
+            mcc="5814",
+            category_id="base_food_coffee",
+            categorization_source="mapping",
+            source_file_id="file-1",
+        )
+    )
+    vault.add_operation(
+        make_operation(
+            op_id="c-2",
+            account_id="acc-1",
+            dt=date(2025, 3, 2),
+            amount=Decimal("1000"),
+            op_type=OperationType.INCOME,
+            description="Salary",
+        )
+    )
+    files = [{"id": "file-1", "name": "a.csv"}]
+    columnar_snapshot.save_state(vault, files, path)
+
+    restored = Vault()
+    files_loaded, has_state = columnar_snapshot.load_state(restored, path)
+    assert has_state is True
+    assert files_loaded == files
+    assert restored.accounts["acc-1"].name == "Primary"
+    # суммы в минимальных единицах восстанавливаются без потери точности
+    assert [storage.serialize_operation(op) | {"amount": op.amount} for op in restored.operations] == [
+        storage.serialize_operation(op) | {"amount": op.amount} for op in vault.operations
+    ]
+
+
+def test_columnar_snapshot_missing_file(tmp_path):
+    assert columnar_snapshot.load_state(Vault(), tmp_path / "absent.bin") == ([], False)
@@ -0,0 +1,77 @@
+from finance_app import category_mapping
+from finance_app.services.categorization import CategorizationPipeline
+from finance_app.services.decision_cache import DecisionCache
+
+
+class CountingML:
+    def __init__(self, prediction):
+        self.prediction = prediction
+        self.version = "v1"
+        self.seen = []
+
+    def is_ready(self) -> bool:
+        return True
+
+    def predict(self, operation):
+        return self.predict_many([operation])[0]
+
+    def predict_many(self, operations):
+        self.seen.extend(op.id for op in operations)
+        return [self.prediction for _ in operations]
+
+
+def _coffee(make_operation, op_id):
+    return make_operation(op_id=op_id, description=f"Coffee {op_id}", merchant="Coffee Bar", bank_category="Кофейни", mcc="5814")
+
+
+def test_repeated_merchant_skips_model_and_survives_restart(tmp_path, make_operation):
+    path = tmp_path / "decisions.json"
+    ml = CountingML("base_food_coffee")
+    pipeline = CategorizationPipeline(ml_model=ml, decision_cache=DecisionCache(path))
+
+    assert pipeline.categorize_many([_coffee(make_operation, "a"), _coffee(make_operation, "b")]) == ["base_food_coffee"] * 2
+    pipeline.categorize(_coffee(make_operation, "c"))
+    assert ml.seen == ["a", "b"]  # первая пачка ещё не знает решения, дальше — кэш
+    assert (pipeline.decision_cache.hits, pipeline.decision_cache.misses) == (1, 2)
+    pipeline.decision_cache.save()
+
+    restored = DecisionCache(path)
+    assert restored.load()
+    pipeline = CategorizationPipeline(ml_model=ml, decision_cache=restored)
+    op = _coffee(make_operation, "d")
+    assert pipeline.categorize(op) == "base_food_coffee" and op.categorization_source == "ml_model"
+    assert ml.seen == ["a", "b"]
+    assert pipeline.status()["decision_cache"].hits == 1
+
+
+def test_cache_is_reset_when_model_or_mapping_changes(tmp_path, make_operation, monkeypatch):
+    ml = CountingML("base_food_coffee")
+    pipeline = CategorizationPipeline(ml_model=ml, decision_cache=DecisionCache(tmp_path / "decisions.json"))
+    pipeline.categorize(_coffee(make_operation, "a"))
+
+    ml.version, ml.prediction = "v2", "base_food_restaurants"
+    assert pipeline.categorize(_coffee(make_operation, "b")) == "base_food_restaurants"
+
+    monkeypatch.setitem(category_mapping.BANK_CATEGORY_TO_BASE, ("alfa", "бары"), "base_food_restaurants")
+    pipeline.categorize(_coffee(make_operation, "c"))
+    assert ml.seen == ["a", "b", "c"]
+
+
+def test_least_recently_used_signature_is_evicted(make_operation):
+    cache = DecisionCache(path=None, max_entries=2)
+    cache.put(("alfa", "expense", "a", "", ""), "base_food_coffee", "ml_model")
+    cache.put(("alfa", "expense", "b", "", ""), "base_food_coffee", "ml_model")
+    assert cache.get(("alfa", "expense", "a", "", "")) is not None
+    cache.put(("alfa", "expense", "c", "", ""), "base_food_coffee", "ml_model")
+    assert cache.get(("alfa", "expense", "b", "", "")) is None
+    assert len(cache) == 2
+
+
+def test_operations_without_merchant_are_not_cached(make_operation):
+    pipeline = CategorizationPipeline(decision_cache=DecisionCache(path=None))
+    texts = {"Pyaterochka": "base_shopping_groceries", "Apteka 36.6": "base_shopping_pharmacy", "Starbucks": "base_food_coffee"}
+    for index, (text, expected) in enumerate(texts.items()):
+        op = make_operation(op_id=str(index), description=text, merchant=None, bank_category="Zzz неизвестная")
+        # отдельные пачки: общая категория банка не должна отдать первое решение остальным
+        assert pipeline.categorize_many([op]) == [expected]
+    assert len(pipeline.decision_cache) == 0
@@ -0,0 +1,15 @@
+from finance_app.domain import Operation
+
+
+def test_operation_is_slotted_and_interns_repeated_fields(make_operation):
+    first = make_operation(op_id="a", bank="".join(["al", "fa"]), categorization_source="".join(["map", "ping"]))
+    second = make_operation(op_id="b", bank="".join(["alf", "a"]), categorization_source="".join(["mapp", "ing"]))
+    assert not hasattr(first, "__dict__")
+    assert "amount" in Operation.__slots__
+    assert first.bank is second.bank
+    assert first.categorization_source is second.categorization_source
+    # остальной API dataclass не меняется
+    first.category_id = "base_food_coffee"
+    assert first == make_operation(
+        op_id="a", bank="alfa", categorization_source="mapping", category_id="base_food_coffee"
+    )
@@ -0,0 +1,145 @@
+import io
+
+import pytest
+
+from finance_app.domain import Vault
+from finance_app.services import import_jobs
+
+
+HEADER = "operationDate,accountName,accountNumber,type,amount,currency,comment,merchant,mcc,category"
+
+
+class Crash(BaseException):
+    """Имитация падения процесса: не ловится как обычная ошибка задания."""
+
+
+class CountingPipeline:
+    def __init__(self, crash_after=None, error=Crash):
+        self.calls = 0
+        self.crash_after = crash_after
+        self.error = error
+
+    def categorize(self, operation):
+        if self.crash_after is not None and self.calls >= self.crash_after:
+            raise self.error()
+        self.calls += 1
+        operation.category_id = "base_dummy"
+        operation.categorization_source = "dummy"
+        return operation.category_id
+
+    def categorize_many(self, operations):
+        return [self.categorize(op) for op in operations]
+
+
+def statement(rows):
+    lines = [HEADER] + [f"{day:02d}.11.2025,Main,1,expense,{day * 10},RUB,Shop {day},Shop,5411,Food" for day in rows]
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def callbacks(vault, committed):
+    def publish(operations, job):
+        for op in operations:
+            vault.add_operation(op)
+
+    def commit(operations, job):
+        committed.append((job.file_id, len(operations)))
+
+    return publish, commit
+
+
+def test_resume_after_crash_continues_from_checkpoint(tmp_path):
+    vault = Vault()
+    committed = []
+    job = import_jobs.create_job("alfa", "a.csv", "file-1", jobs_dir=tmp_path)
+    import_jobs.receive_upload(job, io.BytesIO(statement(range(1, 11))), jobs_dir=tmp_path)
+    with pytest.raises(Crash):
+        import_jobs.run_job(
+            job,
+            vault,
+            CountingPipeline(crash_after=4),
+            *callbacks(vault, committed),
+            chunk_size=2,
+            jobs_dir=tmp_path,
+        )
+    checkpoint = import_jobs.load_job(job.id, tmp_path)
+    assert checkpoint.committed_offset == 4
+    assert checkpoint.rows_categorized == 4
+    assert checkpoint.bytes_read == checkpoint.bytes_total
+    # опубликованные до падения чанки жили только в памяти: после рестарта vault их не содержит
+    vault = Vault()
+
+    pipeline = CountingPipeline()
+    resumed = import_jobs.resumable_jobs(tmp_path)
+    assert [j.id for j in resumed] == [job.id]
+    import_jobs.run_job(resumed[0], vault, pipeline, *callbacks(vault, committed), jobs_dir=tmp_path)
+    assert resumed[0].status == import_jobs.DONE
+    # выписка перечитана с начала, но байты прошлого запуска не задвоились
+    progress = resumed[0].progress()
+    assert progress["bytes_read"] == progress["bytes_total"]
+    assert pipeline.calls == 6  # строки до чекпоинта повторно не категоризуются
+    assert sorted(op.description for op in vault.operations) == sorted(f"Shop {day}" for day in range(1, 11))
+    assert committed == [("file-1", 10)]
+    assert import_jobs.unfinished_jobs(tmp_path) == []
+
+
+def test_failed_job_rolls_back_published_chunks(tmp_path):
+    vault = Vault()
+    committed = []
+    publish, commit = callbacks(vault, committed)
+
+    def rollback(job):
+        vault.remove_file_operations(job.file_id)
+
+    job = import_jobs.create_job("alfa", "a.csv", "file-1", jobs_dir=tmp_path)
+    import_jobs.receive_upload(job, io.BytesIO(statement(range(1, 8))), jobs_dir=tmp_path)
+    with pytest.raises(RuntimeError):
+        import_jobs.run_job(
+            job,
+            vault,
+            CountingPipeline(crash_after=4, error=RuntimeError),
+            publish,
+            commit,
+            chunk_size=2,
+            jobs_dir=tmp_path,
+            rollback=rollback,
+        )
+    assert job.status == import_jobs.FAILED
+    # два чанка уже были опубликованы до ошибки в третьем
+    assert vault.operations == [] and committed == []
+    assert not (tmp_path / job.id).exists()
+
+
+def test_interrupted_upload_is_discarded(tmp_path):
+    job = import_jobs.create_job("alfa", "a.csv", "file-1", jobs_dir=tmp_path)
+    # процесс упал, пока выписка ещё загружалась
+    (tmp_path / job.id / import_jobs.SOURCE_FILE).write_bytes(statement(range(1, 6))[:40])
+    assert import_jobs.resumable_jobs(tmp_path) == []
+    assert not (tmp_path / job.id).exists()
+
+
+def test_runner_publishes_chunks_and_reports_progress(tmp_path):
+    vault = Vault()
+    published, committed = [], []
+    publish, commit = callbacks(vault, committed)
+
+    def publish_chunk(operations, job):
+        publish(operations, job)
+        published.append(len(operations))
+
+    def run(job):
+        import_jobs.run_job(job, vault, CountingPipeline(), publish_chunk, commit, chunk_size=3, jobs_dir=tmp_path)
+
+    runner = import_jobs.ImportJobRunner(run)
+    job = import_jobs.create_job("alfa", "a.csv", "file-1", jobs_dir=tmp_path)
+    import_jobs.receive_upload(job, io.BytesIO(statement(range(1, 8))), jobs_dir=tmp_path)
+    assert runner.submit(job).status == import_jobs.PENDING
+    runner.join()
+
+    progress = runner.get(job.id).progress()
+    assert progress["phase"] == import_jobs.DONE
+    assert progress["rows_parsed"] == 7
+    assert progress["bytes_read"] == progress["bytes_total"]
+    assert progress["eta_seconds"] == 0
+    assert published == [3, 3, 1]
+    assert committed == [("file-1", 7)]
+    assert len(vault.operations) == 7
@@ -1,6 +1,11 @@
+import io
+from decimal import Decimal
 from pathlib import Path
 
+from finance_app.adapters import alfa_adapter
+from finance_app.adapters.rows import decode_stream
 from finance_app.domain import OperationType, Vault
+from finance_app.fingerprints import FingerprintFilter
 from finance_app.services import import_service
 
 
@@ -14,6 +19,9 @@ class DummyPipeline:
         operation.categorization_source = "dummy"
         return operation.category_id
 
+    def categorize_many(self, operations):
+        return [self.categorize(op) for op in operations]
+
 
 def test_import_alfa_and_tinkoff(tmp_path):
     vault = Vault()
@@ -59,3 +67,74 @@ def test_import_alfa_and_tinkoff(tmp_path):
     assert imported_tink == 2
     assert pipeline.calls == 3  # two more categorized
     assert len(vault.operations) == 4
+
+
+def test_reimport_of_overlapping_statement_skips_known_rows(tmp_path):
+    vault = Vault()
+    pipeline = DummyPipeline()
+    header = "operationDate,accountName,accountNumber,type,amount,currency,comment,merchant,mcc,category"
+    coffee = "01.12.2025,Main,123,expense,150,RUB,Coffee,Coffee Bean,5814,Cafe"
+    first = tmp_path / "first.csv"
+    first.write_text("\n".join([header, coffee, coffee]), encoding="utf-8")
+    second = tmp_path / "second.csv"
+    second.write_text(
+        "\n".join([header, coffee, coffee, coffee, "02.12.2025,Main,123,expense,90,RUB,Bus,Metro,4111,Transport"]),
+        encoding="utf-8",
+    )
+
+    # одинаковые строки внутри одного файла — разные покупки
+    assert import_service.import_alfa_file_into_vault(vault, pipeline, str(first), "file-1") == 2
+
+    fingerprints = FingerprintFilter(vault)
+    imported = import_service.import_alfa_file_into_vault(vault, pipeline, str(second), "file-2", fingerprints)
+    assert imported == 2
+    assert fingerprints.skipped == 2
+    assert pipeline.calls == 4
+    assert len(vault.operations) == 4
+
+    vault.remove_file_operations("file-1")
+    # из file-2 в vault осталась одна такая покупка, вторая копия снова новая
+    assert import_service.import_alfa_file_into_vault(vault, pipeline, str(first), "file-3") == 1
+
+
+def test_import_streams_rows_in_categorized_chunks(tmp_path):
+    vault = Vault()
+    pipeline = DummyPipeline()
+    rows = [f"0{day}.12.2025,Main,123,expense,{day}00,RUB,Shop {day},Shop,5411,Food" for day in range(1, 6)]
+    csv_path = tmp_path / "alfa.csv"
+    csv_path.write_text(
+        "\n".join(["operationDate,accountName,accountNumber,type,amount,currency,comment,merchant,mcc,category", *rows]),
+        encoding="utf-8",
+    )
+
+    chunks = []
+
+    def on_chunk(chunk):
+        # чанк попадает в vault уже категоризованным
+        assert all(op.category_id == "base_dummy" for op in chunk)
+        assert vault.operations[-len(chunk):] == chunk
+        chunks.append(len(chunk))
+
+    imported = import_service.import_alfa_file_into_vault(
+        vault, pipeline, str(csv_path), "file-1", chunk_size=2, on_chunk=on_chunk
+    )
+    assert imported == 5
+    assert chunks == [2, 2, 1]
+    assert [op.description for op in vault.operations] == [f"Shop {day}" for day in range(1, 6)]
+
+
+def test_import_from_decoded_binary_stream_strips_bom():
+    vault = Vault()
+    pipeline = DummyPipeline()
+    body = "\n".join(
+        [
+            "\ufeffoperationDate,accountName,accountNumber,type,amount,currency,comment,merchant,mcc,category",
+            "01.12.2025,Main,123,expense,150,RUB,Кофе,Coffee Bean,5814,Cafe",
+        ]
+    ).encode("utf-8")
+
+    source = decode_stream(io.BytesIO(body), alfa_adapter.ENCODING)
+    imported = import_service.import_alfa_file_into_vault(vault, pipeline, source, "file-1")
+    assert imported == 1
+    assert vault.operations[0].description == "Кофе"
+    assert vault.operations[0].amount == Decimal("-150")
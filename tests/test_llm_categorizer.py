@@ -40,3 +40,28 @@ def test_parse_response_and_cache(monkeypatch, make_operation):
 
     data = {"choices": [{"message": {"content": '{"category": "base_food_fastfood"}'}}]}
     assert categorizer._parse_response(data) == "base_food_fastfood"
+
+
+def test_predict_many_sends_one_request_per_batch(monkeypatch, make_operation):
+    categorizer = LLMCategorizer(api_key="key", model="model", api_url="http://test")
+    calls = []
+
+    def fake_post(url, headers, json, timeout):
+        calls.append(json)
+        content = '{"category_ids": ["base_transport_taxi", "base_food_coffee"]}'
+        return DummyResponse({"choices": [{"message": {"content": content}}]})
+
+    monkeypatch.setattr("finance_app.services.llm_categorizer.requests.post", fake_post)
+
+    taxi = make_operation(op_id="t1", description="Taxi ride", merchant="Yandex Taxi", amount=Decimal("-300"))
+    taxi_again = make_operation(op_id="t2", description="Taxi ride", merchant="Yandex Taxi", amount=Decimal("-300"))
+    coffee = make_operation(op_id="c1", description="Coffee", merchant="Coffee Bean", amount=Decimal("-200"))
+
+    assert categorizer.predict_many([taxi, coffee, taxi_again]) == [
+        "base_transport_taxi",
+        "base_food_coffee",
+        "base_transport_taxi",
+    ]
+    assert len(calls) == 1
+    assert categorizer.predict(coffee) == "base_food_coffee"  # ответы пачки попали в кэш
+    assert len(calls) == 1
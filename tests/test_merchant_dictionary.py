@@ -0,0 +1,43 @@
+import json
+import os
+
+import pytest
+
+from finance_app.merchant_dictionary import MERCHANT_DICTIONARY, MerchantDictionary, ReloadingDictionary
+
+
+def test_keywords_match_word_starts_in_file_order():
+    dictionary = MerchantDictionary(
+        {"5411": "base_shopping_groceries"},
+        [("yandex go", "base_transport_taxi"), ("кин", "base_entertainment_cinema"), ("go", "base_food_coffee")],
+    )
+    assert dictionary.lookup_text("оплата кинотеатр") == "base_entertainment_cinema"
+    assert dictionary.lookup_text("макинтош") is None  # ключ ищется только с начала слова
+    assert dictionary.lookup_text("go yandex go") == "base_transport_taxi"  # раньше в файле — важнее
+    assert dictionary.lookup("кинотеатр", "5411") == "base_shopping_groceries"
+    assert dictionary.lookup_mcc("54x1") is None
+
+
+def test_shipped_dictionary_covers_former_stub_tables():
+    dictionary = MERCHANT_DICTIONARY.current()
+    assert dictionary.lookup("покупка pyaterochka 1234", None) == "base_shopping_groceries"
+    assert dictionary.lookup("yandex taxi", None) == "base_transport_taxi"
+    assert dictionary.lookup("", "4121") == "base_transport_taxi"
+
+
+def test_file_is_reloaded_on_change_and_broken_file_keeps_previous(tmp_path):
+    path = tmp_path / "merchants.json"
+    path.write_text(json.dumps({"merchants": [["coffee", "base_food_coffee"]]}), encoding="utf-8")
+    reloading = ReloadingDictionary(path)
+    assert reloading.current().lookup_text("coffee bar") == "base_food_coffee"
+
+    path.write_text(json.dumps({"merchants": [["coffee", "base_food_restaurants"]]}), encoding="utf-8")
+    os.utime(path, ns=(0, 10**18))
+    assert reloading.current().lookup_text("coffee bar") == "base_food_restaurants"
+
+    path.write_text(json.dumps({"merchants": [["coffee", "base_no_such"]]}), encoding="utf-8")
+    os.utime(path, ns=(0, 2 * 10**18))
+    assert reloading.current().lookup_text("coffee bar") == "base_food_restaurants"
+    assert "base_no_such" in str(reloading.last_error)
+    with pytest.raises(ValueError):
+        reloading.reload()
@@ -0,0 +1,55 @@
+from datetime import date
+from decimal import Decimal
+
+from finance_app.domain import OperationType, Vault
+from finance_app.services import analytics_service
+
+
+def _fill(vault: Vault, make_operation) -> None:
+    vault.add_operation(
+        make_operation(op_id="o-1", amount=Decimal("-100.10"), category_id="base_food_coffee", source_file_id="f-1")
+    )
+    vault.add_operation(
+        make_operation(
+            op_id="o-2",
+            amount=Decimal("2500"),
+            op_type=OperationType.INCOME,
+            category_id="base_income_salary",
+            dt=date(2025, 2, 3),
+            source_file_id="f-2",
+        )
+    )
+    vault.add_operation(make_operation(op_id="o-3", amount=Decimal("-0.005"), merchant="Shop", source_file_id="f-2"))
+    vault.add_operation(
+        make_operation(op_id="o-4", amount=Decimal("-40"), op_type=OperationType.TRANSFER, category_id="base_topup")
+    )
+
+
+def _aggregates(vault: Vault) -> tuple:
+    return (
+        analytics_service.compute_totals(vault),
+        analytics_service.breakdown_by_base(vault),
+        analytics_service.breakdown_by_base(vault, op_type=OperationType.EXPENSE),
+        analytics_service.monthly_trend(vault),
+    )
+
+
+def test_column_store_matches_object_aggregates(make_operation):
+    plain = Vault()
+    _fill(plain, make_operation)
+    columnar = Vault()
+    store = columnar.enable_store()
+    _fill(columnar, make_operation)
+
+    assert len(store) == 4
+    assert store.scale == 3  # сумма с тремя знаками расширила масштаб колонки
+    assert store.row(1).id == "o-2"
+    assert _aggregates(columnar) == _aggregates(plain)
+
+    for vault in (plain, columnar):
+        op = vault.operations[2]
+        op.category_id = "base_shopping_groceries"
+        vault.recategorized([op])
+        assert vault.remove_file_operations("f-1") == 1
+    assert _aggregates(columnar) == _aggregates(plain)
+    assert [op.id for op in store] == ["o-2", "o-3", "o-4"]
@@ -0,0 +1,21 @@
+from finance_app.adapters import alfa_adapter, parallel_csv
+
+
+def test_parallel_parse_matches_sequential_and_keeps_quoted_newlines(tmp_path, monkeypatch):
+    lines = ["\ufeffoperationDate,accountName,accountNumber,type,amount,currency,comment,merchant,mcc,category"]
+    for i in range(200):
+        comment = f'"Покупка\nмногострочная {i}, ""с кавычками"""' if i % 7 == 0 else f"Покупка {i}"
+        lines.append(f"{i % 28 + 1:02d}.11.2025,Main,123,expense,{i}.5,RUB,{comment},Shop {i % 5},5411,Food")
+    lines.append(",,,,,,,,,")
+    path = tmp_path / "alfa.csv"
+    path.write_bytes("\r\n".join(lines).encode("utf-8"))
+
+    data = path.read_bytes()
+    header_end, ranges = parallel_csv.record_ranges(data, 9)
+    assert ranges[0][0] == header_end and ranges[-1][1] == len(data)
+    assert all(data[end - 1 : end] == b"\n" for _, end in ranges[:-1])
+
+    sequential = list(alfa_adapter.iter_alfa_rows(str(path)))
+    parallel = list(parallel_csv.parse_file_parallel(str(path), alfa_adapter.parse_alfa_rows, "utf-8-sig", workers=3))
+    assert len(sequential) == 200
+    assert parallel == sequential
@@ -0,0 +1,60 @@
+from decimal import Decimal
+
+from finance_app.domain import OperationType, Vault
+from finance_app.rules import Rule
+from finance_app.services import recategorization
+from finance_app.services.categorization import CategorizationPipeline
+from finance_app.services.recategorization import CategorizationConfig
+
+
+def _vault(make_operation):
+    vault = Vault()
+    rows = [
+        ("coffee-1", "Покупка", "Surf Coffee", "Кофейни", OperationType.EXPENSE),
+        ("coffee-2", "Покупка", "Cofix", "Кофейни", OperationType.EXPENSE),
+        ("cashback", "Кэшбэк за покупки", None, None, OperationType.INCOME),
+        ("shop", "Покупка", "Leroy", "Дом и ремонт", OperationType.EXPENSE),
+    ]
+    pipeline = CategorizationPipeline()
+    for op_id, description, merchant, bank_category, op_type in rows:
+        op = make_operation(
+            op_id=op_id, description=description, merchant=merchant, bank_category=bank_category, op_type=op_type,
+            amount=Decimal("100") if op_type == OperationType.INCOME else Decimal("-100"),
+        )
+        pipeline.categorize(op)
+        vault.add_operation(op)
+    return vault, pipeline
+
+
+def test_mapping_change_touches_only_operations_with_that_bank_category(make_operation):
+    vault, pipeline = _vault(make_operation)
+    old = CategorizationConfig.current()
+    new = CategorizationConfig(old.rules, {**old.mapping, ("*", "кофейни"): "base_food_coffee"})
+
+    assert [op.id for op in recategorization.affected_operations(vault, old, new)] == ["coffee-1", "coffee-2"]
+    diff = recategorization.diff_configs(vault, pipeline, old, new)
+    # Surf Coffee уже узнаёт словарь мерчантов, сменит категорию только Cofix
+    assert (diff["candidates"], diff["moved"]) == (2, 1)
+    assert diff["transitions"] == [{"from": "base_unknown", "to": "base_food_coffee", "count": 1}]
+    assert [op.id for op in vault.index.by_category("base_food_coffee")] == ["coffee-1"]  # diff vault не меняет
+
+    changed = recategorization.apply_config_change(vault, CategorizationPipeline(mapping=new.mapping), old, new)
+    assert [op.categorization_source for op in changed] == ["mapping", "mapping"]
+    assert [op.id for op in vault.index.by_category("base_food_coffee")] == ["coffee-1", "coffee-2"]
+
+
+def test_removed_rule_moves_matching_operations_and_config_round_trips(make_operation, tmp_path):
+    vault, pipeline = _vault(make_operation)
+    old = CategorizationConfig.current()
+    new = CategorizationConfig([rule for rule in old.rules if rule.source != "rule: cashback"], old.mapping)
+
+    diff = recategorization.diff_configs(vault, pipeline, old, new)
+    assert diff["candidates"] == 1
+    assert diff["transitions"] == [{"from": "base_income_cashback", "to": "base_income_other", "count": 1}]
+
+    path = tmp_path / "categorization.json"
+    recategorization.save_config(new, path)
+    assert recategorization.load_config(path).version == new.version
+    assert recategorization.changed_rules(old.rules, new.rules) == {
+        Rule("base_income_cashback", "rule: cashback", ("кэшбэк",))
+    }
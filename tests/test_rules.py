@@ -58,3 +58,42 @@ def test_already_service_category_is_preserved():
     )
     result = apply_rules(op, features)
     assert result == ("base_transfer_out", "rule: already service")
+
+
+def _features(text, merchant_norm="", mcc=None):
+    return Features(
+        text=text, bank_category_norm="", merchant_norm=merchant_norm, mcc=mcc, amount_abs=Decimal("10"), bank="alfa"
+    )
+
+
+def _operation(op_type):
+    return Operation(
+        id="op",
+        account_id="acc",
+        bank="alfa",
+        date=date(2025, 1, 3),
+        amount=Decimal("-10"),
+        currency="RUB",
+        type=op_type,
+        description="",
+        merchant=None,
+        mcc=None,
+        bank_category=None,
+    )
+
+
+def test_compiled_rules_keep_table_order_and_overlapping_keywords():
+    expense = _operation(OperationType.EXPENSE)
+    income = _operation(OperationType.INCOME)
+    # "перевод со счета" и "на счет" перекрываются с "перевод": нужны все вхождения
+    assert apply_rules(expense, _features("перевод со счета 4081 на счет 4230")) == (
+        "base_internal_transfer",
+        "rule: internal transfer keyword",
+    )
+    assert apply_rules(expense, _features("перевод со счета 4081")) == ("base_transfer_out", "rule: outgoing transfer keyword")
+    assert apply_rules(income, _features("перевод от ивана")) == ("base_transfer_in", "rule: incoming transfer keyword")
+    # мерчант-правило раньше текстового, но только для расходов
+    assert apply_rules(expense, _features("кэшбэк ozon", "ozon")) == ("base_shopping_marketplace", "rule: marketplace merchant")
+    assert apply_rules(income, _features("кэшбэк ozon", "ozon")) == ("base_income_cashback", "rule: cashback")
+    assert apply_rules(expense, _features("atm 123", mcc="6011")) == ("base_cashout", "rule: cash out")
+    assert apply_rules(expense, _features("coffee bean", "coffee bean", "5814")) is None
@@ -0,0 +1,55 @@
+from datetime import date
+
+from finance_app.domain import Account, Vault
+from finance_app.services import segment_storage
+
+
+def test_segments_add_delete_and_load(tmp_path, make_operation):
+    segments_dir = tmp_path / "segments"
+    vault = Vault()
+    vault.accounts["acc-1"] = Account(id="acc-1", bank="alfa", name="Primary", number="1")
+    first = [make_operation(op_id=f"a-{i}", account_id="acc-1", source_file_id="file-a") for i in range(3)]
+    second = [
+        make_operation(op_id=f"b-{i}", account_id="acc-1", source_file_id="file-b", dt=date(2025, 2, 1))
+        for i in range(2)
+    ]
+    files = [{"id": "file-a", "name": "a.csv"}]
+    for op in first:
+        vault.add_operation(op)
+    segment_storage.save_state(vault, files, segments_dir)
+
+    for op in second:
+        vault.add_operation(op)
+    files.append({"id": "file-b", "name": "b.csv"})
+    segment_storage.add_segment(vault, "file-b", second, files, segments_dir)
+    assert (segments_dir / "file-b.seg").exists()
+
+    restored = Vault()
+    files_loaded, has_state = segment_storage.load_state(restored, segments_dir)
+    assert has_state is True
+    assert files_loaded == files
+    assert [op.id for op in restored.operations] == ["a-0", "a-1", "a-2", "b-0", "b-1"]
+
+    segment_storage.delete_segment(restored, "file-a", files[1:], segments_dir)
+    assert not (segments_dir / "file-a.seg").exists()
+    remaining = Vault()
+    segment_storage.load_state(remaining, segments_dir)
+    assert [op.id for op in remaining.operations] == ["b-0", "b-1"]
+    assert remaining.accounts["acc-1"].name == "Primary"
+
+
+def test_save_state_rewrites_only_changed_segments(tmp_path, make_operation):
+    segments_dir = tmp_path / "segments"
+    vault = Vault()
+    vault.add_operation(make_operation(op_id="a-1", source_file_id="file-a"))
+    vault.add_operation(make_operation(op_id="b-1", source_file_id="file-b"))
+    segment_storage.save_state(vault, [], segments_dir)
+    untouched_mtime = (segments_dir / "file-a.seg").stat().st_mtime_ns
+
+    (segments_dir / "file-b.seg").unlink()
+    vault.operations[1].category_id = "base_food_coffee"
+    segment_storage.save_state(vault, [], segments_dir)
+    assert (segments_dir / "file-a.seg").stat().st_mtime_ns == untouched_mtime
+    restored = Vault()
+    segment_storage.load_state(restored, segments_dir)
+    assert restored.operations[1].category_id == "base_food_coffee"
@@ -0,0 +1,88 @@
+from datetime import date
+from decimal import Decimal
+
+from finance_app.domain import Account, OperationType, Vault
+from finance_app.services import sqlite_storage, storage
+
+
+def _vault(make_operation) -> Vault:
+    vault = Vault()
+    vault.accounts["acc-1"] = Account(id="acc-1", bank="alfa", name="Primary", number="1234")
+    vault.add_operation(
+        make_operation(
+            op_id="s-1",
+            account_id="acc-1",
+            dt=date(2025, 1, 5),
+            amount=Decimal("-50.10"),
+            category_id="base_shopping_groceries",
+            source_file_id="file-1",
+        )
+    )
+    vault.add_operation(
+        make_operation(
+            op_id="s-2",
+            account_id="acc-1",
+            dt=date(2025, 2, 1),
+            amount=Decimal("1000"),
+            op_type=OperationType.INCOME,
+            category_id="base_income_salary",
+            source_file_id="file-2",
+        )
+    )
+    return vault
+
+
+def test_sqlite_save_load_and_indexed_queries(tmp_path, make_operation):
+    db_path = tmp_path / "vault.sqlite3"
+    vault = _vault(make_operation)
+    files = [{"id": "file-1", "name": "a.csv"}, {"id": "file-2", "name": "b.csv"}]
+    sqlite_storage.save_state(vault, files, db_path)
+
+    restored = Vault()
+    files_loaded, has_state = sqlite_storage.load_state(restored, db_path)
+    assert has_state is True
+    assert files_loaded == files
+    assert [op.id for op in restored.operations] == ["s-1", "s-2"]
+    assert restored.operations[0].amount == Decimal("-50.10")
+    assert restored.accounts["acc-1"].name == "Primary"
+
+    in_january = sqlite_storage.query_operations(start=date(2025, 1, 1), end=date(2025, 1, 31), path=db_path)
+    assert [op.id for op in in_january] == ["s-1"]
+    salary = sqlite_storage.query_operations(category_id="base_income_salary", path=db_path)
+    assert [op.id for op in salary] == ["s-2"]
+
+    assert sqlite_storage.delete_file("file-1", files[1:], db_path) == 1
+    remaining = Vault()
+    assert sqlite_storage.load_state(remaining, db_path)[0] == files[1:]
+    assert [op.id for op in remaining.operations] == ["s-2"]
+
+
+def test_migrate_from_json(tmp_path, make_operation, monkeypatch):
+    monkeypatch.setattr(storage, "STATE_PATH", tmp_path / "vault_state.json")
+    monkeypatch.setattr(storage, "JOURNAL_PATH", tmp_path / "vault_journal.jsonl")
+    db_path = tmp_path / "vault.sqlite3"
+    storage.save_state(_vault(make_operation), [{"id": "file-1", "name": "a.csv"}])
+
+    assert sqlite_storage.migrate_from_json(db_path) == 2
+    # повторный запуск не трогает уже созданную базу
+    assert sqlite_storage.migrate_from_json(db_path) == 0
+    migrated = Vault()
+    sqlite_storage.load_state(migrated, db_path)
+    assert len(migrated.operations) == 2
+
+
+def test_old_database_gets_feature_columns(tmp_path, make_operation):
+    import sqlite3
+
+    db_path = tmp_path / "vault.sqlite3"
+    with sqlite3.connect(str(db_path)) as conn:
+        conn.execute(
+            "CREATE TABLE operations (id TEXT PRIMARY KEY, account_id TEXT NOT NULL, bank TEXT NOT NULL, "
+            "date TEXT NOT NULL, amount TEXT NOT NULL, currency TEXT NOT NULL, type TEXT NOT NULL, "
+            "description TEXT NOT NULL, merchant TEXT, mcc TEXT, bank_category TEXT, category_id TEXT, "
+            "categorization_source TEXT, source_file_id TEXT)"
+        )
+    sqlite_storage.save_state(_vault(make_operation), [], db_path)
+    restored = Vault()
+    sqlite_storage.load_state(restored, db_path)
+    assert restored.operations[0].text_norm is not None
@@ -0,0 +1,63 @@
+from decimal import Decimal
+
+from finance_app.domain import OperationType
+from finance_app.services.categorization import CategorizationPipeline
+from finance_app.services.stage_metrics import StageBatch, StageMetrics
+
+
+class BatchLLM:
+    def is_ready(self) -> bool:
+        return True
+
+    def predict(self, operation):
+        return None
+
+    def predict_many(self, operations):
+        return [None for _ in operations]
+
+
+def test_pipeline_counts_calls_and_hits_per_stage(make_operation):
+    salary = make_operation(op_id="salary", description="Salary payment", op_type=OperationType.INCOME, amount=Decimal("1000"))
+    coffee = make_operation(op_id="coffee", bank="tinkoff", description="Оплата", merchant="Vendor", bank_category="Кофе")
+    taxi = make_operation(op_id="taxi", description="Yandex Go ride", merchant="Yandex Go", bank_category="unknown")
+    vendor = make_operation(op_id="vendor", description="Other expense", merchant="Vendor", bank_category="unknown")
+    pipeline = CategorizationPipeline(llm_categorizer=BatchLLM())
+
+    pipeline.categorize_many([salary, coffee, taxi])
+    pipeline.categorize(vendor)
+
+    status = pipeline.metrics.status()
+    stages = status["stages"]
+    assert status["operations"] == 4
+    assert (stages["rules"].calls, stages["rules"].hits) == (4, 1)
+    assert (stages["mapping"].calls, stages["mapping"].hits) == (3, 1)
+    assert (stages["ml_stub"].calls, stages["ml_stub"].hits) == (2, 1)
+    assert (stages["llm"].calls, stages["llm"].hits, stages["llm"].hit_rate) == (1, 0, 0.0)
+    assert (stages["fallback"].calls, stages["fallback"].hits) == (1, 1)
+    assert stages["ml_model"].calls == 0 and stages["ml_model"].p50_ms is None
+    assert pipeline.status()["stages"]["stages"]["rules"].p99_ms >= stages["rules"].p50_ms > 0
+
+
+def test_percentiles_follow_the_histogram_and_merge_across_processes():
+    batch = StageBatch()
+    for _ in range(90):
+        batch.add("rules", 1e-5, hit=True)
+    for _ in range(10):
+        batch.add("rules", 1e-2, hit=False)
+    batch.add_bulk("ml_model", 0.2, calls=100, hits=80)
+    metrics = StageMetrics()
+    metrics.commit(batch)
+
+    merged = StageMetrics()
+    merged.merge(metrics.export())
+    merged.merge(metrics.export())
+    rules = merged.status()["stages"]["rules"]
+    assert (rules.calls, rules.hits, rules.hit_rate) == (200, 180, 0.9)
+    # перцентиль — граница корзины, не дальше шага x1.25 от настоящего значения
+    assert 0.01 <= rules.p50_ms < 0.0125
+    assert 10 <= rules.p95_ms == rules.p99_ms == rules.max_ms
+    ml = merged.status()["stages"]["ml_model"]
+    assert ml.calls == 200 and 2 <= ml.p50_ms <= 2.5 and ml.total_ms == 400.0
+
+    merged.reset()
+    assert merged.status()["operations"] == 0 and merged.status()["stages"]["rules"].calls == 0
@@ -0,0 +1,87 @@
+import threading
+import time
+
+import pytest
+
+from finance_app.services.state_writer import StateWriter
+
+
+def test_burst_of_mutations_is_coalesced_into_one_write():
+    writes = []
+    writer = StateWriter(lambda: writes.append(1), delay=5.0)
+    for _ in range(20):
+        writer.schedule()
+    assert writer.pending() is True
+    # flush не ждёт паузы и возвращается только после записи
+    assert writer.flush(timeout=5) is True
+    assert len(writes) == 1
+    assert writer.pending() is False
+    assert writer.flush() is True
+    writer.close()
+    assert len(writes) == 1
+
+
+def test_debounced_write_happens_without_flush():
+    done = threading.Event()
+    writer = StateWriter(done.set, delay=0.01)
+    writer.schedule()
+    assert done.wait(timeout=5)
+    writer.close()
+
+
+def test_flush_reraises_save_error():
+    def failing_save():
+        raise OSError("disk full")
+
+    writer = StateWriter(failing_save, delay=5.0)
+    writer.schedule()
+    with pytest.raises(OSError, match="disk full"):
+        writer.flush(timeout=5)
+    writer.close()
+
+
+def test_background_save_error_is_logged_and_reported_in_status(caplog):
+    fail = threading.Event()
+    fail.set()
+
+    def save():
+        if fail.is_set():
+            raise OSError("disk full")
+
+    writer = StateWriter(save, delay=5.0)
+    writer.schedule()
+    with pytest.raises(OSError):
+        writer.flush(timeout=5)
+    # ошибка видна сразу: в логе и в status, а не только при следующем flush
+    assert "background state write failed" in caplog.text
+    status = writer.status()
+    # незаписанное состояние остаётся pending
+    assert (status["failures"], status["error"], status["pending"]) == (1, "disk full", True)
+
+    fail.clear()
+    assert writer.flush(timeout=5) is True
+    status = writer.status()
+    assert status["error"] is None and status["failures"] == 1 and status["last_success_at"] is not None
+    writer.close()
+
+
+def test_failed_write_is_retried_with_backoff():
+    attempts = []
+    done = threading.Event()
+
+    def save():
+        attempts.append(time.monotonic())
+        if len(attempts) < 3:
+            raise OSError("disk full")
+        done.set()
+
+    writer = StateWriter(save, delay=0.01, retry_delay=0.05)
+    writer.schedule()
+    # без новых мутаций и без flush
+    assert done.wait(timeout=5)
+    assert writer.pending() is False
+    # пауза перед повтором удваивается
+    assert attempts[1] - attempts[0] >= 0.05 and attempts[2] - attempts[1] >= 0.1
+    status = writer.status()
+    assert (status["failures"], status["writes"], status["error"]) == (2, 1, None)
+    writer.close()
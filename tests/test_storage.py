@@ -40,3 +40,39 @@ def test_save_and_load_state(tmp_path, make_operation, monkeypatch):
 
     storage.save_password_hash("secret")
     assert storage.load_password_hash() == "secret"
+
+
+def test_journal_replay_over_snapshot(tmp_path, make_operation, monkeypatch):
+    monkeypatch.setattr(storage, "STATE_PATH", tmp_path / "vault_state.json")
+    monkeypatch.setattr(storage, "JOURNAL_PATH", tmp_path / "vault_journal.jsonl")
+
+    vault = Vault()
+    vault.accounts["acc-1"] = Account(id="acc-1", bank="alfa", name="Primary", number="1234")
+    first = make_operation(op_id="j-1", account_id="acc-1", source_file_id="file-1")
+    vault.add_operation(first)
+    files = [{"id": "file-1", "name": "a.csv"}]
+    storage.save_state(vault, files)
+
+    second = make_operation(op_id="j-2", account_id="acc-1", source_file_id="file-2", description="Taxi")
+    vault.add_operation(second)
+    storage.journal_add_operations(vault, [second], {"id": "file-2", "name": "b.csv"})
+    second.category_id, second.categorization_source = "base_transport_taxi", "manual"
+    storage.journal_recategorize([second])
+    storage.journal_delete_file("file-1")
+    # недописанная строка в конце журнала после падения
+    with storage.JOURNAL_PATH.open("a", encoding="utf-8") as fp:
+        fp.write('{"event": "add", "op": {"id"')
+
+    restored = Vault()
+    files_loaded, has_state = storage.load_state(restored)
+    assert has_state is True
+    assert files_loaded == [{"id": "file-2", "name": "b.csv"}]
+    assert [op.id for op in restored.operations] == ["j-2"]
+    assert restored.operations[0].category_id == "base_transport_taxi"
+    assert storage.JOURNAL_PATH.read_text(encoding="utf-8").endswith("\n")
+
+    storage.compact_journal(restored, files_loaded)
+    assert not storage.JOURNAL_PATH.exists()
+    compacted = Vault()
+    assert storage.load_state(compacted)[0] == files_loaded
+    assert [op.id for op in compacted.operations] == ["j-2"]
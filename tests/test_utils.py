@@ -1,8 +1,22 @@
-from datetime import date
+import random
+from datetime import date, datetime
 from decimal import Decimal
 
-from finance_app.domain import OperationType
-from finance_app.utils import build_feature_text, build_features, normalize_text, parse_decimal
+import pytest
+
+from finance_app import utils
+from finance_app.domain import OperationType, Vault
+from finance_app.services import columnar_snapshot, segment_storage, sqlite_storage, storage
+from finance_app.utils import (
+    build_feature_text,
+    build_features,
+    normalize_operation,
+    normalize_text,
+    parse_amount,
+    parse_decimal,
+    parse_dmy_date,
+    parse_dmy_hms_date,
+)
 
 
 def test_normalize_text_and_parse_decimal():
@@ -33,3 +47,77 @@ def test_build_features(make_operation):
     assert features.merchant_norm == "coffee bar"
     assert features.mcc == "5814"
     assert features.amount_abs == Decimal("120.5")
+
+
+def test_features_are_computed_once_and_persisted(make_operation, monkeypatch):
+    op = make_operation(description="Coffee purchase", merchant="Coffee Bar", bank_category="Cafe")
+    normalize_operation(op)
+    assert (op.text_norm, op.merchant_norm, op.bank_category_norm) == ("coffee purchase coffee bar cafe", "coffee bar", "cafe")
+
+    restored = storage.deserialize_operation(storage.serialize_operation(op))
+    assert restored.text_norm == op.text_norm
+
+    # у сохранённой операции тексты при категоризации заново не нормализуются
+    normalized = []
+    monkeypatch.setattr(utils, "normalize_text", lambda value: normalized.append(value) or (value or "").lower())
+    features = build_features(restored)
+    assert features.merchant_norm == "coffee bar" and features.text == "coffee purchase coffee bar cafe"
+    assert normalized == [restored.bank]
+
+
+BACKENDS = {
+    "json": (lambda vault, path: storage.save_state(vault, []), lambda vault, path: storage.load_state(vault)),
+    "journal": (
+        lambda vault, path: storage.journal_add_operations(vault, vault.operations),
+        lambda vault, path: storage.load_state(vault),
+    ),
+    "sqlite": (lambda vault, path: sqlite_storage.save_state(vault, [], path), sqlite_storage.load_state),
+    "columnar": (lambda vault, path: columnar_snapshot.save_state(vault, [], path), columnar_snapshot.load_state),
+    "segments": (lambda vault, path: segment_storage.save_state(vault, [], path), segment_storage.load_state),
+}
+
+
+@pytest.mark.parametrize("backend", sorted(BACKENDS))
+def test_features_of_another_normalization_version_are_recomputed(backend, tmp_path, make_operation, monkeypatch):
+    monkeypatch.setattr(storage, "STATE_PATH", tmp_path / "vault_state.json")
+    monkeypatch.setattr(storage, "JOURNAL_PATH", tmp_path / "vault_journal.jsonl")
+    save, load = BACKENDS[backend]
+    vault = Vault()
+    vault.add_operation(make_operation(description="Coffee", merchant="Coffee Bar", bank_category="Cafe"))
+    save(vault, tmp_path / "state")
+
+    # normalize_text поменялся вместе с версией: сохранённые признаки устарели
+    monkeypatch.setattr(utils, "normalize_text", lambda value: (value or "").upper())
+    monkeypatch.setattr(utils, "NORMALIZATION_VERSION", utils.NORMALIZATION_VERSION + 1)
+    restored = Vault()
+    load(restored, tmp_path / "state")
+    op = restored.operations[0]
+    assert (op.text_norm, op.merchant_norm, op.bank_category_norm) == ("COFFEE COFFEE BAR CAFE", "COFFEE BAR", "CAFE")
+
+
+def _reference_or_error(parse, value):
+    try:
+        return parse(value)
+    except ValueError:
+        return ValueError
+
+
+def test_fast_parsers_match_strptime_and_parse_decimal():
+    rng = random.Random(20251201)
+    odd_dates = ["31.02.2025", "00.01.2025", "1.2.2025", "01.13.2025", " 1.02.2025", "01-02-2025", "01.02.25", "٠١.٠٢.٢٠٢٥"]
+    odd_times = ["24:00:00", "23:60:00", "23:59:61", "23:59:62", "1:02:03", "10-00-00"]
+    odd_amounts = [None, "", " ", "-", ".", "1e3", "NaN", "1 234,56", "-0", "+7", ",5", "12,345.6", "abc", "1\u00a0000"]
+    for _ in range(3000):
+        day = rng.choice([f"{rng.randint(0, 32):02d}.{rng.randint(0, 13):02d}.{rng.randint(1, 2100):04d}", rng.choice(odd_dates)])
+        moment = f"{day} " + rng.choice(
+            [f"{rng.randint(0, 24):02d}:{rng.randint(0, 60):02d}:{rng.randint(0, 62):02d}", rng.choice(odd_times)]
+        )
+        amount = rng.choice(
+            [f"{rng.choice(['', '-'])}{rng.randint(0, 10**7)}{rng.choice(['', '.', ','])}{rng.randint(0, 999)}", rng.choice(odd_amounts)]
+        )
+        expected_day = _reference_or_error(lambda v: datetime.strptime(v, "%d.%m.%Y").date(), day)
+        assert _reference_or_error(parse_dmy_date, day) == expected_day, day
+        expected_moment = _reference_or_error(lambda v: datetime.strptime(v, "%d.%m.%Y %H:%M:%S").date(), moment)
+        assert _reference_or_error(parse_dmy_hms_date, moment) == expected_moment, moment
+        # сравниваем строки: так совпадает и экспонента, и NaN
+        assert str(parse_amount(amount)) == str(parse_decimal(amount)), amount
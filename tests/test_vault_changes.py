@@ -0,0 +1,50 @@
+from finance_app.domain import Vault
+
+
+def test_changes_since_returns_coalesced_delta(make_operation):
+    vault = Vault()
+    kept = make_operation(op_id="a", source_file_id="f1", category_id="base_unknown")
+    vault.add_operation(kept)
+    base = vault.version
+
+    fresh = make_operation(op_id="b", source_file_id="f2")
+    gone = make_operation(op_id="c", source_file_id="f2")
+    vault.add_operation(fresh)
+    vault.add_operation(gone)
+    kept.category_id = "base_food_coffee"
+    vault.recategorized([kept, fresh])
+    vault.remove_file_operations("f1")
+
+    delta = vault.changes.since(base, vault.changes.epoch)
+    assert delta["reset"] is False
+    assert delta["version"] == vault.version > base
+    assert [op.id for op in delta["added"]] == ["b", "c"]
+    assert delta["recategorized"] == []
+    assert delta["removed"] == ["a"]
+    assert vault.changes.since(vault.version)["added"] == []
+
+
+def test_changes_require_reload_after_replace_or_foreign_epoch(make_operation):
+    vault = Vault()
+    vault.add_operation(make_operation(op_id="a"))
+    version = vault.version
+    assert vault.changes.since(version, "other-epoch")["reset"] is True
+    vault.replace_operations([make_operation(op_id="b")])
+    assert vault.changes.since(version)["reset"] is True
+    assert vault.changes.since(None)["reset"] is True
+
+
+def test_reading_the_index_does_not_reset_client_versions(make_operation):
+    vault = Vault()
+    vault.add_operation(make_operation(op_id="a", source_file_id="f1"))
+    base = vault.version
+
+    # правка в обход Vault: чтение индекса версию не сбрасывает
+    vault.operations.append(make_operation(op_id="b", source_file_id="f1"))
+    assert [op.id for op in vault.index.by_source_file("f1")] == ["a"]
+    assert vault.changes.since(base)["reset"] is False
+
+    # индекс пересобирается на следующей мутации, и клиенты перезагружаются
+    vault.add_operation(make_operation(op_id="c", source_file_id="f1"))
+    assert [op.id for op in vault.index.by_source_file("f1")] == ["a", "b", "c"]
+    assert vault.changes.since(base)["reset"] is True
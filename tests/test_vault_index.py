@@ -0,0 +1,42 @@
+from datetime import date
+
+from finance_app.domain import Vault
+
+
+def test_indexes_follow_vault_mutations(make_operation):
+    vault = Vault()
+    ops = [
+        make_operation(op_id="a", dt=date(2025, 1, 3), category_id="base_food_coffee", merchant="Coffee", source_file_id="f1"),
+        make_operation(op_id="b", dt=date(2025, 1, 1), category_id="base_unknown", source_file_id="f1"),
+        make_operation(op_id="c", dt=date(2025, 1, 3), category_id="base_food_coffee", merchant="coffee ", source_file_id="f2"),
+        make_operation(op_id="d", dt=date(2025, 1, 2), category_id="base_unknown", source_file_id="f2"),
+    ]
+    for op in ops:
+        vault.add_operation(op)
+
+    assert [op.id for op in vault.index.between(date(2025, 1, 2), None)] == ["a", "c", "d"]
+    assert [op.id for op in vault.index.newest_first()] == ["a", "c", "d", "b"]
+    assert [op.id for op in vault.index.by_merchant("coffee")] == ["a", "c"]
+
+    ops[1].category_id = "base_food_coffee"
+    vault.recategorized([ops[1]])
+    assert [op.id for op in vault.index.by_category("base_food_coffee")] == ["a", "b", "c"]
+
+    assert vault.remove_file_operations("f1") == 2
+    assert [op.id for op in vault.operations] == ["c", "d"]
+    assert [op.id for op in vault.index.by_category("base_food_coffee")] == ["c"]
+    assert [op.id for op in vault.index.newest_first()] == ["c", "d"]
+    assert vault.index.by_source_file("f1") == []
+
+
+def test_feature_index_finds_keyword_substrings_and_forgets_removed(make_operation):
+    vault = Vault()
+    vault.add_operation(make_operation(op_id="a", description="Перевод со счета 4081", bank_category="Переводы", source_file_id="f1"))
+    vault.add_operation(make_operation(op_id="b", description="Оплата", merchant="Coffee", mcc="5814", source_file_id="f2"))
+
+    assert [op.id for op in vault.index.with_features(keywords=["перевод со"])] == ["a"]
+    assert [op.id for op in vault.index.with_features(bank_categories=["переводы"], mccs=["5814"])] == ["a", "b"]
+    assert vault.index.with_features(keywords=["wb."]) == []
+
+    vault.remove_file_operations("f1")
+    assert vault.index.with_features(keywords=["перевод"]) == []